@@ -1,24 +1,45 @@
 import os
+from offload import configure_async_mode, BlockingExecutor
+
+# eventlet/gevent have to patch the standard library before anything else loads
+ASYNC_MODE = configure_async_mode()
+
 import cv2
 import numpy as np
 import torch
 import time
 import json
-from flask import Flask, render_template, Response, jsonify, request
+import gzip
+import threading
+import itertools
+import zlib
+from flask import Flask, render_template, Response, jsonify, request, stream_with_context
 from flask_socketio import SocketIO, emit
 from datetime import datetime
 from PIL import Image
 from detection import GarbageDetector, format_detections, save_detection_image
+import metrics
+import frame_trace
+from overlay import renderer
+from inference_service import InferenceClient
+from cascade import CascadeDetector, wrap_detector
+from camera_manager import CameraManager
+from governor import Governor
+from scheduler import InferenceScheduler
+from clip_recorder import ClipRecorder
+from snapshot_writer import SnapshotWriter
 import base64
 from werkzeug.utils import secure_filename
 import uuid
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'cleansight_secret_key'
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
+
+# Blocking camera/torch work is dispatched here so it never stalls the event loop
+executor = BlockingExecutor(socketio.async_mode)
 
 # Global variables
-camera = None
 garbage_detected = False
 last_detection_time = None
 last_alert_time = None
@@ -30,6 +51,58 @@ detector = None
 # Store alerts
 alerts = []
 
+# Per-frame stage tracing, enabled by setting CLEANSIGHT_TRACE to a file path
+tracer = frame_trace.open_recorder(os.environ.get('CLEANSIGHT_TRACE'))
+
+# Inference size of the longest side, chosen per site with sweep.py
+IMG_SIZE = int(os.environ.get('CLEANSIGHT_IMG_SIZE', 640))
+
+# Camera index, stream URL, video file, image directory or .frames replay (see frame_sources.py)
+CAMERA_SOURCE = os.environ.get('CLEANSIGHT_SOURCE', '0')
+# Record what the camera sees to a .frames file for replaying later
+CAMERA_RECORD = os.environ.get('CLEANSIGHT_RECORD')
+CAMERA_START_TIMEOUT = 5.0
+
+# With no viewers, detect only every CLEANSIGHT_IDLE_INTERVAL seconds (alert-only mode);
+# CLEANSIGHT_IDLE_RELEASE=1 also closes the camera between those checks
+IDLE_INTERVAL = float(os.environ.get('CLEANSIGHT_IDLE_INTERVAL', 5.0))
+IDLE_RELEASE = os.environ.get('CLEANSIGHT_IDLE_RELEASE', '0') == '1'
+# Open the camera at startup so alerts work before anyone opens the dashboard
+AUTOSTART = os.environ.get('CLEANSIGHT_AUTOSTART', '0') == '1'
+
+# Detection latency budget per camera in ms; when set, the input size and detection
+# interval are lowered under load and restored when there is headroom (see governor.py)
+LATENCY_BUDGET_MS = os.environ.get('CLEANSIGHT_LATENCY_BUDGET_MS')
+# Target seconds between detections per camera; cameras share the detector in
+# earliest-deadline-first order (see scheduler.py)
+DETECT_INTERVAL = float(os.environ.get('CLEANSIGHT_DETECT_INTERVAL', 0.2))
+
+# Pre/post-roll evidence clips for camera alerts, cut from the stream's own JPEGs
+# (CLEANSIGHT_CLIPS=0 disables them; memory is per camera)
+CLIPS_ENABLED = os.environ.get('CLEANSIGHT_CLIPS', '1') == '1'
+CLIP_PRE_ROLL = float(os.environ.get('CLEANSIGHT_CLIP_PRE_ROLL', 5.0))
+CLIP_POST_ROLL = float(os.environ.get('CLEANSIGHT_CLIP_POST_ROLL', 5.0))
+CLIP_MEMORY_MB = float(os.environ.get('CLEANSIGHT_CLIP_MEMORY_MB', 32))
+CLIP_FPS = float(os.environ.get('CLEANSIGHT_CLIP_FPS', 10))
+CLIP_FORMAT = os.environ.get('CLEANSIGHT_CLIP_FORMAT', 'avi')
+CLIP_QUOTA_MB = float(os.environ.get('CLEANSIGHT_CLIP_QUOTA_MB', 2000))
+
+# Snapshots are written by a background task; at most one per camera every
+# CLEANSIGHT_SNAPSHOT_INTERVAL seconds, the oldest deleted beyond the quota
+SNAPSHOT_INTERVAL = float(os.environ.get('CLEANSIGHT_SNAPSHOT_INTERVAL', 2.0))
+SNAPSHOT_QUOTA_MB = float(os.environ.get('CLEANSIGHT_SNAPSHOT_QUOTA_MB', 500))
+
+# Edge agents (edge_agent.py) post detection events instead of streaming video;
+# when CLEANSIGHT_EDGE_TOKEN is set their X-Edge-Token header must match it
+EDGE_TOKEN = os.environ.get('CLEANSIGHT_EDGE_TOKEN')
+
+# POST /api/alerts/bulk applies its NDJSON lines in transactions of this many
+BULK_BATCH_SIZE = int(os.environ.get('CLEANSIGHT_BULK_BATCH_SIZE', 500))
+
+# Optional presence classifier (trained with cascade.py) that skips YOLO on empty frames
+CASCADE_PATH = os.environ.get('CLEANSIGHT_CASCADE')
+CASCADE_THRESHOLD = os.environ.get('CLEANSIGHT_CASCADE_THRESHOLD')
+
 # Class mapping for pre-trained model (if needed)
 # This will map COCO classes to our garbage classes
 class_mapping = {
@@ -50,7 +123,11 @@ class_mapping = {
 # Global variables
 detector = None
 alerts = []
-camera = None
+# Guards alerts and their ids: every writer holds it, and a bulk batch holds it
+# while it is checked and applied so it lands all at once
+alerts_lock = threading.Lock()
+_alert_ids = itertools.count(1)
+edge_agents = {}
 is_camera_active = False
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -66,6 +143,12 @@ def allowed_file(filename):
 def initialize_detector():
     global detector
     
+    # Run inference out of process when an inference service is configured
+    service_address = os.environ.get('CLEANSIGHT_INFERENCE_SERVICE')
+    if service_address:
+        detector = wrap_cascade(InferenceClient(service_address))
+        return
+    
     try:
         # Create model directory if it doesn't exist
         os.makedirs('model', exist_ok=True)
@@ -80,21 +163,27 @@ def initialize_detector():
         if os.path.exists('model/best.pt'):
             print("Using custom garbage detection model")
             # Lower confidence threshold for custom model (more sensitive detection)
-            detector = GarbageDetector(model_path='model/best.pt', conf_threshold=0.25)
+            detector = GarbageDetector(model_path='model/best.pt', conf_threshold=0.25, img_size=IMG_SIZE)
         else:
             # Use pre-trained model
             print("Using pre-trained YOLOv5 model")
-            detector = GarbageDetector(conf_threshold=0.25)
-            
+            detector = GarbageDetector(conf_threshold=0.25, img_size=IMG_SIZE)
+        
+        detector = wrap_cascade(detector)
         print("Garbage detector initialized successfully")
     except Exception as e:
         print(f"Error initializing detector: {e}")
         raise  # Re-raise the exception to stop the application
 
+def wrap_cascade(base_detector):
+    """Put the presence classifier in front of the detector when CLEANSIGHT_CASCADE is set"""
+    threshold = float(CASCADE_THRESHOLD) if CASCADE_THRESHOLD else None
+    return wrap_detector(base_detector, CASCADE_PATH, threshold)
+
 def is_trash_object(class_id, class_name):
     """Check if a detected object is considered garbage"""
-    # For custom model
-    if class_name == 'trash':
+    # For custom model (single 'garbage' class, or trash/bin models)
+    if class_name in ('garbage', 'trash'):
         return True
     
     # For pre-trained model
@@ -107,122 +196,218 @@ def is_trash_object(class_id, class_name):
     
     return False
 
-def generate_frames():
-    global camera, garbage_detected, last_detection_time, detector
+def update_garbage_state(detections, camera_id=None, frame=None):
+    """Track whether garbage is in view and send an alert when it first appears"""
+    global garbage_detected, last_detection_time
     
-    if camera is None:
-        try:
-            camera = cv2.VideoCapture(0)  # Use default webcam
-            
-            # Set higher resolution for better detection
-            camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    # Check for garbage based on our classes or mapped classes
+    garbage_found = False
+    for det in detections:
+        if is_trash_object(det['class'], det['name']):
+            garbage_found = True
+            break
+    
+    # Update garbage detection status
+    if garbage_found:
+        if not garbage_detected:
+            garbage_detected = True
+            last_detection_time = datetime.now()
             
-            # Check if camera is opened successfully
-            if not camera.isOpened():
-                print("Error: Unable to access webcam. Make sure webcam is connected.")
-                # Create a blank frame with error message
-                blank_frame = np.zeros((480, 640, 3), np.uint8)
-                cv2.putText(blank_frame, "Camera Error - No Device Found", (80, 240), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                ret, buffer = cv2.imencode('.jpg', blank_frame)
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                return
-        except Exception as e:
-            print(f"Error initializing camera: {e}")
-            # Create a blank frame with error message
-            blank_frame = np.zeros((480, 640, 3), np.uint8)
-            cv2.putText(blank_frame, f"Camera Error: {str(e)[:30]}", (80, 240), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', blank_frame)
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            return
+            # Send alert
+            check_and_send_alert(camera_id=camera_id, frame=frame)
+    else:
+        garbage_detected = False
+
+def alert_only_check(frame):
+    """Detection on a frame sampled while nobody is watching; only the alert state matters"""
+    if detector is None:
+        initialize_detector()
+    result = scheduler.detect(camera.camera_id, frame)
+    if result is not None:
+        update_garbage_state(result[0], camera.camera_id, result[1])
+        if clips is not None and clips.wants_frame(camera.camera_id):
+            # Nothing is streaming, so this is the only frame there is for a clip
+            ok, buffer = executor.run_blocking(cv2.imencode, '.jpg', frame)
+            if ok:
+                clips.push(camera.camera_id, buffer.tobytes(), frame.shape)
+
+def run_detector(frame, **kwargs):
+    """One detection on the inference executor, drawing on the frame in place"""
+    return executor.run_inference(detector.detect, frame, copy=False, **kwargs)
+
+def is_garbage_result(result):
+    return any(is_trash_object(d['class'], d['name']) for d in result[0])
+
+snapshots = SnapshotWriter(
+    min_interval=SNAPSHOT_INTERVAL,
+    quota_bytes=int(SNAPSHOT_QUOTA_MB * 1024 * 1024),
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep,
+    run_blocking=executor.run_blocking,
+)
+
+clips = ClipRecorder(
+    pre_roll=CLIP_PRE_ROLL,
+    post_roll=CLIP_POST_ROLL,
+    max_bytes=int(CLIP_MEMORY_MB * 1024 * 1024),
+    max_fps=CLIP_FPS,
+    fmt=CLIP_FORMAT,
+    snapshots=snapshots,
+    quota_bytes=int(CLIP_QUOTA_MB * 1024 * 1024),
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep,
+    run_blocking=executor.run_blocking,
+) if CLIPS_ENABLED else None
+
+# Cameras take turns on the detector by deadline; ones with recent garbage or motion go more often
+scheduler = InferenceScheduler(run_detector, concurrency=executor.inference_workers, hit_fn=is_garbage_result)
+
+# Capture is reference-counted per camera: full rate while viewers are connected,
+# alert-only while they are not, released by /api/stop_video
+cameras = CameraManager(
+    on_idle_frame=alert_only_check,
+    idle_interval=IDLE_INTERVAL,
+    release_when_idle=IDLE_RELEASE,
+    spawn=socketio.start_background_task,
+    sleep=socketio.sleep,
+    run_blocking=executor.run_blocking,
+)
+camera = cameras.add(0, CAMERA_SOURCE, record_path=CAMERA_RECORD)
+governor = Governor(camera.camera_id, budget=float(LATENCY_BUDGET_MS) / 1000.0 if LATENCY_BUDGET_MS else None,
+                    img_size=IMG_SIZE, base_interval=1)
+scheduler.register(camera.camera_id, interval=DETECT_INTERVAL, governor=governor)
+
+def generate_frames():
+    global detector
+    
+    try:
+        # Opening happens on the reader thread; until the camera delivers,
+        # the stream shows a reconnecting frame instead of failing
+        viewer = camera.acquire()
+    except Exception as e:
+        print(f"Error initializing camera: {e}")
+        # Create a blank frame with error message
+        blank_frame = np.zeros((480, 640, 3), np.uint8)
+        cv2.putText(blank_frame, f"Camera Error: {str(e)[:30]}", (80, 240), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        ret, buffer = cv2.imencode('.jpg', blank_frame)
+        frame_bytes = buffer.tobytes()
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        return
     
     if detector is None:
         initialize_detector()
     
-    # Frame counter for periodic detection (to save resources)
-    frame_count = 0
+    # Count this viewer for as long as the stream stays open; the camera drops
+    # back to alert-only when the last one leaves
+    metrics.VIEWERS.inc()
+    # Each viewer records its own frames, so concurrent streams never share a trace record
+    trace = tracer.stream()
+    try:
+        yield from _stream_frames(viewer, trace)
+    finally:
+        trace.close()
+        viewer.close()
+        metrics.VIEWERS.dec()
+
+def _stream_frames(source, trace):
+    camera_id = source.camera.camera_id
     
     while True:
-        success, frame = camera.read()
+        capture_start = time.perf_counter()
+        # Waits at most frame_sources.DEFAULT_READ_TIMEOUT for a new frame
+        success, frame = executor.run_blocking(source.read)
+        capture_end = time.perf_counter()
+        metrics.CAPTURE.observe(capture_end - capture_start)
+        trace.start_frame(capture_start)
+        trace.span(frame_trace.CAPTURE, capture_start, capture_end)
         if not success:
-            # Return a blank frame if camera read fails
+            metrics.DROPPED_FRAMES.inc()
+            trace.end_frame(dropped=True)
+            if not source.isOpened():
+                # Stopped through /api/stop_video, or a non-looping file or replay has finished
+                return
+            # The reader thread reconnects in the background; keep the stream alive meanwhile
             blank_frame = np.zeros((480, 640, 3), np.uint8)
-            cv2.putText(blank_frame, "Camera Error", (200, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            cv2.putText(blank_frame, "Camera Error - Reconnecting", (100, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
             ret, buffer = cv2.imencode('.jpg', blank_frame)
             frame_bytes = buffer.tobytes()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            # Try to reinitialize camera
-            camera.release()
-            camera = cv2.VideoCapture(0)
-            time.sleep(1)  # Wait before trying again
             continue
             
+        metrics.FRAMES.inc()
         try:
-            frame_count += 1
-            do_detection = (frame_count % 5 == 0)  # Only run detection every 5 frames
+            # Only run detection when this camera's turn comes (to save resources)
+            # Stage timings come back per call; the shared detector's last_timings
+            # may already belong to another viewer's frame
+            timings = {}
+            result = scheduler.detect(camera_id, frame, timings=timings) if scheduler.due(camera_id, frame) else None
+            do_detection = result is not None
             
             if do_detection:
                 # Process frame with real detector
-                detections, annotated_frame = detector.detect(frame)
-                
-                # Check for garbage based on our classes or mapped classes
-                garbage_found = False
-                for det in detections:
-                    if is_trash_object(det['class'], det['name']):
-                        garbage_found = True
-                        break
-                
-                # Update garbage detection status
-                if garbage_found:
-                    if not garbage_detected:
-                        garbage_detected = True
-                        last_detection_time = datetime.now()
-                        
-                        # Send alert
-                        check_and_send_alert()
-                else:
-                    garbage_detected = False
+                # The captured frame is ours, so boxes are drawn on it in place
+                detections, annotated_frame = result
+                trace.spans(timings)
+                update_garbage_state(detections, camera_id, annotated_frame)
             else:
                 # If we're not doing detection, just use the last annotated frame or the current frame
                 if 'annotated_frame' not in locals():
                     annotated_frame = frame
             
-            # Add timestamp to frame
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cv2.putText(annotated_frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            draw_start = time.perf_counter()
+            
+            # Add timestamp to frame (re-rendered once per second)
+            renderer.timestamp(annotated_frame, (10, 30), (0, 255, 0))
             
             # Add system status
             status_text = "Garbage Detected" if garbage_detected else "No Garbage"
             status_color = (0, 0, 255) if garbage_detected else (0, 255, 0)
-            cv2.putText(annotated_frame, status_text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
+            renderer.text(annotated_frame, status_text, (10, 60), status_color)
+            
+            encode_start = time.perf_counter()
+            metrics.DRAW.observe(encode_start - draw_start)
             
             # Convert to jpeg
-            ret, buffer = cv2.imencode('.jpg', annotated_frame)
-            frame = buffer.tobytes()
+            ret, buffer = executor.run_blocking(cv2.imencode, '.jpg', annotated_frame)
+            # Kept apart from frame, which the error path below still draws on
+            jpeg = buffer.tobytes()
+            if clips is not None:
+                # Already encoded for the stream, so the clip buffer gets it for free
+                clips.push(camera_id, jpeg, annotated_frame.shape, capture_start)
+            encode_end = time.perf_counter()
+            metrics.ENCODE.observe(encode_end - encode_start)
+            trace.span(frame_trace.ENCODE, encode_start, encode_end)
+            trace.end_frame(detection=do_detection, garbage=garbage_detected)
             
             yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
                    
         except Exception as e:
             print(f"Error processing frame: {e}")
+            metrics.DROPPED_FRAMES.inc()
+            trace.end_frame(dropped=True)
             # Return error frame
             error_frame = frame.copy()
             cv2.putText(error_frame, f"Processing Error: {str(e)[:30]}", (10, 30), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             ret, buffer = cv2.imencode('.jpg', error_frame)
-            frame = buffer.tobytes()
+            jpeg = buffer.tobytes()
             
             yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+def static_url(path):
+    return '/' + path.replace(os.sep, '/')
+
+def clip_written(alert, clip):
+    """Mark an alert's clip as available once the background writer has saved it"""
+    alert['clip_ready'] = True
+    socketio.emit('alert_update', alert)
 
-def check_and_send_alert(image_path=None):
+def check_and_send_alert(image_path=None, camera_id=None, frame=None):
     global last_alert_time, alerts
     
     current_time = datetime.now()
@@ -231,20 +416,37 @@ def check_and_send_alert(image_path=None):
     if last_alert_time is None or (current_time - last_alert_time).total_seconds() > alert_cooldown:
         last_alert_time = current_time
         
-        # Create alert 
+        # Create alert (its id is assigned when it is stored)
         alert = {
-            'id': len(alerts) + 1,
+            'id': None,
             'timestamp': current_time.strftime("%Y-%m-%d %H:%M:%S"),
             'message': 'Garbage detected! Cleanup required.',
             'location': 'Camera 1',
             'status': 'pending',
             'assignedTo': ''
         }
+        if image_path:
+            alert['image_path'] = image_path
         
-        alerts.append(alert)
+        if clips is not None:
+            # Pre-roll is already buffered; the post-roll and the snapshot (the first
+            # frame after this detection) are written in the background
+            clip_path, snapshot_path = clips.trigger(camera_id if camera_id is not None else camera.camera_id,
+                                                     on_written=lambda clip: clip_written(alert, clip))
+            alert['image_path'] = image_path or static_url(snapshot_path)
+            alert['clip_path'] = static_url(clip_path)
+            alert['clip_ready'] = False
+        elif frame is not None and not image_path:
+            # Encoded and written in the background; the file appears shortly after the alert
+            snapshot_path = snapshots.submit(frame, camera_id if camera_id is not None else camera.camera_id, force=True)
+            if snapshot_path:
+                alert['image_path'] = static_url(snapshot_path)
         
-        # Send alert via WebSocket
-        socketio.emit('alert', alert)
+        store_alert(alert)
+        metrics.ALERTS.labels(source='camera').inc()
+        
+        # Send alert via WebSocket without holding up the frame loop
+        socketio.start_background_task(socketio.emit, 'alert', alert)
         print(f"Alert sent: {alert}")
 
 @app.route('/')
@@ -263,10 +465,67 @@ def rural_area():
 def video_feed():
     return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/api/source')
+def source_status():
+    return jsonify(dict(camera.status(), active=camera.running))
+
+@app.route('/api/governor')
+def governor_status():
+    return jsonify(governor.status())
+
+@app.route('/api/scheduler')
+def scheduler_status():
+    return jsonify(scheduler.status())
+
+@app.route('/api/snapshots')
+def snapshot_status():
+    return jsonify(snapshots.status())
+
+@app.route('/api/clips')
+def clip_status():
+    if clips is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(clips.status(), enabled=True))
+
+@app.route('/api/cascade')
+def cascade_stats():
+    if not isinstance(detector, CascadeDetector):
+        return jsonify({'enabled': False})
+    return jsonify(dict(detector.stats(), enabled=True))
+
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
     return jsonify(alerts)
 
+def next_alert_id():
+    """Next unused alert id; call with alerts_lock held"""
+    return next(_alert_ids)
+
+def store_alert(alert):
+    """Give a new alert its id and add it to the alerts"""
+    with alerts_lock:
+        alert['id'] = next_alert_id()
+        alerts.append(alert)
+    return alert
+
+def build_alert(data, alert_id=None):
+    """Alert from a create request body (message and location already checked)"""
+    alert = {
+        'id': alert_id,
+        'timestamp': data.get('timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        'message': data['message'],
+        'location': data['location'],
+        'status': data.get('status', 'pending'),
+        'assignedTo': data.get('assignedTo')
+    }
+    if data.get('image_path'):
+        alert['image_path'] = data['image_path']
+    return alert
+
 @app.route('/api/alerts', methods=['POST'])
 def create_alert():
     data = request.json
@@ -275,18 +534,10 @@ def create_alert():
     if 'message' not in data or 'location' not in data:
         return jsonify({'error': 'Missing required fields'}), 400
     
-    # Create a new alert with the next available ID
-    new_alert = {
-        'id': len(alerts) + 1,
-        'timestamp': data.get('timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-        'message': data['message'],
-        'location': data['location'],
-        'status': data.get('status', 'pending'),
-        'assignedTo': data.get('assignedTo')
-    }
-    
-    # Add to alerts list
-    alerts.append(new_alert)
+    # Add to alerts list with the next available ID
+    new_alert = store_alert(build_alert(data))
+    # Watch-folder ingest (ingest.py) posts here too; count it separately
+    metrics.ALERTS.labels(source='ingest' if data.get('source') == 'ingest' else 'api').inc()
     
     # Notify connected clients
     socketio.emit('alert', new_alert)
@@ -297,34 +548,252 @@ def create_alert():
 def update_alert(alert_id):
     data = request.json
     
-    for i, alert in enumerate(alerts):
-        if alert['id'] == alert_id:
+    with alerts_lock:
+        alert = next((alert for alert in alerts if alert['id'] == alert_id), None)
+        if alert is not None:
             # Update fields that were provided
             if 'status' in data:
                 alert['status'] = data['status']
             if 'assignedTo' in data:
                 alert['assignedTo'] = data['assignedTo']
+    
+    if alert is None:
+        return jsonify({'error': 'Alert not found'}), 404
+    
+    # Emit event to notify clients
+    socketio.emit('alert_update', alert)
+    return jsonify(alert)
+
+def stage_bulk_op(op, existing, staged, created):
+    """
+    Check one bulk operation and stage its change without touching the alerts
+    
+    Args:
+        op: Parsed NDJSON line
+        existing: Current alerts by id
+        staged: Copies of the alerts changed so far in this batch, by id (updated in place)
+        created: Alerts created so far in this batch (appended to)
+        
+    Returns:
+        dict: Result for the line, with an HTTP-style status
+    """
+    kind = op.get('op', 'create')
+    if kind == 'create':
+        if 'message' not in op or 'location' not in op:
+            return {'op': kind, 'status': 400, 'error': 'Missing required fields'}
+        # Ids of a batch that is rolled back are not reused
+        alert = build_alert(op, next_alert_id())
+        created.append(alert)
+        staged[alert['id']] = alert
+        return {'op': kind, 'id': alert['id'], 'status': 201}
+    
+    if kind not in ('update', 'assign'):
+        return {'op': kind, 'status': 400, 'error': f'Unknown op: {kind}'}
+    alert_id = op.get('id')
+    if alert_id not in staged and alert_id not in existing:
+        return {'op': kind, 'id': alert_id, 'status': 404, 'error': 'Alert not found'}
+    if kind == 'assign' and not op.get('assignedTo'):
+        return {'op': kind, 'id': alert_id, 'status': 400, 'error': 'Missing assignedTo'}
+    
+    alert = staged.setdefault(alert_id, dict(existing.get(alert_id, {})))
+    if kind == 'assign':
+        # Same change as assigning a task from the dashboard
+        alert['status'] = op.get('status', 'assigned')
+        alert['assignedTo'] = op['assignedTo']
+    else:
+        if 'status' in op:
+            alert['status'] = op['status']
+        if 'assignedTo' in op:
+            alert['assignedTo'] = op['assignedTo']
+    return {'op': kind, 'id': alert_id, 'status': 200}
+
+def apply_bulk_batch(lines):
+    """
+    Apply a batch of NDJSON lines as one transaction
+    
+    Every line is checked against the alerts as the earlier lines leave
+    them; if any line fails, nothing in the batch is applied and the lines
+    that were fine are reported as rolled back (409).
+    
+    Args:
+        lines: (line number, text) pairs
+        
+    Returns:
+        (results, created, updated): Per-line results and the alerts created and changed
+    """
+    with alerts_lock:
+        existing = {alert['id']: alert for alert in alerts}
+        staged, created, results = {}, [], []
+        for number, text in lines:
+            try:
+                op = json.loads(text)
+                if not isinstance(op, dict):
+                    raise ValueError('expected an object')
+                result = stage_bulk_op(op, existing, staged, created)
+            except (ValueError, TypeError) as e:
+                result = {'status': 400, 'error': f'Invalid line: {e}'}
+            result['line'] = number
+            results.append(result)
+        
+        if any(result['status'] >= 400 for result in results):
+            for result in results:
+                if result['status'] < 400:
+                    result['status'] = 409
+                    result['error'] = 'Rolled back with its batch'
+            metrics.ALERT_BULK_LINES.labels(outcome='rejected').inc(len(results))
+            return results, [], []
+        
+        alerts.extend(created)
+        updated = []
+        for alert_id, alert in staged.items():
+            if alert_id in existing:
+                # In place, so references held elsewhere (e.g. pending clips) see the change
+                existing[alert_id].update(alert)
+                updated.append(existing[alert_id])
+        metrics.ALERT_BULK_LINES.labels(outcome='applied').inc(len(results))
+        metrics.ALERTS.labels(source='bulk').inc(len(created))
+        return results, created, updated
+
+@app.route('/api/alerts/bulk', methods=['POST'])
+def bulk_alerts():
+    """
+    Create, update and assign alerts from an NDJSON stream
+    
+    Each line is one operation: {"op": "create", "message": ..., "location": ...},
+    {"op": "update", "id": 3, "status": "resolved"} or
+    {"op": "assign", "id": 3, "assignedTo": "Team A"}. Lines are read as
+    they arrive and applied in transactions of BULK_BATCH_SIZE; each batch
+    is announced with a single 'alerts_bulk' socket event. The response
+    streams one NDJSON result per line, in order.
+    """
+    def results():
+        batch = []
+        number = 0
+        for raw in request.stream:
+            number += 1
+            text = raw.decode('utf-8', errors='replace').strip()
+            if not text:
+                continue
+            batch.append((number, text))
+            if len(batch) >= BULK_BATCH_SIZE:
+                yield from apply_and_publish(batch)
+                batch = []
+        if batch:
+            yield from apply_and_publish(batch)
+    
+    def apply_and_publish(batch):
+        line_results, created, updated = apply_bulk_batch(batch)
+        if created or updated:
+            socketio.emit('alerts_bulk', {'created': created, 'updated': updated})
+        for result in line_results:
+            yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
+EDGE_EVENT_TYPES = ('garbage', 'cleared')
+
+def check_edge_event(event):
+    """
+    Validate one edge event before any of its batch is applied
+    
+    Returns:
+        (event, thumbnail): The event with its camera name normalised, and the decoded
+        thumbnail JPEG (or None); raises ValueError or TypeError if it is malformed
+    """
+    if not isinstance(event, dict):
+        raise TypeError(f'event is not an object: {event!r}')
+    if event.get('type') not in EDGE_EVENT_TYPES:
+        raise ValueError(f"unknown event type: {event.get('type')!r}")
+    if not isinstance(event.get('detections', []), list):
+        raise TypeError('detections is not a list')
+    event = dict(event, camera=str(event.get('camera', 'cam0')))
+    thumbnail = event.pop('thumbnail', None)
+    if thumbnail is not None:
+        thumbnail = base64.b64decode(thumbnail, validate=True)
+    return event, thumbnail
+
+@app.route('/api/edge/events', methods=['POST'])
+def edge_events():
+    """Accept a (gzipped) batch of detection events from an edge agent and raise its alerts"""
+    if EDGE_TOKEN and request.headers.get('X-Edge-Token') != EDGE_TOKEN:
+        return jsonify({'error': 'Invalid edge token'}), 403
+    
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        batch = json.loads(body)
+        agent_id = str(batch['agent'])
+        sequence = int(batch['batch'])
+        # Sequences only count up within one run of the agent's spool
+        epoch = request.headers.get('X-Edge-Epoch')
+        events = [check_edge_event(event) for event in batch['events']]
+    except (OSError, EOFError, zlib.error, ValueError, KeyError, TypeError) as e:
+        # Rejected before anything is applied, so the agent drops the batch instead of retrying it
+        return jsonify({'error': f'Invalid event batch: {e}'}), 400
+    
+    created = []
+    with alerts_lock:
+        agent = edge_agents.setdefault(agent_id, {'last_batch': 0, 'events': 0, 'alerts': 0, 'cameras': {}})
+        agent['last_seen'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if agent.get('epoch') != epoch:
+            agent['epoch'] = epoch
+            agent['last_batch'] = 0
+        if sequence == agent['last_batch']:
+            # Resent because our response was lost; it has been applied already
+            return jsonify({'status': 'duplicate', 'batch': sequence})
+        if sequence < agent['last_batch']:
+            # Not something we applied; the agent starts a new run and resends
+            return jsonify({'error': f"Batch {sequence} is behind batch {agent['last_batch']} of this run"}), 409
+        
+        for event, thumbnail in events:
+            kind = event['type']
+            camera_name = f"{agent_id}/{event['camera']}"
+            metrics.EDGE_EVENTS.labels(kind=kind).inc()
+            agent['cameras'][event['camera']] = {'garbage': kind == 'garbage', 'timestamp': event.get('timestamp')}
+            if kind != 'garbage':
+                continue
             
-            # Emit event to notify clients
-            socketio.emit('alert_update', alert)
-            return jsonify(alert)
+            alert = {
+                'id': next_alert_id(),
+                'timestamp': event.get('timestamp') or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'message': f'Garbage detected by {camera_name}. Cleanup required.',
+                'location': batch.get('location') or camera_name,
+                'status': 'pending',
+                'assignedTo': '',
+                'detections': event.get('detections', [])
+            }
+            if thumbnail:
+                snapshot_path = snapshots.submit(thumbnail, camera_name, force=True)
+                if snapshot_path:
+                    alert['image_path'] = static_url(snapshot_path)
+            alerts.append(alert)
+            created.append(alert)
+        
+        agent['last_batch'] = sequence
+        agent['events'] += len(events)
+        agent['alerts'] += len(created)
     
-    return jsonify({'error': 'Alert not found'}), 404
+    metrics.ALERTS.labels(source='edge').inc(len(created))
+    for alert in created:
+        socketio.emit('alert', alert)
+    
+    return jsonify({'status': 'ok', 'batch': sequence, 'alerts': [alert['id'] for alert in created]})
+
+@app.route('/api/edge/agents')
+def edge_agent_status():
+    return jsonify(edge_agents)
 
 # New routes for controlling the video feed
 @app.route('/api/start_video', methods=['POST'])
 def start_video():
-    global camera
-    
     try:
-        # Initialize camera if it's not already active
-        if camera is None or not camera.isOpened():
-            camera = cv2.VideoCapture(0)  # Use default webcam
-            camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-            
-            if not camera.isOpened():
-                return jsonify({'error': 'Failed to start camera'}), 500
+        # Initialize camera if it's not already active (alert-only until a viewer connects)
+        reader = camera.start()
+        if not executor.run_blocking(reader.wait_connected, CAMERA_START_TIMEOUT):
+            error = reader.last_error
+            camera.stop()
+            return jsonify({'error': f'Failed to start camera: {error}'}), 500
         
         return jsonify({'success': True, 'message': 'Video started successfully'})
     except Exception as e:
@@ -333,13 +802,9 @@ def start_video():
 
 @app.route('/api/stop_video', methods=['POST'])
 def stop_video():
-    global camera
-    
     try:
-        # Release the camera if it's active
-        if camera is not None and camera.isOpened():
-            camera.release()
-            camera = None
+        # Release the camera; open streams end on their next frame
+        camera.stop()
         
         return jsonify({'success': True, 'message': 'Video stopped successfully'})
     except Exception as e:
@@ -349,19 +814,32 @@ def stop_video():
 @socketio.on('connect')
 def handle_connect():
     print('Client connected')
+    metrics.SOCKET_CLIENTS.inc()
     emit('alerts', alerts)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    metrics.SOCKET_CLIENTS.dec()
 
 def cleanup():
-    global camera
+    # Release the cameras on application shutdown
+    cameras.stop_all()
+    print("Camera resources released")
+    
+    if clips is not None:
+        # Write clips still collecting post-roll
+        clips.close()
+    
+    # Write and fsync queued snapshots (including the clips' own)
+    snapshots.close()
     
-    # Release the camera on application shutdown
-    if camera is not None and camera.isOpened():
-        camera.release()
-        print("Camera resources released")
+    if hasattr(detector, 'close'):
+        detector.close()
+    
+    executor.shutdown()
+    
+    tracer.close()
 
 # After the existing routes, add routes for handling rural area request images
 @app.route('/upload_rural_image', methods=['POST'])
@@ -420,7 +898,9 @@ def submit_rural_request():
                 alert_data['image_path'] = os.path.join('uploads', unique_filename)
         
         # Add to alerts
-        alerts.append(alert_data)
+        with alerts_lock:
+            alerts.append(alert_data)
+        metrics.ALERTS.labels(source='rural').inc()
         
         # Emit socket event to notify clients
         socketio.emit('new_alert', alert_data)
@@ -436,11 +916,13 @@ def update_alert_status():
         alert_id = data.get('id')
         new_status = data.get('status')
         
-        for alert in alerts:
-            if alert['id'] == alert_id:
+        with alerts_lock:
+            alert = next((alert for alert in alerts if alert['id'] == alert_id), None)
+            if alert is not None:
                 alert['status'] = new_status
-                socketio.emit('alert_updated', alert)
-                return jsonify({'success': True, 'message': 'Alert status updated'})
+        if alert is not None:
+            socketio.emit('alert_updated', alert)
+            return jsonify({'success': True, 'message': 'Alert status updated'})
         
         return jsonify({'success': False, 'message': 'Alert not found'}), 404
     except Exception as e:
@@ -453,9 +935,13 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"Error initializing detector: {e}")
     
+    # With the debug reloader only the serving child process may open the camera
+    if AUTOSTART and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        camera.start()
+    
     # Run the Flask app
     try:
-        print("Starting CleanSight application...")
+        print(f"Starting CleanSight application (async mode: {socketio.async_mode})...")
         print("Access the application at http://localhost:5000")
         socketio.run(app, debug=True, host='0.0.0.0')
     finally:
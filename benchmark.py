@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+# Offline benchmark suite for the CleanSight detection pipeline
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+import torchvision
+
+from frame_sources import FrameSource
+from preprocess import LetterboxPreprocessor, letterbox_shape
+
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+
+# Default YOLOv5 anchors (pixels) for strides 8, 16 and 32
+YOLOV5_ANCHORS = [
+    [10, 13, 16, 30, 33, 23],
+    [30, 61, 62, 45, 59, 119],
+    [116, 90, 156, 198, 373, 326],
+]
+
+
+class _ConvBlock(nn.Module):
+    """Conv + BatchNorm + SiLU, the building block used throughout YOLOv5"""
+
+    def __init__(self, c_in, c_out, stride=1):
+        super().__init__()
+        self.conv = nn.Conv2d(c_in, c_out, 3, stride, 1, bias=False)
+        self.bn = nn.BatchNorm2d(c_out)
+        self.act = nn.SiLU()
+
+    def forward(self, x):
+        return self.act(self.bn(self.conv(x)))
+
+
+class TinyYolo(nn.Module):
+    """
+    Randomly initialized network with the same output contract as a YOLOv5 model
+
+    Three detection levels (strides 8/16/32) with three anchors each, returning
+    (batch, boxes, 5 + nc) predictions in input pixel coordinates exactly like
+    YOLOv5's Detect layer in eval mode. It is small enough to make the benchmark
+    numbers reflect the code around the model rather than the model itself.
+    """
+
+    def __init__(self, nc=1, width=8, obj_bias=-6.0):
+        super().__init__()
+        self.nc = nc
+        self.no = nc + 5
+        self.na = 3
+        self.stride = torch.tensor([8.0, 16.0, 32.0])
+        self.register_buffer('anchors', torch.tensor(YOLOV5_ANCHORS, dtype=torch.float32).view(3, 3, 2))
+
+        self.stem = nn.Sequential(
+            _ConvBlock(3, width, 2),
+            _ConvBlock(width, width * 2, 2),
+            _ConvBlock(width * 2, width * 2, 2),
+        )
+        self.down16 = _ConvBlock(width * 2, width * 4, 2)
+        self.down32 = _ConvBlock(width * 4, width * 8, 2)
+        self.heads = nn.ModuleList(
+            nn.Conv2d(c, self.na * self.no, 1) for c in (width * 2, width * 4, width * 8)
+        )
+
+        # Spread the head weights so scores vary with the input, and bias
+        # objectness low so only a handful of boxes survive the threshold,
+        # like a trained model on a mostly empty scene
+        for head in self.heads:
+            nn.init.normal_(head.weight, std=0.5)
+            bias = head.bias.data.view(self.na, self.no)
+            bias[:, 4] = obj_bias
+
+    @torch.no_grad()
+    def calibrate(self, height=384, width=640):
+        """Fill the BatchNorm running statistics from random input, as training would"""
+        for module in self.modules():
+            if isinstance(module, nn.BatchNorm2d):
+                module.momentum = None
+        self.train()
+        self(torch.rand(2, 3, height, width))
+        return self.eval()
+
+    def forward(self, x):
+        p8 = self.stem(x)
+        p16 = self.down16(p8)
+        p32 = self.down32(p16)
+
+        outputs = []
+        for i, feature in enumerate((p8, p16, p32)):
+            y = self.heads[i](feature)
+            bs, _, ny, nx = y.shape
+            y = y.view(bs, self.na, self.no, ny, nx).permute(0, 1, 3, 4, 2).sigmoid()
+
+            yv, xv = torch.meshgrid(torch.arange(ny), torch.arange(nx), indexing='ij')
+            grid = torch.stack((xv, yv), 2).view(1, 1, ny, nx, 2).float()
+            anchor_grid = self.anchors[i].view(1, self.na, 1, 1, 2)
+
+            xy = (y[..., :2] * 2 - 0.5 + grid) * self.stride[i]
+            wh = (y[..., 2:4] * 2) ** 2 * anchor_grid
+            outputs.append(torch.cat((xy, wh, y[..., 4:]), -1).view(bs, -1, self.no))
+
+        return torch.cat(outputs, 1), None
+
+
+class _TinyResults:
+    """Subset of the YOLOv5 hub Detections object used by the detectors"""
+
+    def __init__(self, xyxy, names):
+        self.xyxy = xyxy
+        self.names = names
+
+    def pandas(self):
+        import pandas as pd
+
+        columns = ['xmin', 'ymin', 'xmax', 'ymax', 'confidence', 'class', 'name']
+        frames = []
+        for det in self.xyxy:
+            rows = [list(d[:5]) + [int(d[5]), self.names[int(d[5])]] for d in det.tolist()]
+            frames.append(pd.DataFrame(rows, columns=columns))
+
+        class _Pandas:
+            pass
+
+        result = _Pandas()
+        result.xyxy = frames
+        return result
+
+
+class TinyAutoShape(nn.Module):
+    """
+    Stand-in for the model returned by torch.hub.load('ultralytics/yolov5', ...)
+
+    Accepts the same call signature (numpy image, size=...) and returns an
+    object exposing .xyxy and .pandas(), doing letterbox, inference and NMS on
+    the way. Tensor input returns the raw model output, as AutoShape does.
+    """
+
+    def __init__(self, nc=1, names=None, seed=0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.model = TinyYolo(nc=nc).calibrate()
+        self.names = names or {i: f"class{i}" for i in range(nc)}
+        self.conf = 0.25
+        self.iou = 0.45
+        self.classes = None
+        self.multi_label = False
+        self.stride = 32
+
+    def forward(self, ims, size=640):
+        if isinstance(ims, torch.Tensor):
+            with torch.inference_mode():
+                return self.model(ims)
+
+        h0, w0 = ims.shape[:2]
+        gain, (new_h, new_w), (top, left), (input_h, input_w) = letterbox_shape(h0, w0, size, self.stride)
+
+        resized = cv2.resize(ims, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        padded = cv2.copyMakeBorder(resized, top, input_h - new_h - top, left, input_w - new_w - left,
+                                    cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        x = torch.from_numpy(np.ascontiguousarray(padded.transpose(2, 0, 1))).float().div_(255).unsqueeze(0)
+
+        with torch.inference_mode():
+            pred = self.model(x)[0][0]
+
+        scores = pred[:, 4:5] * pred[:, 5:]
+        conf, cls = scores.max(1)
+        keep = conf > self.conf
+        pred, conf, cls = pred[keep], conf[keep], cls[keep]
+
+        boxes = torch.empty((pred.shape[0], 4))
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        keep = torchvision.ops.batched_nms(boxes, conf, cls, self.iou)[:300]
+
+        boxes[:, [0, 2]] -= left
+        boxes[:, [1, 3]] -= top
+        det = torch.cat((boxes[keep] / gain, conf[keep, None], cls[keep, None].float()), 1)
+        det[:, [0, 2]] = det[:, [0, 2]].clamp(0, w0)
+        det[:, [1, 3]] = det[:, [1, 3]].clamp(0, h0)
+        return _TinyResults([det], self.names)
+
+
+def make_synthetic_frame(seed=0, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """
+    Build a reproducible BGR test frame with textured background and blobs
+
+    Args:
+        seed: Random seed
+        width: Frame width
+        height: Frame height
+
+    Returns:
+        uint8 BGR image of shape (height, width, 3)
+    """
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(12):
+        x, y = int(rng.integers(0, width - 100)), int(rng.integers(0, height - 100))
+        w, h = int(rng.integers(20, 200)), int(rng.integers(20, 200))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+    return frame
+
+
+class SyntheticCamera(FrameSource):
+    """
+    Frame source that cycles through pre-built frames
+
+    Capped at a rate well above the pipeline's so the reader thread isn't
+    spinning on frame copies and competing with the code being measured.
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, frames, fps=200.0):
+        super().__init__()
+        self.frames = frames
+        self.fps = fps
+        self.index = 0
+
+    def open(self):
+        return True
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        time.sleep(1.0 / self.fps)
+        frame = self.frames[self.index % len(self.frames)].copy()
+        self.index += 1
+        return True, frame
+
+
+def make_detector(module, nc=1, names=None):
+    """
+    Build a GarbageDetector from the given module around the tiny model
+
+    The constructor is bypassed since it would load weights through torch.hub.
+    """
+    detector = object.__new__(module.GarbageDetector)
+    detector.model = TinyAutoShape(nc=nc, names=names)
+    detector.conf_threshold = 0.25
+    detector.device = torch.device('cpu')
+    detector.class_names = detector.model.names
+    detector.preprocessor = LetterboxPreprocessor()
+    detector.img_size = 640
+    return detector
+
+
+def _time_it(fn, iterations, warmup):
+    """Run fn repeatedly and return per-call durations in milliseconds"""
+    for _ in range(warmup):
+        fn()
+
+    gc.collect()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def _summarize(durations, items_per_call=1):
+    """Reduce a list of durations (ms) to the stats stored in the results file"""
+    d = np.asarray(durations)
+    mean = float(d.mean())
+    return {
+        'iterations': len(durations),
+        'mean_ms': round(mean, 4),
+        'min_ms': round(float(d.min()), 4),
+        'p50_ms': round(float(np.percentile(d, 50)), 4),
+        'p90_ms': round(float(np.percentile(d, 90)), 4),
+        'p99_ms': round(float(np.percentile(d, 99)), 4),
+        'ops_per_sec': round(items_per_call * 1000 / mean, 2) if mean > 0 else 0,
+    }
+
+
+def bench_detect(frames, iterations, warmup):
+    """detect.GarbageDetector.detect: color conversion, inference call and filtering"""
+    import detect
+
+    detector = make_detector(detect, names={0: 'garbage'})
+    it = iter(range(10 ** 9))
+    return _time_it(lambda: detector.detect(frames[next(it) % len(frames)]), iterations, warmup)
+
+
+def bench_detection_detect(frames, iterations, warmup):
+    """detection.GarbageDetector.detect: inference plus pandas post-processing and drawing"""
+    import detection
+
+    detector = make_detector(detection, names={0: 'garbage'})
+    it = iter(range(10 ** 9))
+    return _time_it(lambda: detector.detect(frames[next(it) % len(frames)]), iterations, warmup)
+
+
+def bench_draw_detections(frames, iterations, warmup, boxes=10, in_place=False):
+    """detect.GarbageDetector.draw_detections with a fixed set of boxes"""
+    import detect
+
+    detector = make_detector(detect, nc=2, names={0: 'bin', 1: 'trash'})
+    rng = np.random.default_rng(1)
+    x1 = rng.uniform(0, FRAME_WIDTH - 200, boxes)
+    y1 = rng.uniform(30, FRAME_HEIGHT - 200, boxes)
+    detections = np.stack([
+        x1, y1, x1 + rng.uniform(20, 200, boxes), y1 + rng.uniform(20, 200, boxes),
+        rng.uniform(0.3, 1.0, boxes), rng.integers(0, 2, boxes)
+    ], axis=1)
+    if in_place:
+        # Redrawing on the same scratch frame; the boxes land in the same place every time
+        scratch = frames[0].copy()
+        return _time_it(lambda: detector.draw_detections(scratch, detections, in_place=True), iterations, warmup)
+    return _time_it(lambda: detector.draw_detections(frames[0], detections), iterations, warmup)
+
+
+def bench_draw_detections_in_place(frames, iterations, warmup):
+    """draw_detections on a frame the caller owns (no copy)"""
+    return bench_draw_detections(frames, iterations, warmup, in_place=True)
+
+
+def bench_jpeg_encode(frames, iterations, warmup):
+    """cv2.imencode of a full frame, as done for every MJPEG frame"""
+    return _time_it(lambda: cv2.imencode('.jpg', frames[0]), iterations, warmup)
+
+
+def bench_generate_frames(frames, iterations, warmup):
+    """app.generate_frames() end-to-end throughput with a synthetic camera"""
+    import app
+
+    app.camera = app.cameras.add(0, SyntheticCamera(frames))
+    app.detector = make_detector(__import__('detection'), names={0: 'garbage'})
+    generator = app.generate_frames()
+    try:
+        return _time_it(lambda: next(generator), iterations, warmup)
+    finally:
+        generator.close()
+        app.camera.stop()
+
+
+def bench_generate_frames_replay(frames, iterations, warmup):
+    """app.generate_frames() fed by a recorded replay through the threaded frame reader"""
+    import app
+    import tempfile
+    import frame_sources
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.frames')
+        recorder = frame_sources.FrameRecorder(path)
+        for frame in frames:
+            recorder.write(frame)
+        recorder.close()
+
+        app.camera = app.cameras.add(0, frame_sources.ReplaySource(path, speed=0, loop=True))
+        app.detector = make_detector(__import__('detection'), names={0: 'garbage'})
+        generator = app.generate_frames()
+        try:
+            return _time_it(lambda: next(generator), iterations, warmup)
+        finally:
+            generator.close()
+            app.camera.stop()
+
+
+def bench_alert_api(frames, iterations, warmup):
+    """POST/PUT/GET round trips on the alert API through the Flask test client"""
+    import app
+
+    client = app.app.test_client()
+    app.alerts.clear()
+    payload = {'message': 'Garbage detected! Cleanup required.', 'location': 'Camera 1'}
+
+    def round_trip():
+        created = client.post('/api/alerts', json=payload).get_json()
+        client.put(f"/api/alerts/{created['id']}", json={'status': 'resolved', 'assignedTo': 'crew'})
+        client.get('/api/alerts')
+
+    try:
+        return _time_it(round_trip, iterations, warmup)
+    finally:
+        app.alerts.clear()
+
+
+BENCHMARKS = {
+    'detect': bench_detect,
+    'detection_detect': bench_detection_detect,
+    'draw_detections': bench_draw_detections,
+    'draw_detections_in_place': bench_draw_detections_in_place,
+    'jpeg_encode': bench_jpeg_encode,
+    'generate_frames': bench_generate_frames,
+    'generate_frames_replay': bench_generate_frames_replay,
+    'alert_api': bench_alert_api,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(names=None, iterations=50, warmup=5):
+    """
+    Run the selected benchmarks and collect their results
+
+    Args:
+        names: Benchmark names to run (None for all)
+        iterations: Timed iterations per benchmark
+        warmup: Untimed iterations before measuring
+
+    Returns:
+        dict: Results in the format written by save_results()
+    """
+    torch.set_num_threads(max(1, torch.get_num_threads()))
+    frames = [make_synthetic_frame(seed) for seed in range(4)]
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'torch': torch.__version__,
+            'opencv': cv2.__version__,
+            'threads': torch.get_num_threads(),
+            'frame_size': [FRAME_WIDTH, FRAME_HEIGHT],
+            'iterations': iterations,
+        },
+        'results': {}
+    }
+
+    for name in names or BENCHMARKS:
+        print(f"Running {name}...")
+        try:
+            durations = BENCHMARKS[name](frames, iterations, warmup)
+        except Exception as e:
+            print(f"  Error: {e}")
+            results['results'][name] = {'error': str(e)}
+            continue
+        stats = _summarize(durations)
+        results['results'][name] = stats
+        print(f"  mean {stats['mean_ms']:.3f} ms  p90 {stats['p90_ms']:.3f} ms  {stats['ops_per_sec']:.1f} ops/s")
+
+    return results
+
+
+def save_results(results, output_path):
+    """Write results as JSON, creating the parent directory if needed"""
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output_path}")
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """
+    Print a side-by-side comparison and return the names that regressed
+
+    Args:
+        baseline: Results dict loaded from an earlier run
+        current: Results dict from this run
+        threshold: Relative slowdown of the mean that counts as a regression
+
+    Returns:
+        list: Names of regressed benchmarks
+    """
+    regressions = []
+    print(f"\n{'benchmark':<20} {'baseline ms':>12} {'current ms':>12} {'change':>9}")
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'mean_ms' not in base or 'mean_ms' not in stats:
+            print(f"{name:<20} {'-':>12} {stats.get('mean_ms', '-'):>12} {'':>9}")
+            continue
+        change = (stats['mean_ms'] - base['mean_ms']) / base['mean_ms']
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{name:<20} {base['mean_ms']:>12.3f} {stats['mean_ms']:>12.3f} {change * 100:>+8.1f}%{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the CleanSight detection pipeline offline')
+    parser.add_argument('--only', type=str, nargs='+', choices=list(BENCHMARKS), default=None,
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--iterations', type=int, default=50,
+                        help='Timed iterations per benchmark')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='Warm-up iterations per benchmark')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown reported as a regression')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+
+    results = run_benchmarks(args.only, args.iterations, args.warmup)
+    output = args.output or os.path.join('benchmarks', 'results', f"{results['meta']['commit'] or 'local'}.json")
+    save_results(results, output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            sys.exit(1)
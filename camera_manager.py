@@ -0,0 +1,273 @@
+# Reference-counted camera lifecycle with an alert-only mode while nobody is watching
+
+import time
+import threading
+
+import metrics
+import frame_sources
+
+# Seconds between alert-only detections while no viewer is connected
+DEFAULT_IDLE_INTERVAL = 5.0
+
+# How often the idle loop re-checks viewers and settings
+IDLE_POLL = 0.5
+
+# Frames skipped after reopening a suspended camera while exposure settles
+IDLE_WARMUP_FRAMES = 5
+
+# Values of the cleansight_camera_mode gauge
+MODE_STOPPED = 0
+MODE_ALERT_ONLY = 1
+MODE_LIVE = 2
+MODE_NAMES = {MODE_STOPPED: 'stopped', MODE_ALERT_ONLY: 'alert-only', MODE_LIVE: 'live'}
+
+
+class Viewer:
+    """
+    One viewer's handle on a ManagedCamera
+
+    Reads like a cv2.VideoCapture. isOpened() turns False when the camera is
+    stopped or its source ends, so a streaming loop can finish cleanly.
+    """
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.closed = False
+        self._subscription = None
+
+    def read(self, timeout=frame_sources.DEFAULT_READ_TIMEOUT):
+        reader = self.camera.reader
+        if reader is None or self.closed:
+            return False, None
+        if self._subscription is None or self._subscription.reader is not reader:
+            self._subscription = reader.subscribe()
+        return self._subscription.read(timeout)
+
+    def isOpened(self):
+        reader = self.camera.reader
+        return not self.closed and self.camera.running and (reader is None or not reader.ended)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._subscription is not None:
+            self._subscription.close()
+        self.camera._release_viewer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ManagedCamera:
+    """
+    A camera shared by any number of viewers
+
+    The device opens on start() or the first acquire() and stays open until
+    stop(). With viewers connected it is read at full rate. When the last
+    viewer leaves, decoding is throttled to one frame per idle_interval and
+    on_idle_frame(frame) runs on each one, so alerts still fire without
+    anyone watching. With release_when_idle the device is closed between
+    idle samples as well.
+
+    Args:
+        camera_id: Name used in metrics and status
+        source: open_source() spec or FrameSource
+        on_idle_frame: Callback for alert-only detection (None disables it)
+        spawn: Starts the idle loop, e.g. socketio.start_background_task
+        sleep: Sleep matching spawn, e.g. socketio.sleep
+        run_blocking: Runs blocking reads off the event loop, e.g. BlockingExecutor.run_blocking
+    """
+
+    def __init__(self, camera_id, source, on_idle_frame=None, idle_interval=DEFAULT_IDLE_INTERVAL,
+                 release_when_idle=False, record_path=None, spawn=None, sleep=time.sleep, run_blocking=None):
+        self.camera_id = str(camera_id)
+        self.source = source
+        self.on_idle_frame = on_idle_frame
+        self.idle_interval = idle_interval
+        self.release_when_idle = release_when_idle
+        self.record_path = record_path
+        self.spawn = spawn or self._spawn_thread
+        self.sleep = sleep
+        self.run_blocking = run_blocking or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+
+        self.reader = None
+        self.viewers = 0
+        self.running = False
+        self.idle_checks = 0
+        self._idle_loop_active = False
+        self._lock = threading.Lock()
+        self._mode_gauge = metrics.CAMERA_MODE.labels(camera=self.camera_id)
+        self._idle_counter = metrics.IDLE_CHECKS.labels(camera=self.camera_id)
+
+    @staticmethod
+    def _spawn_thread(fn):
+        thread = threading.Thread(target=fn, daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def mode(self):
+        if not self.running:
+            return MODE_STOPPED
+        return MODE_LIVE if self.viewers else MODE_ALERT_ONLY
+
+    def _update_rate(self):
+        """Full rate for viewers, one frame per idle interval otherwise"""
+        reader = self.reader
+        if reader is not None:
+            reader.set_max_fps(None if self.viewers else 1.0 / self.idle_interval)
+        self._mode_gauge.set(self.mode)
+
+    def _open_reader(self):
+        """Start the reader thread if the device is not open (callers hold the lock)"""
+        if self.reader is None or self.reader.ended:
+            self.reader = frame_sources.ThreadedReader(self.source, self.record_path).start()
+            self._update_rate()
+        return self.reader
+
+    def _close_reader(self):
+        with self._lock:
+            reader, self.reader = self.reader, None
+        if reader is not None:
+            self.run_blocking(reader.release)
+
+    def _suspend_reader(self):
+        """Release the device between idle samples, unless a viewer has arrived meanwhile"""
+        with self._lock:
+            # Checked under the lock: acquire() counts its viewer before it opens the reader
+            if self.viewers or not self.running:
+                return False
+            reader, self.reader = self.reader, None
+        if reader is not None:
+            self.run_blocking(reader.release)
+        return True
+
+    def start(self):
+        """Open the camera (alert-only until a viewer arrives)"""
+        with self._lock:
+            self.running = True
+            reader = self._open_reader()
+            if not self._idle_loop_active:
+                self._idle_loop_active = True
+                self.spawn(self._idle_loop)
+            self._update_rate()
+        return reader
+
+    def stop(self):
+        """Release the device; connected viewers' streams end"""
+        with self._lock:
+            self.running = False
+        self._close_reader()
+        self._mode_gauge.set(MODE_STOPPED)
+
+    def acquire(self):
+        """Register a viewer, starting the camera if needed"""
+        with self._lock:
+            self.viewers += 1
+        self.start()
+        return Viewer(self)
+
+    def _release_viewer(self):
+        with self._lock:
+            self.viewers = max(0, self.viewers - 1)
+            self._update_rate()
+
+    def _idle_loop(self):
+        subscription = None
+        next_sample = 0.0
+        try:
+            while self.running:
+                if self.viewers or self.on_idle_frame is None:
+                    if subscription is not None:
+                        # Viewers read through their own subscriptions; an idle one
+                        # left registered would count their frames as skipped
+                        subscription.close()
+                        subscription = None
+                    next_sample = time.perf_counter() + self.idle_interval
+                    self.sleep(IDLE_POLL)
+                    continue
+
+                now = time.perf_counter()
+                if now < next_sample:
+                    if self.release_when_idle and self.reader is not None and next_sample - now > IDLE_POLL:
+                        # Suspend the device until the next sample
+                        if self._suspend_reader():
+                            subscription = None
+                    self.sleep(min(next_sample - now, IDLE_POLL))
+                    continue
+                next_sample = now + self.idle_interval
+
+                with self._lock:
+                    if not self.running or self.viewers:
+                        continue
+                    resumed = self.reader is None or self.reader.ended
+                    reader = self._open_reader()
+                if subscription is None or subscription.reader is not reader:
+                    if subscription is not None:
+                        subscription.close()
+                    subscription = reader.subscribe()
+                if resumed:
+                    # A freshly opened camera delivers dark frames while exposure settles
+                    reader.set_max_fps(None)
+                    for _ in range(IDLE_WARMUP_FRAMES):
+                        self.run_blocking(subscription.read)
+                    self._update_rate()
+
+                ok, frame = self.run_blocking(subscription.read, self.idle_interval + 1.0)
+                if ok and self.running and not self.viewers:
+                    self.idle_checks += 1
+                    self._idle_counter.inc()
+                    try:
+                        self.on_idle_frame(frame)
+                    except Exception as e:
+                        print(f"Alert-only check on camera {self.camera_id} failed: {e}")
+        finally:
+            if subscription is not None:
+                subscription.close()
+            self._idle_loop_active = False
+
+    def status(self):
+        reader = self.reader
+        status = {
+            'camera': self.camera_id,
+            'mode': MODE_NAMES[self.mode],
+            'viewers': self.viewers,
+            'idle_interval': self.idle_interval,
+            'idle_checks': self.idle_checks,
+            'device_open': reader is not None and not reader.ended,
+        }
+        if reader is not None:
+            status['reader'] = reader.status()
+        return status
+
+
+class CameraManager:
+    """Cameras by id, all sharing the same spawn/sleep/run_blocking and idle settings"""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.cameras = {}
+
+    def add(self, camera_id, source, **options):
+        """Register (or replace) a camera; a replaced camera is stopped"""
+        previous = self.cameras.get(str(camera_id))
+        if previous is not None:
+            previous.stop()
+        camera = ManagedCamera(camera_id, source, **dict(self.defaults, **options))
+        self.cameras[str(camera_id)] = camera
+        return camera
+
+    def get(self, camera_id):
+        return self.cameras.get(str(camera_id))
+
+    def stop_all(self):
+        for camera in self.cameras.values():
+            camera.stop()
+
+    def status(self):
+        return [camera.status() for camera in self.cameras.values()]
@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# Tiny "garbage present?" classifier that gates the full YOLOv5 detector
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+import metrics
+from dataset_cache import label_path, list_images, read_labels
+from dataset_index import split_files
+
+DEFAULT_PATH = 'model/presence.pt'
+INPUT_SIZE = 128
+
+# Skipped frames that still go through the detector, to estimate the miss rate
+DEFAULT_AUDIT_EVERY = 50
+
+
+class PresenceClassifier(nn.Module):
+    """
+    Binary classifier over a downscaled frame: logit > 0 means garbage is present
+
+    Five stride-2 convolutions and a global pool: about 30 MFLOPs at 128x128,
+    against 16.5 GFLOPs for a YOLOv5s forward pass at 640.
+    """
+
+    def __init__(self, input_size=INPUT_SIZE, width=16):
+        super().__init__()
+        self.input_size = input_size
+        channels = [3, width, width * 2, width * 4, width * 4, width * 8]
+        layers = []
+        for c_in, c_out in zip(channels, channels[1:]):
+            layers += [nn.Conv2d(c_in, c_out, 3, stride=2, padding=1, bias=False),
+                       nn.BatchNorm2d(c_out), nn.ReLU(inplace=True)]
+        self.features = nn.Sequential(*layers)
+        self.head = nn.Linear(channels[-1], 1)
+
+    def forward(self, x):
+        x = self.features(x)
+        return self.head(x.mean((2, 3))).squeeze(1)
+
+    def preprocess(self, frame):
+        """BGR uint8 frame -> (1, 3, S, S) float tensor"""
+        small = cv2.resize(frame, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+        return to_tensor(small[None])
+
+    def score(self, frame):
+        """Probability that the frame contains garbage"""
+        with torch.no_grad():
+            return float(torch.sigmoid(self(self.preprocess(frame)))[0])
+
+
+def to_tensor(batch):
+    """(N, S, S, 3) BGR uint8 -> (N, 3, S, S) RGB float tensor in [0, 1]"""
+    batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2))
+    return torch.from_numpy(batch).float().div_(255.0)
+
+
+def load_classifier(path=DEFAULT_PATH):
+    """
+    Load a trained classifier
+
+    Returns:
+        (model, threshold): the model in eval mode and the threshold chosen at training time
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Presence classifier not found at {path}")
+    checkpoint = torch.load(path, map_location='cpu')
+    model = PresenceClassifier(checkpoint['input_size'], checkpoint['width'])
+    model.load_state_dict(checkpoint['state_dict'])
+    model.eval()
+    return model, checkpoint.get('threshold', 0.5)
+
+
+class CascadeDetector:
+    """
+    Run the wrapped detector only on frames the presence classifier flags
+
+    Wraps any detector with the detect(frame, copy=True) -> (detections, frame)
+    interface (detection.py, direct_detect.py, the inference service client).
+    Skipped frames return no detections and the unannotated frame. A timings
+    dict, when given, is passed on to the wrapped detector and gets the
+    classify stage added. Every other attribute is forwarded to the wrapped
+    detector.
+
+    Stats:
+        frames: frames seen
+        passed: frames the classifier sent to the detector
+        hits: passed frames on which the detector found something
+        false_passes: passed frames on which it found nothing
+        skipped: frames the classifier rejected
+        audited: skipped frames run through the detector anyway
+        misses: audited frames on which the detector found something
+    """
+
+    def __init__(self, detector, classifier_path=DEFAULT_PATH, threshold=None, audit_every=DEFAULT_AUDIT_EVERY):
+        self.detector = detector
+        self.classifier, trained_threshold = load_classifier(classifier_path)
+        self.threshold = trained_threshold if threshold is None else threshold
+        self.audit_every = audit_every
+        self.last_score = None
+        self.last_timings = {}
+        self._empty = []
+        self.counts = dict.fromkeys(('frames', 'passed', 'hits', 'false_passes', 'skipped', 'audited', 'misses'), 0)
+        self._counters = {outcome: metrics.CASCADE.labels(outcome=outcome) for outcome in self.counts}
+        print(f"Presence cascade enabled (threshold {self.threshold:.3f}, audit 1 in {audit_every} skipped frames)")
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        self._counters[outcome].inc()
+
+    def detect(self, frame, copy=True, timings=None, **kwargs):
+        t0 = time.perf_counter()
+        self.last_score = self.classifier.score(frame)
+        t1 = time.perf_counter()
+        metrics.CLASSIFY.observe(t1 - t0)
+        self._count('frames')
+
+        passed = self.last_score >= self.threshold
+        if passed:
+            self._count('passed')
+        else:
+            self._count('skipped')
+            audit = self.audit_every and self.counts['skipped'] % self.audit_every == 0
+            if not audit:
+                self.last_timings = {'classify': (t0, t1)}
+                if timings is not None:
+                    timings['classify'] = (t0, t1)
+                return self._empty, frame.copy() if copy else frame
+
+        if timings is not None:
+            kwargs['timings'] = timings
+        detections, annotated = self.detector.detect(frame, copy=copy, **kwargs)
+        self.last_timings = dict(self.detector.last_timings, classify=(t0, t1))
+        if timings is not None:
+            timings['classify'] = (t0, t1)
+        self._empty = detections[:0]
+        found = len(detections) > 0
+        if passed:
+            self._count('hits' if found else 'false_passes')
+        else:
+            self._count('audited')
+            if found:
+                self._count('misses')
+        return detections, annotated
+
+    def stats(self):
+        """Counts plus skip rate, pass precision and the audited miss rate"""
+        counts = self.counts
+        return dict(
+            counts,
+            threshold=self.threshold,
+            skip_rate=counts['skipped'] / max(counts['frames'], 1),
+            pass_precision=counts['hits'] / max(counts['passed'], 1),
+            miss_rate=counts['misses'] / max(counts['audited'], 1),
+        )
+
+
+def wrap_detector(detector, classifier_path=None, threshold=None):
+    """Wrap a detector in a cascade when a classifier path is given"""
+    if not classifier_path:
+        return detector
+    return CascadeDetector(detector, classifier_path, threshold)
+
+
+def _box_coverage(crop, boxes):
+    """Fraction of each xyxy box's area that lies inside the crop"""
+    if not len(boxes):
+        return np.zeros(0)
+    x1, y1, x2, y2 = crop
+    iw = np.clip(np.minimum(boxes[:, 2], x2) - np.maximum(boxes[:, 0], x1), 0, None)
+    ih = np.clip(np.minimum(boxes[:, 3], y2) - np.maximum(boxes[:, 1], y1), 0, None)
+    area = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-9)
+    return iw * ih / area
+
+
+def make_samples(files, input_size=INPUT_SIZE, crops_per_image=8, seed=0):
+    """
+    Build classifier samples from YOLO-labelled images
+
+    The whole image is a positive when it has labels. Random crops are
+    positives when they hold at least half of some box, and negatives when
+    they hold under 5% of every box, so background is mined even from
+    datasets where every image contains garbage.
+
+    Returns:
+        (images, labels): (N, S, S, 3) uint8 BGR and (N,) float32
+    """
+    rng = random.Random(seed)
+    images, labels = [], []
+
+    def add(image, label):
+        images.append(cv2.resize(image, (input_size, input_size), interpolation=cv2.INTER_AREA))
+        labels.append(label)
+
+    for path in files:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Warning: could not read {path}, skipping")
+            continue
+        height, width = image.shape[:2]
+        yolo = read_labels(label_path(path))
+        boxes = np.stack([(yolo[:, 1] - yolo[:, 3] / 2) * width, (yolo[:, 2] - yolo[:, 4] / 2) * height,
+                          (yolo[:, 1] + yolo[:, 3] / 2) * width, (yolo[:, 2] + yolo[:, 4] / 2) * height], 1)
+        add(image, float(len(boxes) > 0))
+
+        # Ambiguous crops (partial boxes) are rejected, so allow a few extra attempts
+        kept = 0
+        for _ in range(crops_per_image * 4):
+            if kept >= crops_per_image:
+                break
+            side = rng.uniform(0.2, 0.6) * min(width, height)
+            x1, y1 = rng.uniform(0, width - side), rng.uniform(0, height - side)
+            crop = (x1, y1, x1 + side, y1 + side)
+            coverage = _box_coverage(crop, boxes)
+            if len(coverage) and coverage.max() >= 0.5:
+                label = 1.0
+            elif not len(coverage) or coverage.max() < 0.05:
+                label = 0.0
+            else:
+                continue
+            add(image[int(y1):int(y1 + side), int(x1):int(x1 + side)], label)
+            kept += 1
+
+    return np.stack(images), np.array(labels, dtype=np.float32)
+
+
+def choose_threshold(scores, labels, target_recall=0.98):
+    """Highest threshold that still passes target_recall of the positive samples"""
+    positives = np.sort(scores[labels > 0.5])
+    if not len(positives):
+        return 0.5
+    index = int(np.floor((1.0 - target_recall) * len(positives)))
+    return float(positives[min(index, len(positives) - 1)])
+
+
+def classifier_scores(model, images, batch_size=256):
+    model.eval()
+    scores = []
+    with torch.no_grad():
+        for i in range(0, len(images), batch_size):
+            scores.append(torch.sigmoid(model(to_tensor(images[i:i + batch_size]))).numpy())
+    return np.concatenate(scores) if scores else np.zeros(0)
+
+
+def cascade_report(scores, labels, threshold):
+    """Recall, skip rate and precision of the gate on labelled samples"""
+    passed = scores >= threshold
+    positive = labels > 0.5
+    return {
+        'threshold': threshold,
+        'samples': int(len(labels)),
+        'recall': float((passed & positive).sum() / max(positive.sum(), 1)),
+        'skip_rate': float((~passed).mean()) if len(passed) else 0.0,
+        'negative_skip_rate': float((~passed & ~positive).sum() / max((~positive).sum(), 1)),
+        'pass_precision': float((passed & positive).sum() / max(passed.sum(), 1)),
+    }
+
+
+def train_classifier(train_files, val_files, args):
+    """
+    Train the presence classifier and pick its threshold on the validation samples
+
+    Returns:
+        (model, threshold, report)
+    """
+    torch.manual_seed(args.seed)
+    train_x, train_y = make_samples(train_files, args.input_size, args.crops, args.seed)
+    val_x, val_y = make_samples(val_files, args.input_size, args.crops, args.seed + 1)
+    print(f"Training on {len(train_y)} samples ({int(train_y.sum())} positive), "
+          f"validating on {len(val_y)} ({int(val_y.sum())} positive)")
+
+    model = PresenceClassifier(args.input_size, args.width)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-4)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, args.epochs)
+    # Balance the classes, since crops skew towards one side depending on box density
+    pos_weight = torch.tensor((len(train_y) - train_y.sum()) / max(train_y.sum(), 1))
+
+    for epoch in range(args.epochs):
+        model.train()
+        order = np.random.permutation(len(train_y))
+        total = 0.0
+        for i in range(0, len(order), args.batch_size):
+            index = order[i:i + args.batch_size]
+            batch = train_x[index]
+            # Horizontal flip and brightness jitter
+            flip = np.random.rand(len(index)) < 0.5
+            batch[flip] = batch[flip, :, ::-1]
+            x = to_tensor(batch) * torch.empty(len(index), 1, 1, 1).uniform_(0.7, 1.3)
+            y = torch.from_numpy(train_y[index])
+            loss = F.binary_cross_entropy_with_logits(model(x.clamp_(0, 1)), y, pos_weight=pos_weight)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(index)
+        scheduler.step()
+        if (epoch + 1) % 5 == 0 or epoch == args.epochs - 1:
+            print(f"Epoch {epoch + 1}/{args.epochs}: loss {total / len(train_y):.4f}")
+
+    scores = classifier_scores(model, val_x)
+    threshold = choose_threshold(scores, val_y, args.target_recall)
+    return model, threshold, cascade_report(scores, val_y, threshold)
+
+
+def save_classifier(model, threshold, path, report=None):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    torch.save({
+        'state_dict': model.state_dict(),
+        'input_size': model.input_size,
+        'width': model.features[0].out_channels,
+        'threshold': threshold,
+        'report': report,
+    }, path)
+    print(f"Presence classifier saved to {path}")
+
+
+def dataset_files(args):
+    """Train and validation images from the data YAML, or a seeded holdout of --images"""
+    if args.images:
+        files = list_images(args.images)
+        random.Random(args.seed).shuffle(files)
+        n_val = max(1, int(len(files) * 0.2))
+        return files[n_val:], files[:n_val]
+    train, val = split_files(args.data, 'train'), split_files(args.data, 'val')
+    if not val:
+        print("No validation split; holding out 20% of the training images")
+        random.Random(args.seed).shuffle(train)
+        n_val = max(1, int(len(train) * 0.2))
+        train, val = train[n_val:], train[:n_val]
+    return train, val
+
+
+def print_report(report):
+    print(f"Threshold {report['threshold']:.3f} on {report['samples']} validation samples: "
+          f"recall {report['recall']:.3f}, skips {report['skip_rate']:.1%} of samples "
+          f"({report['negative_skip_rate']:.1%} of negatives), pass precision {report['pass_precision']:.3f}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Train or check the presence classifier that gates detection')
+    parser.add_argument('--data', type=str, default='data/garbage_data.yaml', help='Data YAML with train/val splits')
+    parser.add_argument('--images', type=str, default=None, help='Use a labelled image directory instead')
+    parser.add_argument('--output', type=str, default=DEFAULT_PATH, help='Where to save the classifier')
+    parser.add_argument('--check', action='store_true', help='Report an existing classifier on the val split')
+    parser.add_argument('--threshold', type=float, default=None, help='Override the threshold for --check')
+    parser.add_argument('--target-recall', type=float, default=0.98,
+                        help='Pick the highest threshold keeping this recall on validation samples')
+    parser.add_argument('--input-size', type=int, default=INPUT_SIZE, help='Classifier input size')
+    parser.add_argument('--width', type=int, default=16, help='Channels in the first conv layer')
+    parser.add_argument('--crops', type=int, default=8, help='Random crops sampled per image')
+    parser.add_argument('--epochs', type=int, default=40, help='Training epochs')
+    parser.add_argument('--batch-size', type=int, default=64, help='Training batch size')
+    parser.add_argument('--lr', type=float, default=3e-3, help='Learning rate')
+    parser.add_argument('--seed', type=int, default=0, help='Sampling and split seed')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    train_files, val_files = dataset_files(args)
+    if not train_files:
+        print("Error: no training images found")
+        sys.exit(1)
+
+    if args.check:
+        model, threshold = load_classifier(args.output)
+        if args.threshold is not None:
+            threshold = args.threshold
+        val_x, val_y = make_samples(val_files, model.input_size, args.crops, args.seed + 1)
+        print_report(cascade_report(classifier_scores(model, val_x), val_y, threshold))
+        sys.exit(0)
+
+    model, threshold, report = train_classifier(train_files, val_files, args)
+    print_report(report)
+    save_classifier(model, threshold, args.output, report)
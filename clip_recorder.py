@@ -0,0 +1,426 @@
+# Pre/post-roll event clips cut from an in-memory ring of already-encoded JPEG frames
+
+import os
+import sys
+import time
+import struct
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+
+import metrics
+import frame_sources
+from detection import save_detection_image
+from snapshot_writer import DiskQuota, SNAPSHOT_DIR
+
+DEFAULT_PRE_ROLL = 5.0
+DEFAULT_POST_ROLL = 5.0
+
+# Frames kept per second; extra pushes (other viewers of the same camera) are ignored
+DEFAULT_CLIP_FPS = 10.0
+
+# Encoded bytes a camera may hold, ring buffer and clips being collected together
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Clips waiting for the writer; more are dropped rather than queued
+MAX_QUEUED_CLIPS = 8
+
+# A clip is never extended past this many seconds of post-roll
+MAX_POST_ROLL_EXTENSION = 30.0
+
+CLIP_DIR = 'static/clips'
+FORMATS = ('avi', 'frames')
+WRITER_POLL = 0.2
+
+
+def write_mjpeg_avi(path, frames, fps):
+    """
+    Write JPEG frames into an MJPEG AVI without re-encoding them
+
+    Args:
+        path: Output .avi path
+        frames: List of (timestamp, jpeg_bytes, (height, width)) with equal sizes
+        fps: Nominal frame rate stored in the header
+    """
+    height, width = frames[0][2][:2]
+    count = len(frames)
+    largest = max(len(data) for _, data, _ in frames)
+    scale, rate = 1000, max(int(round(fps * 1000)), 1)
+
+    avih = struct.pack('<4sI14I', b'avih', 56, int(1e6 / fps), int(largest * fps), 0, 0x10, count, 0, 1,
+                       largest, width, height, 0, 0, 0, 0)
+    strh = struct.pack('<4sI4s4sIHHIIIIIIIIhhhh', b'strh', 56, b'vids', b'MJPG', 0, 0, 0, 0, scale, rate, 0,
+                       count, largest, 0xFFFFFFFF, 0, 0, 0, width, height)
+    strf = struct.pack('<4sIIiiHH4sIiiII', b'strf', 40, 40, width, height, 1, 24, b'MJPG', width * height * 3,
+                       0, 0, 0, 0)
+    strl = struct.pack('<4sI4s', b'LIST', 4 + len(strh) + len(strf), b'strl') + strh + strf
+    hdrl = struct.pack('<4sI4s', b'LIST', 4 + len(avih) + len(strl), b'hdrl') + avih + strl
+
+    movi_size = 4 + sum(8 + len(data) + (len(data) & 1) for _, data, _ in frames)
+    idx_size = 16 * count
+    riff_size = 4 + len(hdrl) + 8 + movi_size + 8 + idx_size
+
+    index = []
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RIFF', riff_size, b'AVI '))
+        f.write(hdrl)
+        f.write(struct.pack('<4sI4s', b'LIST', movi_size, b'movi'))
+        offset = 4
+        for _, data, _ in frames:
+            f.write(struct.pack('<4sI', b'00dc', len(data)))
+            f.write(data)
+            if len(data) & 1:
+                f.write(b'\0')
+            index.append(struct.pack('<4sIII', b'00dc', 0x10, offset, len(data)))
+            offset += 8 + len(data) + (len(data) & 1)
+        f.write(struct.pack('<4sI', b'idx1', idx_size))
+        f.write(b''.join(index))
+
+
+def write_replay(path, frames):
+    """Write JPEG frames into a .frames replay file (see frame_sources.py)"""
+    recorder = frame_sources.FrameRecorder(path)
+    try:
+        for timestamp, data, _ in frames:
+            recorder.write_encoded(data, timestamp)
+    finally:
+        recorder.close()
+
+
+class EncodedRing:
+    """
+    The last `seconds` of one camera's encoded frames
+
+    Frames are kept at most max_fps times a second and the oldest are
+    evicted once the total size passes max_bytes.
+    """
+
+    def __init__(self, seconds=DEFAULT_PRE_ROLL, max_bytes=DEFAULT_MAX_BYTES, max_fps=DEFAULT_CLIP_FPS):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.min_gap = 1.0 / max_fps if max_fps else 0.0
+        self.frames = deque()
+        self.bytes = 0
+
+    def wants(self, timestamp):
+        """Whether a frame captured at timestamp would be kept"""
+        return not self.frames or timestamp - self.frames[-1][0] >= self.min_gap
+
+    def push(self, timestamp, data, shape):
+        if not self.wants(timestamp):
+            return False
+        self.frames.append((timestamp, data, shape))
+        self.bytes += len(data)
+        self.trim(timestamp, self.max_bytes)
+        return True
+
+    def trim(self, now, max_bytes):
+        while self.frames and (now - self.frames[0][0] > self.seconds or self.bytes > max_bytes):
+            self.bytes -= len(self.frames.popleft()[1])
+
+    def since(self, timestamp):
+        return [frame for frame in self.frames if frame[0] >= timestamp]
+
+
+class Clip:
+    """An event clip collecting post-roll frames until it is handed to the writer"""
+
+    def __init__(self, camera_id, path, snapshot_path, start, end, frames, on_written=None):
+        self.camera_id = camera_id
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.start = start
+        self.end = end
+        self.frames = list(frames)
+        self.bytes = sum(len(data) for _, data, _ in self.frames)
+        self.snapshot = None
+        self.truncated = False
+        self.on_written = [on_written] if on_written else []
+        self.written = False
+
+
+class ClipRecorder:
+    """
+    Keeps a ring of recent encoded frames per camera and cuts clips from it on events
+
+    push() takes frames that were encoded anyway (the MJPEG stream's JPEGs),
+    so recording costs no extra encoding. trigger() starts a clip with the
+    ring's pre-roll and returns its paths at once; the following frames are
+    added as post-roll and the finished clip, plus a snapshot of the first
+    frame after the event, are written by a background task. A second event
+    while a clip is collecting extends that clip instead of starting a new one.
+
+    Memory is bounded per camera by max_bytes, shared by the ring and any
+    clip being collected (a clip that would pass it stops collecting).
+
+    Args:
+        output_dir: Where clips are written
+        pre_roll: Seconds kept before an event
+        post_roll: Seconds recorded after an event
+        max_bytes: Encoded bytes held per camera
+        max_fps: Frames kept per second
+        fmt: 'avi' (MJPEG, plays anywhere) or 'frames' (replayable with frame_sources.py)
+        snapshots: SnapshotWriter that writes the alert snapshots (default: written with the clip)
+        quota_bytes: Disk budget for output_dir; the oldest clips are deleted beyond it
+        spawn, sleep, run_blocking: As for ManagedCamera, so the writer runs
+            as a Socket.IO background task with file I/O off the event loop
+    """
+
+    def __init__(self, output_dir=CLIP_DIR, pre_roll=DEFAULT_PRE_ROLL, post_roll=DEFAULT_POST_ROLL,
+                 max_bytes=DEFAULT_MAX_BYTES, max_fps=DEFAULT_CLIP_FPS, fmt='avi', snapshots=None, quota_bytes=None,
+                 spawn=None, sleep=time.sleep, run_blocking=None, clock=time.perf_counter):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown clip format {fmt}, expected one of {FORMATS}")
+        self.output_dir = output_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_bytes = max_bytes
+        self.max_fps = max_fps
+        self.fmt = fmt
+        self.snapshots = snapshots
+        self.quota = None
+        if quota_bytes is not None:
+            self.quota = DiskQuota(output_dir, quota_bytes, prefixes=('clip_',), suffixes=tuple('.' + f for f in FORMATS))
+        self.spawn = spawn or self._spawn_thread
+        self.sleep = sleep
+        self.run_blocking = run_blocking or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+        self.clock = clock
+
+        self.rings = {}
+        self._buffer_gauges = {}
+        self.collecting = {}
+        self.queue = deque()
+        self.counts = {'written': 0, 'dropped': 0, 'failed': 0, 'evicted': 0}
+        self.running = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _spawn_thread(fn):
+        thread = threading.Thread(target=fn, daemon=True)
+        thread.start()
+        return thread
+
+    def _ring(self, camera_id):
+        ring = self.rings.get(camera_id)
+        if ring is None:
+            ring = self.rings[camera_id] = EncodedRing(self.pre_roll, self.max_bytes, self.max_fps)
+            self._buffer_gauges[camera_id] = metrics.CLIP_BUFFER.labels(camera=camera_id)
+        return ring
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.spawn(self._writer_loop)
+        return self
+
+    def wants_frame(self, camera_id, timestamp=None):
+        """Whether push() would keep a frame now; lets callers skip encoding one just for the ring"""
+        ring = self.rings.get(str(camera_id))
+        return ring is None or ring.wants(self.clock() if timestamp is None else timestamp)
+
+    def push(self, camera_id, data, shape, timestamp=None):
+        """
+        Offer an encoded frame
+
+        Args:
+            camera_id: Camera the frame came from
+            data: JPEG bytes
+            shape: Shape of the frame that was encoded
+            timestamp: Capture time (defaults to now)
+        """
+        camera_id = str(camera_id)
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            ring = self._ring(camera_id)
+            if not ring.push(timestamp, data, shape):
+                return False
+
+            clip = self.collecting.get(camera_id)
+            if clip is not None:
+                if clip.snapshot is None:
+                    clip.snapshot = data
+                # Frames are shared between the ring and the clip, so this overestimates
+                ring.trim(timestamp, max(self.max_bytes - clip.bytes, 0))
+                if clip.bytes + len(data) > self.max_bytes:
+                    clip.truncated = True
+                else:
+                    clip.frames.append((timestamp, data, shape))
+                    clip.bytes += len(data)
+                if timestamp >= clip.end or clip.truncated:
+                    self._finish(clip)
+            self._buffer_gauges[camera_id].set(ring.bytes + (clip.bytes if clip else 0))
+        return True
+
+    def trigger(self, camera_id, on_written=None):
+        """
+        Start (or extend) an event clip
+
+        Args:
+            camera_id: Camera the event happened on
+            on_written: Callback(clip) once the clip file exists
+
+        Returns:
+            (clip_path, snapshot_path): Where the clip and snapshot will be written
+        """
+        camera_id = str(camera_id)
+        now = self.clock()
+        with self._lock:
+            clip = self.collecting.get(camera_id)
+            if clip is not None:
+                clip.end = min(max(clip.end, now + self.post_roll), clip.start + self.pre_roll + MAX_POST_ROLL_EXTENSION)
+                if on_written:
+                    clip.on_written.append(on_written)
+                return clip.path, clip.snapshot_path
+
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            safe_id = ''.join(c if c.isalnum() else '_' for c in camera_id)
+            path = os.path.join(self.output_dir, f"clip_{safe_id}_{stamp}.{self.fmt}")
+            snapshot_dir = self.snapshots.directory if self.snapshots is not None else SNAPSHOT_DIR
+            snapshot_path = os.path.join(snapshot_dir, f"detection_{safe_id}_{stamp}.jpg")
+            ring = self._ring(camera_id)
+            clip = Clip(camera_id, path, snapshot_path, now, now + self.post_roll, ring.since(now - self.pre_roll),
+                        on_written)
+            self.collecting[camera_id] = clip
+        self.start()
+        return clip.path, clip.snapshot_path
+
+    def _finish(self, clip):
+        """Hand a collected clip to the writer (callers hold the lock)"""
+        self.collecting.pop(clip.camera_id, None)
+        if len(self.queue) >= MAX_QUEUED_CLIPS:
+            self.counts['dropped'] += 1
+            metrics.CLIPS.labels(outcome='dropped').inc()
+            print(f"Clip writer is behind; dropped {clip.path}")
+            return
+        self.queue.append(clip)
+
+    def _expire(self, now):
+        """Finish clips whose camera stopped delivering frames before the post-roll ended"""
+        with self._lock:
+            for clip in list(self.collecting.values()):
+                if now > clip.end + 1.0:
+                    self._finish(clip)
+
+    def _write(self, clip):
+        if not clip.frames:
+            raise ValueError("no frames were captured")
+        os.makedirs(os.path.dirname(clip.path) or '.', exist_ok=True)
+        tmp = clip.path + '.tmp'
+        if self.fmt == 'avi':
+            span = clip.frames[-1][0] - clip.frames[0][0]
+            fps = (len(clip.frames) - 1) / span if span > 0 else self.max_fps
+            write_mjpeg_avi(tmp, clip.frames, fps)
+        else:
+            write_replay(tmp, clip.frames)
+        os.replace(tmp, clip.path)
+        if self.quota is not None:
+            self.quota.add(clip.path, os.path.getsize(clip.path))
+            evicted = self.quota.enforce()
+            if evicted:
+                self.counts['evicted'] += len(evicted)
+                metrics.CLIPS.labels(outcome='evicted').inc(len(evicted))
+        # The first frame after the event, or the newest before it
+        snapshot = clip.snapshot or clip.frames[-1][1]
+        if self.snapshots is not None:
+            self.snapshots.submit(snapshot, clip.camera_id, os.path.basename(clip.snapshot_path), force=True)
+        else:
+            save_detection_image(snapshot, os.path.basename(clip.snapshot_path))
+
+    def _writer_loop(self):
+        while self.running:
+            self._expire(self.clock())
+            with self._lock:
+                clip = self.queue.popleft() if self.queue else None
+            if clip is None:
+                self.sleep(WRITER_POLL)
+                continue
+            try:
+                self.run_blocking(self._write, clip)
+                clip.written = True
+                self.counts['written'] += 1
+                metrics.CLIPS.labels(outcome='written').inc()
+                print(f"Clip saved to {clip.path} ({len(clip.frames)} frames)")
+            except Exception as e:
+                self.counts['failed'] += 1
+                metrics.CLIPS.labels(outcome='failed').inc()
+                print(f"Could not write clip {clip.path}: {e}")
+                continue
+            for callback in clip.on_written:
+                try:
+                    callback(clip)
+                except Exception as e:
+                    print(f"Clip callback failed: {e}")
+
+    def close(self):
+        """Write clips still collecting or queued, then stop the writer"""
+        with self._lock:
+            for clip in list(self.collecting.values()):
+                self._finish(clip)
+            pending = list(self.queue)
+            self.queue.clear()
+        self.running = False
+        for clip in pending:
+            try:
+                self._write(clip)
+                self.counts['written'] += 1
+                metrics.CLIPS.labels(outcome='written').inc()
+            except Exception as e:
+                print(f"Could not write clip {clip.path}: {e}")
+
+    def status(self):
+        with self._lock:
+            return {
+                'format': self.fmt,
+                'pre_roll': self.pre_roll,
+                'post_roll': self.post_roll,
+                'max_bytes': self.max_bytes,
+                'disk_bytes': self.quota.bytes if self.quota is not None else None,
+                'quota_bytes': self.quota.max_bytes if self.quota is not None else None,
+                'counts': dict(self.counts),
+                'queued': len(self.queue),
+                'cameras': {camera_id: {'frames': len(ring.frames), 'bytes': ring.bytes,
+                                        'collecting': camera_id in self.collecting}
+                            for camera_id, ring in self.rings.items()},
+            }
+
+
+def read_replay_frames(path):
+    """Frames of a .frames file as (timestamp, jpeg_bytes, shape) without decoding them all"""
+    import cv2
+    import numpy as np
+
+    frames, shape = [], None
+    with open(path, 'rb') as f:
+        for timestamp, offset, length in frame_sources.read_replay_index(path):
+            f.seek(offset)
+            data = f.read(length)
+            if not data.startswith(b'\xff\xd8'):
+                raise ValueError(f"{path} holds lossless frames; only JPEG frames can go into an MJPEG AVI")
+            if shape is None:
+                shape = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape
+            frames.append((timestamp, data, shape))
+    return frames
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Convert a .frames clip or recording to an MJPEG AVI without re-encoding')
+    parser.add_argument('clip', type=str, help='.frames file')
+    parser.add_argument('--output', type=str, default=None, help='Output .avi (default: next to the input)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    output = args.output or os.path.splitext(args.clip)[0] + '.avi'
+    try:
+        frames = read_replay_frames(args.clip)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not frames:
+        print(f"Error: {args.clip} has no frames")
+        sys.exit(1)
+    span = frames[-1][0] - frames[0][0]
+    write_mjpeg_avi(output, frames, (len(frames) - 1) / span if span > 0 else DEFAULT_CLIP_FPS)
+    print(f"Wrote {len(frames)} frames to {output}")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# Structured channel pruning, fine-tuning and distillation into a CPU-sized model
+
+import os
+import sys
+import copy
+import json
+import math
+import time
+import argparse
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+import yaml
+from torch.utils.flop_counter import FlopCounterMode
+
+import sweep
+import eval_metrics
+from train_model import SCRIPT_DIR, YOLOV5_DIR, train_yolo_model
+
+try:
+    import torch_pruning as tp
+except ImportError:
+    tp = None
+
+
+def _yolov5_imports():
+    """Make the local YOLOv5 checkout importable"""
+    if str(YOLOV5_DIR) not in sys.path:
+        sys.path.insert(0, str(YOLOV5_DIR))
+    if not YOLOV5_DIR.exists():
+        raise RuntimeError(f"YOLOv5 repository not found at {YOLOV5_DIR}")
+
+
+def load_checkpoint_model(weights):
+    """Load the nn.Module stored in a YOLOv5 checkpoint (downloading hub weights by name)"""
+    _yolov5_imports()
+    from utils.downloads import attempt_download
+
+    checkpoint = torch.load(attempt_download(weights), map_location='cpu', weights_only=False)
+    model = (checkpoint.get('ema') or checkpoint['model']).float()
+    for p in model.parameters():
+        p.requires_grad_(True)
+    return model
+
+
+def count_gflops(model, img_size=640):
+    """Forward-pass GFLOPs at one image size (multiply-add counted as two)"""
+    model.eval()
+    counter = FlopCounterMode(display=False)
+    with counter, torch.no_grad():
+        model(torch.zeros(1, 3, img_size, img_size))
+    return counter.get_total_flops() / 1e9
+
+
+def measure_latency(model, img_size=640, iterations=20, warmup=3):
+    """Median CPU forward latency in ms at batch size 1"""
+    model.eval()
+    x = torch.zeros(1, 3, img_size, img_size)
+    timings = []
+    with torch.no_grad():
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            model(x)
+            if i >= warmup:
+                timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000.0
+
+
+def _within_budget(model, args):
+    gflops = count_gflops(model, args.img_size)
+    latency = measure_latency(model, args.img_size) if args.target_latency else None
+    ok = (args.target_gflops is None or gflops <= args.target_gflops) and \
+         (args.target_latency is None or latency <= args.target_latency)
+    return ok, gflops, latency
+
+
+def prune_to_budget(model, args):
+    """
+    Remove whole conv channels (L1 magnitude) until the FLOPs/latency budget is met
+
+    Uses Torch-Pruning's dependency graph so concatenations and residual
+    connections in C3 blocks stay consistent. The Detect head is left intact.
+    """
+    example = torch.zeros(1, 3, args.img_size, args.img_size)
+    model.eval()
+    ignored = [model.model[-1]]
+    importance = tp.importance.MagnitudeImportance(p=1)
+    options = dict(importance=importance, iterative_steps=args.steps, ignored_layers=ignored)
+    try:
+        pruner = tp.pruner.MagnitudePruner(model, example, pruning_ratio=args.max_ratio, **options)
+    except TypeError:
+        pruner = tp.pruner.MagnitudePruner(model, example, ch_sparsity=args.max_ratio, **options)  # < 1.3
+
+    for step in range(1, args.steps + 1):
+        pruner.step()
+        ok, gflops, latency = _within_budget(model, args)
+        latency_text = f", {latency:.1f} ms" if latency is not None else ""
+        print(f"  pruning step {step}/{args.steps}: {gflops:.2f} GFLOPs{latency_text}")
+        if ok:
+            return model
+    print("Warning: maximum pruning ratio reached before the budget was met")
+    return model
+
+
+def narrow_to_budget(teacher, args):
+    """
+    Fallback without Torch-Pruning: rebuild the same architecture with a smaller width multiple
+
+    The narrower model starts from random weights, so it depends on the
+    fine-tune (and distillation) epochs to recover accuracy.
+    """
+    _yolov5_imports()
+    from models.yolo import Model
+
+    cfg = copy.deepcopy(teacher.yaml)
+    width = cfg['width_multiple']
+    while width > 0.05:
+        width = round(width * 0.85, 4)
+        cfg['width_multiple'] = width
+        student = Model(copy.deepcopy(cfg), ch=3, nc=teacher.nc if hasattr(teacher, 'nc') else cfg['nc'])
+        ok, gflops, latency = _within_budget(student, args)
+        latency_text = f", {latency:.1f} ms" if latency is not None else ""
+        print(f"  width multiple {width}: {gflops:.2f} GFLOPs{latency_text}")
+        if ok:
+            student.names = teacher.names
+            return student
+    raise RuntimeError("Could not meet the budget by narrowing the model")
+
+
+def distillation_loss(student_outputs, teacher_outputs):
+    """
+    Response-based distillation on YOLOv5's raw head outputs
+
+    Objectness and class logits follow the teacher's probabilities (BCE);
+    box regressions follow the teacher where it is confident of an object.
+    """
+    loss = 0.0
+    for s, t in zip(student_outputs, teacher_outputs):
+        t_obj = t[..., 4:5].sigmoid()
+        loss = loss + F.binary_cross_entropy_with_logits(s[..., 4:5], t_obj)
+        if s.shape[-1] > 5:
+            cls_loss = F.binary_cross_entropy_with_logits(s[..., 5:], t[..., 5:].sigmoid(), reduction='none')
+            loss = loss + (cls_loss * t_obj).mean()
+        box_loss = F.mse_loss(s[..., :4], t[..., :4], reduction='none')
+        loss = loss + (box_loss * t_obj).sum() / t_obj.sum().clamp(min=1.0)
+    return loss
+
+
+def fine_tune(student, data_yaml, args, teacher=None):
+    """
+    Short fine-tune of a pruned model with YOLOv5's loss and dataloader
+
+    YOLOv5's train.py rebuilds the model from its YAML, which would undo the
+    pruning, so this runs its own loop on the pruned module.
+    """
+    _yolov5_imports()
+    from utils.dataloaders import create_dataloader
+    from utils.general import check_dataset
+    from utils.loss import ComputeLoss
+
+    data = check_dataset(data_yaml)
+    with open(YOLOV5_DIR / 'data' / 'hyps' / 'hyp.scratch-low.yaml') as f:
+        hyp = yaml.safe_load(f)
+
+    student.nc = int(data['nc'])
+    student.hyp = hyp
+    student.names = data['names']
+    stride = max(int(student.stride.max()), 32)
+    loader, _ = create_dataloader(data['train'], args.img_size, args.batch_size, stride, hyp=hyp, augment=True,
+                                  workers=args.workers, shuffle=True, prefix='compress: ')
+    compute_loss = ComputeLoss(student)
+    optimizer = torch.optim.SGD(student.parameters(), lr=args.lr, momentum=0.937, nesterov=True, weight_decay=5e-4)
+    total_steps = max(args.epochs * len(loader), 1)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(
+        optimizer, lambda step: 0.5 * (1 + math.cos(math.pi * step / total_steps)) * 0.9 + 0.1)
+
+    if teacher is not None:
+        teacher.eval()
+
+    for epoch in range(args.epochs):
+        student.train()
+        running = 0.0
+        for i, (images, targets, _, _) in enumerate(loader):
+            images = images.float() / 255.0
+            outputs = student(images)
+            loss, _ = compute_loss(outputs, targets)
+            if teacher is not None:
+                with torch.no_grad():
+                    teacher_outputs = teacher(images)[1]
+                loss = loss + args.distill_weight * distillation_loss(outputs, teacher_outputs) * images.shape[0]
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), max_norm=10.0)
+            optimizer.step()
+            scheduler.step()
+            running += loss.item()
+        print(f"  epoch {epoch + 1}/{args.epochs}: loss {running / max(len(loader), 1):.4f}")
+    student.eval()
+    return student
+
+
+def evaluate_model(model, data_yaml, args):
+    """Accuracy on the validation split and latency, measured the way sweep.py does"""
+    samples = sweep.load_samples(data_yaml, 'val', limit=args.eval_limit)
+    if not samples:
+        return {}
+    model.eval()
+    predictions, timings = sweep.predict(model, samples, args.img_size)
+    accuracy = sweep.evaluate(predictions, samples, args.conf)
+    accuracy.pop('per_class', None)
+    accuracy.update(eval_metrics.latency_summary(timings))
+    return accuracy
+
+
+def model_report(model, data_yaml, args):
+    report = {
+        'parameters': sum(p.numel() for p in model.parameters()),
+        'gflops': count_gflops(model, args.img_size),
+    }
+    report.update(evaluate_model(model, data_yaml, args))
+    return report
+
+
+def save_checkpoint(model, path):
+    """Save in YOLOv5's checkpoint format, loadable by torch.hub 'custom' like any best.pt"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({'model': copy.deepcopy(model).half(), 'epoch': -1, 'optimizer': None, 'ema': None}, path)
+    print(f"Compressed model saved to {path}")
+
+
+def compress(args):
+    data_yaml = args.data
+    if data_yaml is None:
+        data_yaml = os.path.join(SCRIPT_DIR, 'data', 'garbage_data.yaml')
+        if not os.path.exists(data_yaml):
+            from train_model import create_data_yaml
+            create_data_yaml(args.dataset_path, data_yaml)
+
+    teacher_path = args.teacher
+    if not os.path.exists(teacher_path):
+        if not args.teacher_epochs:
+            raise FileNotFoundError(f"Teacher weights {teacher_path} not found (train one or pass --teacher-epochs)")
+        teacher_path = train_yolo_model(dataset_path=args.dataset_path, epochs=args.teacher_epochs,
+                                        img_size=args.img_size, output_dir='compress-teacher',
+                                        data_yaml=data_yaml, install=False)
+
+    print(f"Loading teacher from {teacher_path}")
+    teacher = load_checkpoint_model(str(teacher_path))
+    print("Measuring teacher...")
+    teacher_report = model_report(teacher, data_yaml, args)
+
+    print("Compressing...")
+    if tp is not None:
+        student = prune_to_budget(copy.deepcopy(teacher), args)
+        method = 'torch_pruning magnitude (L1) channel pruning'
+    else:
+        print("Torch-Pruning is not installed (pip install torch-pruning); narrowing the model instead")
+        student = narrow_to_budget(teacher, args)
+        method = 'width multiple reduction (random init)'
+
+    if args.epochs:
+        print(f"Fine-tuning for {args.epochs} epoch(s){' with distillation' if args.distill else ''}...")
+        student = fine_tune(student, data_yaml, args, teacher if args.distill else None)
+
+    print("Measuring compressed model...")
+    student_report = model_report(student, data_yaml, args)
+
+    save_checkpoint(student, args.output)
+    report = {
+        'teacher': str(teacher_path),
+        'output': args.output,
+        'method': method,
+        'img_size': args.img_size,
+        'conf': args.conf,
+        'threads': torch.get_num_threads(),
+        'target_gflops': args.target_gflops,
+        'target_latency_ms': args.target_latency,
+        'fine_tune_epochs': args.epochs,
+        'distillation': bool(args.distill),
+        'before': teacher_report,
+        'after': student_report,
+    }
+    report_path = Path(args.output).with_suffix('.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'':<12} {'params':>10} {'GFLOPs':>8} {'p50 ms':>8} {'mAP50':>7} {'mAP':>7} {'recall':>7}")
+    for name, r in (('teacher', teacher_report), ('compressed', student_report)):
+        print(f"{name:<12} {r['parameters']:>10,} {r['gflops']:>8.2f} {r.get('p50_ms', 0):>8.1f} "
+              f"{r.get('map50', 0):>7.3f} {r.get('map', 0):>7.3f} {r.get('recall', 0):>7.3f}")
+    print(f"Report saved to {report_path}")
+    return report
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Prune, fine-tune and distill a YOLOv5 model for CPU deployment')
+    parser.add_argument('--teacher', type=str, default='model/best.pt', help='Full model to compress')
+    parser.add_argument('--teacher-epochs', type=int, default=0,
+                        help='Train the teacher with train_model.py first if it does not exist')
+    parser.add_argument('--output', type=str, default='model/best-pruned.pt', help='Compressed weights')
+    parser.add_argument('--target-gflops', type=float, default=None, help='FLOPs budget at --img-size')
+    parser.add_argument('--target-latency', type=float, default=None,
+                        help='Median CPU latency budget in ms at --img-size')
+    parser.add_argument('--max-ratio', type=float, default=0.8, help='Largest fraction of channels to remove')
+    parser.add_argument('--steps', type=int, default=16, help='Pruning steps up to --max-ratio')
+    parser.add_argument('--img-size', type=int, default=640, help='Image size for budget, training and evaluation')
+    parser.add_argument('--epochs', type=int, default=10, help='Fine-tune epochs after pruning')
+    parser.add_argument('--batch-size', type=int, default=16, help='Fine-tune batch size')
+    parser.add_argument('--lr', type=float, default=0.002, help='Fine-tune learning rate')
+    parser.add_argument('--workers', type=int, default=2, help='Dataloader workers')
+    parser.add_argument('--distill', action='store_true', help='Distill from the teacher while fine-tuning')
+    parser.add_argument('--distill-weight', type=float, default=1.0, help='Weight of the distillation loss')
+    parser.add_argument('--data', type=str, default=None, help='Data YAML (default: generated from the dataset)')
+    parser.add_argument('--dataset_path', type=str, default='GarbageDataSet', help='Dataset directory')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold for the report')
+    parser.add_argument('--eval-limit', type=int, default=None, help='Evaluate at most this many images')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads (match the deployment machine)')
+    parser.add_argument('--install', action='store_true', help='Also copy the result to model/best.pt')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.target_gflops is None and args.target_latency is None:
+        print("Error: give --target-gflops and/or --target-latency")
+        sys.exit(1)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    try:
+        compress(args)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.install:
+        import shutil
+        shutil.copy(args.output, os.path.join(SCRIPT_DIR, 'model', 'best.pt'))
+        print(f"Installed {args.output} as model/best.pt")
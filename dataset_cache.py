@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# Memory-mapped cache of decoded and resized dataset images
+
+import os
+import sys
+import math
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+CACHE_VERSION = 2
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def cache_paths(image_dir, img_size=640):
+    """
+    Return the (data, index) file paths of the cache for an image directory
+
+    The cache lives next to the directory, e.g. train/images.cache-640.bin and
+    train/images.cache-640.npz.
+    """
+    image_dir = Path(image_dir)
+    base = image_dir.parent / f"{image_dir.name}.cache-{img_size}"
+    return Path(str(base) + '.bin'), Path(str(base) + '.npz')
+
+
+def list_images(image_dir):
+    """Image files under a directory, sorted so the cache order is stable"""
+    return sorted(str(p) for p in Path(image_dir).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def label_path(image_path):
+    """YOLO label file for an image (.../images/x.jpg -> .../labels/x.txt)"""
+    head, sep, tail = str(image_path).rpartition(f'{os.sep}images{os.sep}')
+    if not sep:
+        head, sep, tail = str(image_path).rpartition('/images/')
+    if sep:
+        return str(Path(head) / 'labels' / Path(tail).with_suffix('.txt'))
+    return str(Path(image_path).with_suffix('.txt'))
+
+
+def read_labels(path):
+    """Read a YOLO label file into an (N, 5) float32 array [class, cx, cy, w, h]"""
+    if not os.path.exists(path):
+        return np.zeros((0, 5), dtype=np.float32)
+    rows = []
+    with open(path) as f:
+        for line in f:
+            values = line.split()
+            if len(values) >= 5:
+                rows.append([float(v) for v in values[:5]])
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def load_resized(image_path, img_size=640):
+    """
+    Decode an image and resize its longest side to img_size
+
+    Matches YOLOv5's LoadImagesAndLabels.load_image for augmenting (training)
+    datasets: ceil-rounded size and linear interpolation. Validation loaders
+    downscale with INTER_AREA instead, so they are not served from the cache.
+
+    Returns:
+        (image, (h0, w0)) or (None, None) if the image cannot be read
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        return None, None
+    h0, w0 = image.shape[:2]
+    ratio = img_size / max(h0, w0)
+    if ratio != 1:
+        image = cv2.resize(image, (math.ceil(w0 * ratio), math.ceil(h0 * ratio)), interpolation=cv2.INTER_LINEAR)
+    return image, (h0, w0)
+
+
+def _file_stats(files):
+    stats = [os.stat(f) for f in files]
+    return np.array([s.st_mtime_ns for s in stats], dtype=np.int64), np.array([s.st_size for s in stats], dtype=np.int64)
+
+
+def build_cache(image_dir, img_size=640, workers=None):
+    """
+    Decode and resize every image in a directory once into a cache file
+
+    Images are appended to a flat uint8 file; an index records each image's
+    byte offset, cached and original shape, its labels and the source file's
+    mtime and size so stale caches can be detected.
+
+    Args:
+        image_dir: Directory of training images (YOLO layout)
+        img_size: Longest side of the cached images (the training --img size)
+        workers: Decoder threads (default: CPU count)
+
+    Returns:
+        DatasetCache for the new cache
+    """
+    data_path, index_path = cache_paths(image_dir, img_size)
+    files = list_images(image_dir)
+    if not files:
+        raise FileNotFoundError(f"No images found in {image_dir}")
+
+    print(f"Caching {len(files)} images from {image_dir} at {img_size}px...")
+    kept, offsets, shapes, original_shapes, labels, label_counts = [], [], [], [], [], []
+    offset = 0
+    tmp_data = Path(str(data_path) + '.tmp')
+
+    # cv2 releases the GIL while decoding, so threads are enough here
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool, open(tmp_data, 'wb') as out:
+        for path, (image, original_shape) in zip(files, pool.map(lambda f: load_resized(f, img_size), files)):
+            if image is None:
+                print(f"Warning: could not read {path}, skipping")
+                continue
+            out.write(image.tobytes())
+            kept.append(path)
+            offsets.append(offset)
+            shapes.append(image.shape[:2])
+            original_shapes.append(original_shape)
+            file_labels = read_labels(label_path(path))
+            labels.append(file_labels)
+            label_counts.append(len(file_labels))
+            offset += image.nbytes
+
+    mtimes, sizes = _file_stats(kept)
+    tmp_index = Path(str(index_path) + '.tmp.npz')
+    np.savez(
+        tmp_index,
+        version=CACHE_VERSION,
+        img_size=img_size,
+        files=np.array(kept),
+        mtimes=mtimes,
+        sizes=sizes,
+        offsets=np.array(offsets, dtype=np.int64),
+        shapes=np.array(shapes, dtype=np.int32).reshape(-1, 2),
+        original_shapes=np.array(original_shapes, dtype=np.int32).reshape(-1, 2),
+        label_offsets=np.concatenate([[0], np.cumsum(label_counts)]).astype(np.int64),
+        labels=np.concatenate(labels) if labels else np.zeros((0, 5), dtype=np.float32),
+    )
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_index, index_path)
+
+    print(f"Cache written to {data_path} ({offset / 1e6:.1f} MB)")
+    return DatasetCache(data_path, index_path)
+
+
+class DatasetCache:
+    """
+    Read-only view of a built cache
+
+    Images come straight out of the memory map (no decode, no copy); the
+    arrays are read-only, so callers that augment must copy first.
+    """
+
+    def __init__(self, data_path, index_path):
+        index = np.load(index_path)
+        if int(index['version']) != CACHE_VERSION:
+            raise ValueError(f"{index_path} was built by an incompatible version")
+
+        self.img_size = int(index['img_size'])
+        self.files = [str(f) for f in index['files']]
+        self.mtimes = index['mtimes']
+        self.sizes = index['sizes']
+        self.offsets = index['offsets']
+        self.shapes = index['shapes']
+        self.original_shapes = index['original_shapes']
+        self.label_offsets = index['label_offsets']
+        self.all_labels = index['labels']
+
+        self.data = np.memmap(data_path, dtype=np.uint8, mode='r') if self.files else np.zeros(0, np.uint8)
+        self._lookup = {os.path.abspath(f): i for i, f in enumerate(self.files)}
+
+    def __len__(self):
+        return len(self.files)
+
+    def index_of(self, path):
+        """Position of an image path in the cache, or None"""
+        return self._lookup.get(os.path.abspath(path))
+
+    def image(self, i):
+        """Cached BGR image i as a read-only view into the memory map"""
+        h, w = self.shapes[i]
+        start = self.offsets[i]
+        return self.data[start:start + h * w * 3].reshape(h, w, 3)
+
+    def original_shape(self, i):
+        h0, w0 = self.original_shapes[i]
+        return int(h0), int(w0)
+
+    def labels(self, i):
+        """YOLO labels of image i as an (N, 5) array [class, cx, cy, w, h]"""
+        return self.all_labels[self.label_offsets[i]:self.label_offsets[i + 1]]
+
+    def is_stale(self, image_dir):
+        """True if images were added, removed or modified since the cache was built"""
+        files = list_images(image_dir)
+        if files != self.files:
+            return True
+        mtimes, sizes = _file_stats(files)
+        return not (np.array_equal(mtimes, self.mtimes) and np.array_equal(sizes, self.sizes))
+
+
+def open_cache(image_dir, img_size=640, rebuild=False, workers=None):
+    """
+    Open the cache for an image directory, building it if missing or stale
+
+    Returns:
+        DatasetCache
+    """
+    data_path, index_path = cache_paths(image_dir, img_size)
+    if not rebuild and data_path.exists() and index_path.exists():
+        try:
+            cache = DatasetCache(data_path, index_path)
+            if not cache.is_stale(image_dir):
+                return cache
+            print(f"Cache for {image_dir} is out of date, rebuilding")
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Cache for {image_dir} is unreadable ({e}), rebuilding")
+    return build_cache(image_dir, img_size, workers)
+
+
+def install_yolov5_hook(caches):
+    """
+    Make YOLOv5's dataloader read images from the given caches
+
+    Patches LoadImagesAndLabels.load_image; images that are not cached, or
+    cached at a different size than the dataset's img_size, and every image of
+    a non-augmenting (val/test) dataset fall back to the original decode path.
+    The YOLOv5 repository must already be on sys.path.
+    DataLoader workers inherit the patch when they are forked (Linux); with
+    spawned workers (Windows) train with --workers 0 to use the cache.
+    """
+    try:
+        from utils import dataloaders as yolo_data
+    except ImportError:
+        from utils import datasets as yolo_data  # YOLOv5 < 7.0
+
+    dataset_class = yolo_data.LoadImagesAndLabels
+    original = getattr(dataset_class, '_uncached_load_image', dataset_class.load_image)
+
+    lookup = {}
+    for cache in caches:
+        for i, f in enumerate(cache.files):
+            lookup[os.path.abspath(f)] = (cache, i)
+
+    def load_image(self, i):
+        files = getattr(self, 'im_files', None) or self.img_files
+        entry = lookup.get(os.path.abspath(files[i]))
+        if entry is None or entry[0].img_size != self.img_size or not self.augment:
+            return original(self, i)
+        cache, index = entry
+        image = cache.image(index)
+        return image, cache.original_shape(index), image.shape[:2]
+
+    dataset_class._uncached_load_image = original
+    dataset_class.load_image = load_image
+    print(f"YOLOv5 dataloader reading {len(lookup)} images from the dataset cache")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Build memory-mapped image caches for training')
+    parser.add_argument('image_dirs', type=str, nargs='+', help='Image directories (e.g. GarbageDataSet/train/images)')
+    parser.add_argument('--img-size', type=int, default=640, help='Training image size')
+    parser.add_argument('--workers', type=int, default=None, help='Decoder threads')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild even if the cache is up to date')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    try:
+        for image_dir in args.image_dirs:
+            cache = open_cache(image_dir, args.img_size, args.rebuild, args.workers)
+            print(f"{image_dir}: {len(cache)} images, {len(cache.all_labels)} labels")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
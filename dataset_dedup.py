@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# Perceptual-hash near-duplicate detection, pruning and leak-free splits
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import dataset_index
+from dataset_cache import list_images, label_path
+
+HASH_FILE = 'dataset_hashes.json'
+
+# Roboflow exports name augmented copies <source>_<ext>.rf.<hash>.<ext>
+ROBOFLOW_NAME = re.compile(r'^(?P<source>.+)\.rf\.[0-9a-f]{32}$')
+
+
+def phash(image_path, hash_size=8, highfreq_factor=4):
+    """
+    64-bit DCT perceptual hash of an image
+
+    The image is reduced to a 32x32 grayscale, transformed with a DCT, and
+    the lowest 8x8 frequencies (without the DC term) are thresholded at
+    their median.
+
+    Returns:
+        int hash, or None if the image cannot be read
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    size = hash_size * highfreq_factor
+    small = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size].flatten()
+    bits = low[1:] > np.median(low[1:])
+    return int(np.packbits(np.concatenate([[False], bits])).view('>u8')[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance
+
+    Radius queries only descend into children whose edge distance is within
+    radius of the query's distance to the node (triangle inequality), so most
+    of the tree is skipped for small radii.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def query(self, value, radius):
+        """All (distance, item) pairs within radius of value"""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                results.extend((distance, item) for item in items)
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+def hash_dataset(root, workers=None, rehash=False):
+    """
+    Perceptual hashes for every image under root, cached by mtime in dataset_hashes.json
+
+    Returns:
+        dict of relative path -> hash (unreadable images are left out)
+    """
+    root = Path(root)
+    cache_path = root / HASH_FILE
+    cached = {}
+    if not rehash and cache_path.exists():
+        with open(cache_path) as f:
+            cached = json.load(f)
+
+    hashes, to_hash = {}, []
+    for path in list_images(root):
+        rel = Path(path).relative_to(root).as_posix()
+        entry = cached.get(rel)
+        if entry and entry['mtime'] == os.stat(path).st_mtime_ns:
+            hashes[rel] = entry
+        else:
+            to_hash.append((rel, path))
+
+    if to_hash:
+        print(f"Hashing {len(to_hash)} images...")
+        # cv2 releases the GIL while decoding and resizing
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for (rel, path), value in zip(to_hash, pool.map(phash, [p for _, p in to_hash])):
+                hashes[rel] = {'mtime': os.stat(path).st_mtime_ns, 'hash': value}
+
+    with open(cache_path, 'w') as f:
+        json.dump(hashes, f)
+    return {rel: entry['hash'] for rel, entry in hashes.items() if entry['hash'] is not None}
+
+
+def find_clusters(hashes, radius=6, group_by_source=False):
+    """
+    Group images whose hashes are within radius bits of each other
+
+    Args:
+        hashes: dict of relative path -> hash
+        radius: Maximum Hamming distance between near-duplicates
+        group_by_source: Also group Roboflow augmentations of the same source image
+
+    Returns:
+        list of clusters (sorted lists of relative paths), largest first;
+        images without duplicates are not included
+    """
+    tree = BKTree()
+    for rel, value in hashes.items():
+        tree.add(value, rel)
+
+    # Union-find over all near-duplicate pairs
+    parent = {rel: rel for rel in hashes}
+
+    def find(rel):
+        while parent[rel] != rel:
+            parent[rel] = parent[parent[rel]]
+            rel = parent[rel]
+        return rel
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    for rel, value in hashes.items():
+        for _, other in tree.query(value, radius):
+            union(rel, other)
+
+    if group_by_source:
+        sources = {}
+        for rel in hashes:
+            match = ROBOFLOW_NAME.match(Path(rel).stem)
+            if match:
+                key = (Path(rel).parent.as_posix(), match.group('source'))
+                union(rel, sources.setdefault(key, rel))
+
+    clusters = {}
+    for rel in hashes:
+        clusters.setdefault(find(rel), []).append(rel)
+    return sorted((sorted(c) for c in clusters.values() if len(c) > 1), key=lambda c: (-len(c), c[0]))
+
+
+def choose_keepers(clusters, entries):
+    """
+    Pick one image per cluster to keep: the one with the most labelled boxes
+
+    Returns:
+        set of relative paths to drop
+    """
+    dropped = set()
+    for cluster in clusters:
+        keep = max(cluster, key=lambda rel: (len(entries.get(rel, {}).get('boxes', [])), -cluster.index(rel)))
+        dropped.update(rel for rel in cluster if rel != keep)
+    return dropped
+
+
+def write_pruned(root, output, keep):
+    """
+    Copy the kept images and their labels to a new dataset directory
+
+    Files are hard-linked when possible, so the pruned copy takes no space.
+    """
+    root, output = Path(root), Path(output)
+    for rel in keep:
+        for source in (root / rel, Path(label_path(str(root / rel)))):
+            if not source.exists():
+                continue
+            target = output / source.relative_to(root)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                target.unlink()
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+    if (root / 'data.yaml').exists():
+        shutil.copy2(root / 'data.yaml', output / 'data.yaml')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Find near-duplicate images in a YOLO dataset')
+    parser.add_argument('root', type=str, nargs='?', default='GarbageDataSet', help='Dataset directory')
+    parser.add_argument('--radius', type=int, default=6,
+                        help='Maximum Hamming distance (of 64 bits) between near-duplicates')
+    parser.add_argument('--group-by-source', action='store_true',
+                        help='Also treat Roboflow augmentations of the same source image as duplicates')
+    parser.add_argument('--workers', type=int, default=None, help='Hashing threads')
+    parser.add_argument('--rehash', action='store_true', help='Ignore cached hashes')
+    parser.add_argument('--report', type=str, default=None, help='Write the clusters as JSON')
+    parser.add_argument('--prune-to', type=str, default=None,
+                        help='Write a dataset with one image per cluster to this directory')
+    parser.add_argument('--split', action='store_true',
+                        help='Write a split that keeps each cluster in a single split')
+    parser.add_argument('--val', type=float, default=0.1, help='Validation fraction')
+    parser.add_argument('--test', type=float, default=0.1, help='Test fraction')
+    parser.add_argument('--seed', type=int, default=0, help='Split seed')
+    parser.add_argument('--yaml', type=str, default=None, help='Where to write the split YAML')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if not os.path.isdir(args.root):
+        print(f"Error: {args.root} is not a directory")
+        sys.exit(1)
+
+    hashes = hash_dataset(args.root, args.workers, args.rehash)
+    clusters = find_clusters(hashes, args.radius, args.group_by_source)
+    entries = dataset_index.index_dataset(args.root, args.workers)
+    dropped = choose_keepers(clusters, entries)
+
+    duplicates = sum(len(c) for c in clusters)
+    print(f"\n{len(hashes)} images, {len(clusters)} duplicate clusters covering {duplicates} images "
+          f"({len(dropped)} redundant)")
+    for cluster in clusters[:20]:
+        print(f"  {len(cluster):>3}  {', '.join(cluster[:3])}{' ...' if len(cluster) > 3 else ''}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'radius': args.radius, 'clusters': clusters, 'dropped': sorted(dropped)}, f, indent=2)
+        print(f"Clusters saved to {args.report}")
+
+    if args.prune_to:
+        keep = sorted(rel for rel in hashes if rel not in dropped)
+        write_pruned(args.root, args.prune_to, keep)
+        print(f"Pruned dataset with {len(keep)} images written to {args.prune_to}")
+
+    if args.split:
+        splits = dataset_index.stratified_split(entries, args.val, args.test, args.seed, clusters)
+        names = dataset_index.class_names(args.root, entries)
+        yaml_path = dataset_index.write_splits(args.root, splits, names, args.yaml)
+        print(f"Leak-free split {len(splits['train'])}/{len(splits['val'])}/{len(splits['test'])} "
+              f"(train/val/test) written to {yaml_path}")
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# Dataset indexer: validates images and YOLO labels, reports statistics and writes splits
+
+import os
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+from PIL import Image
+
+from dataset_cache import list_images, label_path
+
+INDEX_FILE = 'dataset_index.json'
+INDEX_VERSION = 1
+
+# Box area buckets in pixels, as in COCO (small < 32^2 <= medium < 96^2 <= large)
+SIZE_BUCKETS = (('small', 32 ** 2), ('medium', 96 ** 2), ('large', float('inf')))
+
+# EXIF orientations that swap width and height
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_image(image_path):
+    """
+    Validate one image and its label file
+
+    Returns:
+        dict with the image size, boxes [class, cx, cy, w, h], file mtimes
+        and a list of problems found
+    """
+    labels = label_path(image_path)
+    entry = {
+        'mtime': _mtime(image_path),
+        'label_mtime': _mtime(labels),
+        'width': None,
+        'height': None,
+        'boxes': [],
+        'issues': [],
+    }
+
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+            if img.getexif().get(0x0112) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+        with Image.open(image_path) as img:
+            img.verify()  # Catches truncated or corrupt files
+        entry['width'], entry['height'] = width, height
+    except Exception as e:
+        entry['issues'].append(f"unreadable image: {e}")
+
+    if entry['label_mtime'] is None:
+        entry['issues'].append("missing label file")
+        return entry
+
+    with open(labels) as f:
+        for line_number, line in enumerate(f, 1):
+            values = line.split()
+            if not values:
+                continue
+            if len(values) != 5:
+                entry['issues'].append(f"line {line_number}: expected 5 values, got {len(values)}")
+                continue
+            try:
+                cls = int(values[0])
+                cx, cy, w, h = (float(v) for v in values[1:])
+            except ValueError:
+                entry['issues'].append(f"line {line_number}: not a number")
+                continue
+            if cls < 0:
+                entry['issues'].append(f"line {line_number}: negative class {cls}")
+            elif not all(0 <= v <= 1 for v in (cx, cy, w, h)) or w <= 0 or h <= 0:
+                entry['issues'].append(f"line {line_number}: box outside [0, 1] or empty")
+            else:
+                entry['boxes'].append([cls, cx, cy, w, h])
+    return entry
+
+
+def index_dataset(root, workers=None, rescan=False, index_path=None):
+    """
+    Scan every image under root, reusing cached entries whose files are unchanged
+
+    The index is stored as dataset_index.json in root unless index_path says
+    otherwise. An entry is only re-scanned when the image or label mtime
+    differs from the cached one.
+
+    Args:
+        root: Dataset directory (any layout with images/ and labels/ folders)
+        workers: Scanner threads (default: CPU count)
+        rescan: Ignore the cached index
+        index_path: Where to keep the index (default: root/dataset_index.json)
+
+    Returns:
+        dict mapping image paths (relative to root) to entries
+    """
+    root = Path(root)
+    index_path = Path(index_path) if index_path else root / INDEX_FILE
+    cached = {}
+    if not rescan and index_path.exists():
+        with open(index_path) as f:
+            data = json.load(f)
+        if data.get('version') == INDEX_VERSION:
+            cached = data['images']
+
+    files = list_images(root)
+    entries, to_scan = {}, []
+    for path in files:
+        rel = Path(path).relative_to(root).as_posix()
+        entry = cached.get(rel)
+        if entry and entry['mtime'] == _mtime(path) and entry['label_mtime'] == _mtime(label_path(path)):
+            entries[rel] = entry
+        else:
+            to_scan.append((rel, path))
+
+    if to_scan:
+        print(f"Scanning {len(to_scan)} of {len(files)} images...")
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for (rel, _), entry in zip(to_scan, pool.map(scan_image, [p for _, p in to_scan])):
+                entries[rel] = entry
+    else:
+        print(f"Index up to date ({len(files)} images)")
+
+    with open(index_path, 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'images': entries}, f)
+    return entries
+
+
+def dataset_statistics(entries):
+    """
+    Summarize an index: image sizes, box counts, class histogram and box sizes
+
+    Returns:
+        dict of statistics
+    """
+    classes = Counter()
+    sizes = Counter()
+    buckets = Counter()
+    boxes_per_image = Counter()
+    issues = 0
+    for entry in entries.values():
+        issues += bool(entry['issues'])
+        boxes_per_image[len(entry['boxes'])] += 1
+        if entry['width']:
+            sizes[f"{entry['width']}x{entry['height']}"] += 1
+        for cls, _, _, w, h in entry['boxes']:
+            classes[cls] += 1
+            if entry['width']:
+                area = w * entry['width'] * h * entry['height']
+                buckets[next(name for name, limit in SIZE_BUCKETS if area < limit)] += 1
+
+    return {
+        'images': len(entries),
+        'background_images': boxes_per_image.get(0, 0),
+        'images_with_issues': issues,
+        'boxes': sum(classes.values()),
+        'classes': dict(sorted(classes.items())),
+        'box_sizes': {name: buckets.get(name, 0) for name, _ in SIZE_BUCKETS},
+        'boxes_per_image': dict(sorted(boxes_per_image.items())),
+        'image_sizes': dict(sizes.most_common()),
+    }
+
+
+def stratified_split(entries, val=0.1, test=0.1, seed=0, clusters=None):
+    """
+    Split images into train/val/test keeping class proportions
+
+    Each image is stratified by its rarest class (background images form
+    their own group), so rare classes still reach every split.
+
+    Args:
+        clusters: Optional lists of relative paths that must land in the same
+            split (e.g. near-duplicates found by dataset_dedup.py)
+
+    Returns:
+        dict of split name -> sorted list of relative image paths
+    """
+    counts = Counter(box[0] for entry in entries.values() for box in entry['boxes'])
+    clusters = [sorted(cluster) for cluster in clusters or []]
+    clustered = {rel for cluster in clusters for rel in cluster}
+    units = [[rel] for rel in sorted(entries) if rel not in clustered] + clusters
+
+    groups = defaultdict(list)
+    for unit in units:
+        # Unreadable images are left out of every split
+        unit = [rel for rel in unit if rel in entries and entries[rel]['width'] is not None]
+        if not unit:
+            continue
+        classes = {box[0] for rel in unit for box in entries[rel]['boxes']}
+        groups[min(classes, key=lambda c: counts[c]) if classes else 'background'].append(unit)
+
+    rng = random.Random(seed)
+    splits = {'train': [], 'val': [], 'test': []}
+    for key in sorted(groups, key=str):
+        members = groups[key]
+        rng.shuffle(members)
+        total = sum(len(unit) for unit in members)
+        n_test = int(round(total * test))
+        n_val = int(round(total * val))
+        taken = 0
+        for unit in members:
+            if taken < n_test:
+                splits['test'] += unit
+            elif taken < n_test + n_val:
+                splits['val'] += unit
+            else:
+                splits['train'] += unit
+            taken += len(unit)
+    return {name: sorted(files) for name, files in splits.items()}
+
+
+def class_names(root, entries):
+    """Class names from the dataset's own data.yaml if present, else from the label ids"""
+    names = []
+    source = Path(root) / 'data.yaml'
+    if source.exists():
+        with open(source) as f:
+            names = (yaml.safe_load(f) or {}).get('names') or []
+        if isinstance(names, dict):
+            names = [names[k] for k in sorted(names)]
+
+    highest = max((box[0] for entry in entries.values() for box in entry['boxes']), default=-1)
+    names = list(names) + [f"class_{i}" for i in range(len(names), highest + 1)]
+    return names
+
+
+def split_files(data_yaml, split='val'):
+    """
+    Image paths of one split of a YOLOv5 data YAML
+
+    Split entries may be image directories or image list files (as written
+    by write_splits), relative to the YAML's path (or the YAML itself).
+
+    Returns:
+        list of absolute image paths
+    """
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f) or {}
+
+    root = Path(data.get('path') or '.')
+    if not root.is_absolute():
+        root = (Path(data_yaml).parent / root).resolve()
+
+    entries = data.get(split) or []
+    files = []
+    for entry in ([entries] if isinstance(entries, str) else entries):
+        target = Path(entry) if Path(entry).is_absolute() else (root / entry).resolve()
+        if target.is_dir():
+            files += list_images(target)
+        elif target.suffix == '.txt' and target.is_file():
+            with open(target) as f:
+                files += [str((target.parent / line.strip()).resolve()) for line in f if line.strip()]
+    return files
+
+
+def write_splits(root, splits, names, yaml_path=None, list_dir=None):
+    """
+    Write train.txt/val.txt/test.txt image lists and a YOLOv5 data YAML
+
+    The lists go into list_dir (default: the dataset root). Paths in them are
+    relative to the root when they sit there and absolute otherwise, and the
+    YAML uses the absolute list directory, so it works regardless of the
+    working directory.
+
+    Returns:
+        Path of the YAML file
+    """
+    root = Path(root).resolve()
+    list_dir = Path(list_dir).resolve() if list_dir else root
+    list_dir.mkdir(parents=True, exist_ok=True)
+    for name, files in splits.items():
+        with open(list_dir / f"{name}.txt", 'w') as f:
+            if list_dir == root:
+                f.writelines(f"./{rel}\n" for rel in files)
+            else:
+                f.writelines(f"{root / rel}\n" for rel in files)
+
+    data = {
+        'path': str(list_dir),
+        'train': 'train.txt',
+        'val': 'val.txt' if splits['val'] else 'train.txt',
+    }
+    if splits['test']:
+        data['test'] = 'test.txt'
+    data['nc'] = len(names)
+    data['names'] = names
+
+    yaml_path = Path(yaml_path) if yaml_path else root / 'split.yaml'
+    yaml_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(yaml_path, 'w') as f:
+        yaml.dump(data, f, default_flow_style=False, sort_keys=False)
+    return yaml_path
+
+
+def print_report(entries, stats, names, max_issues=20):
+    print(f"\n{stats['images']} images, {stats['boxes']} boxes, "
+          f"{stats['background_images']} background images, {stats['images_with_issues']} with issues")
+
+    print("\nClasses:")
+    for cls, count in stats['classes'].items():
+        name = names[cls] if cls < len(names) else f"class_{cls}"
+        print(f"  {cls:>3} {name:<20} {count:>7}")
+
+    print("\nBox sizes:")
+    for name, count in stats['box_sizes'].items():
+        print(f"  {name:<8} {count:>7}")
+
+    print("\nBoxes per image:")
+    for boxes, count in stats['boxes_per_image'].items():
+        print(f"  {boxes:>3} {count:>7}")
+
+    problems = [(rel, issue) for rel, entry in sorted(entries.items()) for issue in entry['issues']]
+    if problems:
+        print(f"\nIssues ({len(problems)}):")
+        for rel, issue in problems[:max_issues]:
+            print(f"  {rel}: {issue}")
+        if len(problems) > max_issues:
+            print(f"  ... and {len(problems) - max_issues} more")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Index, validate and split a YOLO dataset')
+    parser.add_argument('root', type=str, nargs='?', default='GarbageDataSet', help='Dataset directory')
+    parser.add_argument('--workers', type=int, default=None, help='Scanner threads')
+    parser.add_argument('--rescan', action='store_true', help='Ignore the cached index')
+    parser.add_argument('--val', type=float, default=0.1, help='Validation fraction')
+    parser.add_argument('--test', type=float, default=0.1, help='Test fraction')
+    parser.add_argument('--seed', type=int, default=0, help='Split seed')
+    parser.add_argument('--yaml', type=str, default=None,
+                        help='Where to write the data YAML (default: <root>/split.yaml)')
+    parser.add_argument('--no-split', action='store_true', help='Only report, do not write splits')
+    parser.add_argument('--json', type=str, default=None, help='Also write the statistics as JSON')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if not os.path.isdir(args.root):
+        print(f"Error: {args.root} is not a directory")
+        sys.exit(1)
+
+    entries = index_dataset(args.root, args.workers, args.rescan)
+    stats = dataset_statistics(entries)
+    names = class_names(args.root, entries)
+    print_report(entries, stats, names)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+    if not args.no_split:
+        splits = stratified_split(entries, args.val, args.test, args.seed)
+        yaml_path = write_splits(args.root, splits, names, args.yaml)
+        print(f"\nSplit {len(splits['train'])}/{len(splits['val'])}/{len(splits['test'])} "
+              f"(train/val/test) written to {yaml_path}")
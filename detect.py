@@ -3,7 +3,17 @@ import cv2
 import torch
 import numpy as np
 import argparse
+import json
+import time
+import atexit
 from datetime import datetime
+import frame_trace
+import inference_service
+import frame_sources
+from overlay import renderer
+from governor import Governor
+from snapshot_writer import SnapshotWriter
+from preprocess import LetterboxPreprocessor, non_max_suppression, raw_prediction, scale_boxes
 
 class GarbageDetector:
     def __init__(self, model_path='model/best.pt', conf_threshold=0.35, device=None):
@@ -16,6 +26,7 @@ class GarbageDetector:
             device: Device to run the model on (None for auto-selection)
         """
         self.conf_threshold = conf_threshold
+        self.preprocessor = LetterboxPreprocessor()
         
         # Determine device
         if device is None:
@@ -66,21 +77,30 @@ class GarbageDetector:
         # Resize image if needed
         orig_shape = image.shape
         
-        # Convert BGR to RGB (YOLOv5 expects RGB)
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        t0 = time.perf_counter()
+        
+        # Letterbox into a reused RGB input tensor (YOLOv5 expects RGB)
+        tensor, meta = self.preprocessor(image, image_size)
+        t1 = time.perf_counter()
         
         # Run inference
-        results = self.model(image_rgb, size=image_size)
+        with torch.no_grad():
+            prediction = raw_prediction(self.model(tensor.to(self.device)))
+        t2 = time.perf_counter()
         
         # Process results
-        detections = results.xyxy[0].cpu().numpy()  # Get detections as numpy array
+        detections = non_max_suppression(prediction, self.conf_threshold, getattr(self.model, 'iou', 0.45))[0]
+        detections = scale_boxes(detections, meta).cpu().numpy()  # Get detections as numpy array
         
         # Filter by confidence threshold
         detections = detections[detections[:, 4] >= self.conf_threshold]
         
+        # Stage timings of the last call, picked up by the frame tracer
+        self.last_timings = {'preprocess': (t0, t1), 'inference': (t1, t2), 'postprocess': (t2, time.perf_counter())}
+        
         return detections
     
-    def draw_detections(self, image, detections, class_mapping=None):
+    def draw_detections(self, image, detections, class_mapping=None, in_place=False):
         """
         Draw bounding boxes and labels on the image
         
@@ -88,11 +108,12 @@ class GarbageDetector:
             image: OpenCV image (BGR format)
             detections: List of detections from detect() method
             class_mapping: Dictionary mapping class IDs to class names
+            in_place: Draw on the image itself instead of a copy (when the caller owns the frame)
             
         Returns:
             Image with drawn detections
         """
-        image_copy = image.copy()
+        image_copy = image if in_place else image.copy()
         
         # Define color map for different classes
         color_map = {
@@ -135,17 +156,48 @@ class GarbageDetector:
                 color = color_map['default']
             
             # Draw rectangle
-            cv2.rectangle(image_copy, (x1, y1), (x2, y2), color, 2)
+            renderer.box(image_copy, (x1, y1, x2, y2), color, 2)
             
-            # Draw label
-            label = f"{cls_name}: {conf:.2f}"
-            text_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-            cv2.rectangle(image_copy, (x1, y1 - text_size[1] - 5), (x1 + text_size[0], y1), color, -1)
-            cv2.putText(image_copy, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+            # Draw label (cached sprite)
+            renderer.label(image_copy, f"{cls_name}: {conf:.2f}", (x1, y1), color)
         
         return image_copy
 
-def process_image(image_path, output_path=None, conf_threshold=0.35):
+class DaemonDetector(inference_service.ServiceDetector, GarbageDetector):
+    """GarbageDetector whose model runs in the shared inference service (see inference_service.py)"""
+    
+    def detect(self, image, image_size=640):
+        """Detect garbage in an image; same results as GarbageDetector.detect"""
+        return self.predict(image, image_size)
+    
+    def draw_detections(self, image, detections, class_mapping=None, in_place=False):
+        return super().draw_detections(image, detections, class_mapping or self.class_names, in_place)
+
+# Detectors by (conf_threshold, daemon address), so repeated calls in one process load the model once
+_detectors = {}
+
+def get_detector(conf_threshold=0.35, daemon=None):
+    """
+    Shared detector for a confidence threshold
+    
+    Args:
+        conf_threshold: Confidence threshold for detections
+        daemon: Inference service address; runs the model there instead of in this process
+        
+    Returns:
+        GarbageDetector or DaemonDetector
+    """
+    key = (conf_threshold, daemon)
+    if key not in _detectors:
+        if daemon:
+            detector = DaemonDetector(daemon, conf_threshold=conf_threshold)
+            atexit.register(detector.close)
+        else:
+            detector = GarbageDetector(conf_threshold=conf_threshold)
+        _detectors[key] = detector
+    return _detectors[key]
+
+def process_image(image_path, output_path=None, conf_threshold=0.35, daemon=None):
     """
     Process a single image and display/save the result
     
@@ -153,6 +205,7 @@ def process_image(image_path, output_path=None, conf_threshold=0.35):
         image_path: Path to the input image
         output_path: Path to save the output image (if None, just display)
         conf_threshold: Confidence threshold for detections
+        daemon: Inference service address to detect with (optional)
     """
     # Load image
     image = cv2.imread(image_path)
@@ -160,8 +213,8 @@ def process_image(image_path, output_path=None, conf_threshold=0.35):
         print(f"Error: Could not load image at {image_path}")
         return
     
-    # Initialize detector
-    detector = GarbageDetector(conf_threshold=conf_threshold)
+    # Initialize detector (loaded once per process, or kept warm by the daemon)
+    detector = get_detector(conf_threshold, daemon)
     
     # Detect garbage
     detections = detector.detect(image)
@@ -180,7 +233,7 @@ def process_image(image_path, output_path=None, conf_threshold=0.35):
         cv2.waitKey(0)
         cv2.destroyAllWindows()
 
-def process_video(video_path, output_path=None, conf_threshold=0.35, fps_limit=30):
+def process_video(video_path, output_path=None, conf_threshold=0.35, fps_limit=30, trace_path=None, daemon=None):
     """
     Process a video and save/display the result
     
@@ -189,6 +242,8 @@ def process_video(video_path, output_path=None, conf_threshold=0.35, fps_limit=3
         output_path: Path to save the output video (if None, just display)
         conf_threshold: Confidence threshold for detections
         fps_limit: Maximum FPS to process (to avoid overloading the system)
+        trace_path: Path to record a per-frame stage trace (optional)
+        daemon: Inference service address to detect with (optional)
     """
     # Open video
     cap = cv2.VideoCapture(video_path)
@@ -205,7 +260,7 @@ def process_video(video_path, output_path=None, conf_threshold=0.35, fps_limit=3
     process_every_n_frames = max(1, int(fps / fps_limit))
     
     # Initialize detector
-    detector = GarbageDetector(conf_threshold=conf_threshold)
+    detector = get_detector(conf_threshold, daemon)
     
     # Initialize video writer if needed
     writer = None
@@ -218,44 +273,59 @@ def process_video(video_path, output_path=None, conf_threshold=0.35, fps_limit=3
     frame_count = 0
     detections_count = 0
     start_time = datetime.now()
+    tracer = frame_trace.open_recorder(trace_path)
     
     while True:
+        capture_start = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
             break
+        tracer.start_frame(capture_start)
+        tracer.span(frame_trace.CAPTURE, capture_start, time.perf_counter())
         
         frame_count += 1
         
         # Process only every Nth frame
         if frame_count % process_every_n_frames != 0:
             if writer:
+                output_start = time.perf_counter()
                 writer.write(frame)
+                tracer.span(frame_trace.OUTPUT, output_start, time.perf_counter())
+            tracer.end_frame()
             continue
         
         # Detect garbage
         detections = detector.detect(frame)
+        tracer.spans(detector.last_timings)
         
         # Count detections
         if len(detections) > 0:
             detections_count += 1
         
         # Draw detections
-        result_frame = detector.draw_detections(frame, detections)
+        draw_start = time.perf_counter()
+        result_frame = detector.draw_detections(frame, detections, in_place=True)
+        output_start = time.perf_counter()
+        tracer.span(frame_trace.DRAW, draw_start, output_start)
         
         # Write or display the frame
+        key = None
         if writer:
             writer.write(result_frame)
         else:
             cv2.imshow("Garbage Detection", result_frame)
             key = cv2.waitKey(1)
-            if key == 27:  # ESC key
-                break
+        tracer.span(frame_trace.OUTPUT, output_start, time.perf_counter())
+        tracer.end_frame(detection=True, garbage=len(detections) > 0)
+        if key == 27:  # ESC key
+            break
     
     # Release resources
     cap.release()
     if writer:
         writer.release()
     cv2.destroyAllWindows()
+    tracer.close()
     
     # Calculate performance
     end_time = datetime.now()
@@ -265,35 +335,227 @@ def process_video(video_path, output_path=None, conf_threshold=0.35, fps_limit=3
     print(f"Processed {frame_count} frames in {processing_time:.2f} seconds ({actual_fps:.2f} FPS)")
     print(f"Detected garbage in {detections_count} frames")
 
-def process_camera(camera_id=0, output_path=None, conf_threshold=0.35, resolution=(1280, 720)):
+def _read_frame_at(cap, target_frame, max_grab=30):
+    """
+    Position the capture on a frame and read it
+    
+    Short forward hops are done with grab(). With the FFmpeg backend grab()
+    still decodes, but stepping through a few frames is cheaper than a seek,
+    which restarts decoding at the nearest keyframe before the target. Anything
+    further away seeks, so long gaps are never walked frame by frame.
+    
+    Args:
+        cap: Opened cv2.VideoCapture
+        target_frame: Index of the frame to read
+        max_grab: Largest forward distance handled by grabbing instead of seeking
+        
+    Returns:
+        (ret, frame) as returned by cap.read()
+    """
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    distance = target_frame - position
+    
+    if 0 <= distance <= max_grab:
+        for _ in range(distance):
+            if not cap.grab():
+                return False, None
+    else:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
+    
+    return cap.read()
+
+def _build_timeline(samples):
+    """
+    Merge sampled detection results into garbage intervals
+    
+    Consecutive hit samples (with no miss sampled between them) form one interval.
+    
+    Args:
+        samples: Dictionary mapping timestamp (seconds) to (hit, max_confidence)
+        
+    Returns:
+        List of interval dictionaries sorted by start time
+    """
+    intervals = []
+    current = None
+    
+    for t in sorted(samples):
+        hit, confidence = samples[t]
+        if not hit:
+            current = None
+            continue
+        
+        if current is None:
+            current = {'start': t, 'end': t, 'samples': 0, 'max_confidence': 0.0}
+            intervals.append(current)
+        current['end'] = t
+        current['samples'] += 1
+        current['max_confidence'] = max(current['max_confidence'], confidence)
+    
+    for interval in intervals:
+        interval['start'] = round(interval['start'], 2)
+        interval['end'] = round(interval['end'], 2)
+        interval['max_confidence'] = round(float(interval['max_confidence']), 3)
+    
+    return intervals
+
+def _format_seconds(seconds):
+    """Format seconds as H:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def scan_video(video_path, output_path=None, conf_threshold=0.35, scan_interval=10.0, refine_interval=1.0,
+               daemon=None):
+    """
+    Quickly triage a long recording and report when garbage is visible
+    
+    Instead of decoding every frame, the video is sampled every scan_interval
+    seconds. Wherever two neighbouring samples disagree, the gap between them is
+    re-sampled every refine_interval seconds to locate the start and end of the
+    event. Only the sampled frames are run through the detector; the backend
+    still decodes the frames it steps over to reach them (see _read_frame_at).
+    
+    Args:
+        video_path: Path to the input video
+        output_path: Path to save the JSON timeline (if None, just print it)
+        conf_threshold: Confidence threshold for detections
+        scan_interval: Seconds between coarse samples
+        refine_interval: Seconds between samples when refining around hits
+        daemon: Inference service address to detect with (optional)
+        
+    Returns:
+        List of garbage intervals ({'start', 'end', 'samples', 'max_confidence'})
+    """
+    # The sampling loops only advance by these, so zero or less would never end
+    if scan_interval <= 0 or refine_interval <= 0:
+        raise ValueError(f"Scan and refine intervals must be positive (got {scan_interval} and {refine_interval})")
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video at {video_path}")
+        return []
+    
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = total_frames / fps if total_frames > 0 else 0
+    if duration <= 0:
+        print(f"Error: Could not determine the length of {video_path}")
+        cap.release()
+        return []
+    
+    refine_interval = min(refine_interval, scan_interval)
+    print(f"Scanning {_format_seconds(duration)} of video every {scan_interval}s "
+          f"(refining every {refine_interval}s)")
+    
+    detector = get_detector(conf_threshold, daemon)
+    samples = {}
+    start_time = datetime.now()
+    
+    def sample(t):
+        frame_index = min(int(round(t * fps)), total_frames - 1)
+        t = frame_index / fps
+        if t in samples:
+            return samples[t]
+        
+        ret, frame = _read_frame_at(cap, frame_index)
+        if not ret:
+            samples[t] = (False, 0.0)
+            return samples[t]
+        
+        detections = detector.detect(frame)
+        hit = len(detections) > 0
+        confidence = float(detections[:, 4].max()) if hit else 0.0
+        samples[t] = (hit, confidence)
+        return samples[t]
+    
+    # Coarse pass over the whole recording
+    coarse_times = []
+    t = 0.0
+    while t < duration:
+        coarse_times.append(t)
+        sample(t)
+        t += scan_interval
+    
+    # Refine wherever the state changes between neighbouring coarse samples
+    coarse_keys = sorted(samples)
+    for previous, following in zip(coarse_keys, coarse_keys[1:]):
+        if samples[previous][0] == samples[following][0]:
+            continue
+        t = previous + refine_interval
+        while t < following:
+            sample(t)
+            t += refine_interval
+    
+    # A hit on the last coarse sample still needs its tail refined
+    if coarse_keys and samples[coarse_keys[-1]][0]:
+        t = coarse_keys[-1] + refine_interval
+        while t < duration:
+            if not sample(t)[0]:
+                break
+            t += refine_interval
+    
+    cap.release()
+    
+    timeline = _build_timeline(samples)
+    processing_time = (datetime.now() - start_time).total_seconds()
+    
+    print(f"Detected on {len(samples)} of {total_frames} frames in {processing_time:.2f} seconds")
+    if timeline:
+        print(f"Garbage visible in {len(timeline)} interval(s):")
+        for interval in timeline:
+            print(f"  {_format_seconds(interval['start'])} - {_format_seconds(interval['end'])} "
+                  f"(max confidence {interval['max_confidence']:.2f})")
+    else:
+        print("No garbage detected")
+    
+    if output_path:
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w') as f:
+            json.dump({
+                'source': video_path,
+                'duration': round(duration, 2),
+                'scan_interval': scan_interval,
+                'refine_interval': refine_interval,
+                'frames_sampled': len(samples),
+                'intervals': timeline
+            }, f, indent=2)
+        print(f"Timeline saved to {output_path}")
+    
+    return timeline
+
+def process_camera(camera_id=0, output_path=None, conf_threshold=0.35, resolution=(1280, 720), trace_path=None,
+                   record_path=None, img_size=640, latency_budget=None, daemon=None):
     """
     Process live camera feed and display/save the result
     
     Args:
-        camera_id: Camera ID (0 for default camera)
+        camera_id: Camera ID (0 for default camera), stream URL, image directory or .frames replay
         output_path: Path to save the output video (if None, just display)
         conf_threshold: Confidence threshold for detections
         resolution: Camera resolution (width, height)
+        trace_path: Path to record a per-frame stage trace (optional)
+        record_path: Path to record the captured frames for replay (optional)
+        img_size: Input size for the model
+        latency_budget: Seconds per detection; lowers the input size and detection rate under load (optional)
+        daemon: Inference service address to detect with (optional)
     """
-    # Open camera
-    cap = cv2.VideoCapture(camera_id)
-    if not cap.isOpened():
-        print(f"Error: Could not open camera with ID {camera_id}")
+    # Open camera on a reader thread that reconnects with backoff if it drops
+    cap = frame_sources.open_stream(camera_id, record_path, resolution=resolution)
+    if not cap.wait_connected():
+        print(f"Error: Could not open camera {camera_id}: {cap.last_error}")
+        cap.release()
         return
     
-    # Set resolution
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
-    
     # Get actual resolution (may be different from requested)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    _, _, first_frame = cap.latest()
+    height, width = first_frame.shape[:2]
+    fps = cap.fps or 30.0
     
     print(f"Camera resolution: {width}x{height} at {fps} FPS")
     
     # Initialize detector
-    detector = GarbageDetector(conf_threshold=conf_threshold)
+    detector = get_detector(conf_threshold, daemon)
     
     # Initialize video writer if needed
     writer = None
@@ -306,25 +568,42 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=0.35, resolutio
     frame_count = 0
     start_time = datetime.now()
     process_every_n_frames = 3  # Process every 3rd frame to improve performance
+    governor = Governor(camera_id, budget=latency_budget, img_size=img_size, base_interval=process_every_n_frames)
+    tracer = frame_trace.open_recorder(trace_path)
+    # 's' captures are written in the background so the preview doesn't stall
+    snapshots = SnapshotWriter('.', min_interval=0, quota_bytes=None, prefixes=('capture_',))
     
     while True:
+        capture_start = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
-            print("Error: Could not read frame from camera")
-            break
+            if not cap.isOpened():
+                break
+            print("Waiting for camera to reconnect...")
+            continue
+        tracer.start_frame(capture_start)
+        tracer.span(frame_trace.CAPTURE, capture_start, time.perf_counter())
         
         frame_count += 1
         
         # Process only every Nth frame
-        if frame_count % process_every_n_frames == 0:
+        detections = None
+        if governor.should_detect(frame_count):
             # Detect garbage
-            detections = detector.detect(frame)
+            detect_start = time.perf_counter()
+            detections = detector.detect(frame, governor.img_size)
+            governor.observe(time.perf_counter() - detect_start)
+            tracer.spans(detector.last_timings)
             
             # Draw detections
-            result_frame = detector.draw_detections(frame, detections)
+            draw_start = time.perf_counter()
+            result_frame = detector.draw_detections(frame, detections, in_place=True)
+            tracer.span(frame_trace.DRAW, draw_start, time.perf_counter())
         else:
             result_frame = frame
         
+        output_start = time.perf_counter()
+        
         # Write or display the frame
         if writer:
             writer.write(result_frame)
@@ -332,14 +611,24 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=0.35, resolutio
         # Always display the frame
         cv2.imshow("Garbage Detection", result_frame)
         key = cv2.waitKey(1)
+        tracer.span(frame_trace.OUTPUT, output_start, time.perf_counter())
+        tracer.end_frame(detection=detections is not None,
+                         garbage=detections is not None and len(detections) > 0)
         if key == 27:  # ESC key
             break
+        elif key & 0xFF == ord('s'):  # Save image
+            img_name = snapshots.submit(result_frame, camera_id,
+                                        f"capture_{time.strftime('%Y%m%d_%H%M%S')}_{frame_count}.jpg")
+            if img_name:
+                print(f"Saving {img_name}")
     
     # Release resources
     cap.release()
+    snapshots.close()
     if writer:
         writer.release()
     cv2.destroyAllWindows()
+    tracer.close()
     
     # Calculate performance
     end_time = datetime.now()
@@ -348,6 +637,11 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=0.35, resolutio
     
     print(f"Processed {frame_count} frames in {processing_time:.2f} seconds ({actual_fps:.2f} FPS)")
 
+def is_live_source(source):
+    """Whether a --source is read as a live stream (camera, URL, image directory or .frames replay)"""
+    return (source.isdigit() or source.lower().startswith(frame_sources.STREAM_PREFIXES)
+            or source.endswith(frame_sources.REPLAY_EXTENSION) or os.path.isdir(source))
+
 def main():
     """Main function to parse arguments and call the appropriate processing function"""
     parser = argparse.ArgumentParser(description="Garbage Detection using YOLOv5")
@@ -355,25 +649,50 @@ def main():
     parser.add_argument('--output', type=str, default=None, help='Output path for processed image/video')
     parser.add_argument('--conf', type=float, default=0.35, help='Confidence threshold for detections')
     parser.add_argument('--img-size', type=int, default=640, help='Image size for processing')
+    parser.add_argument('--scan-interval', type=float, default=None,
+                        help='Fast-scan a video, sampling every N seconds, and output a timeline of garbage intervals')
+    parser.add_argument('--refine-interval', type=float, default=1.0,
+                        help='Sampling interval (seconds) used around hits in fast-scan mode')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Record per-frame stage timings to this trace file (see frame_trace.py)')
+    parser.add_argument('--record', type=str, default=None,
+                        help='Record live frames to a .frames file for replay (see frame_sources.py)')
+    parser.add_argument('--latency-budget', type=float, default=None,
+                        help='Detection latency budget in ms on live sources; lowers size and rate under load (see governor.py)')
+    parser.add_argument('--daemon', type=str, nargs='?', const=inference_service.DEFAULT_ADDRESS, default=None,
+                        help='Detect in the shared inference service at this address, starting it if needed, '
+                             'so repeated runs skip loading the model (see inference_service.py)')
     
     args = parser.parse_args()
+    if args.scan_interval is not None and args.scan_interval <= 0:
+        parser.error('--scan-interval must be positive')
+    if args.refine_interval <= 0:
+        parser.error('--refine-interval must be positive')
     
     # Determine source type
-    if args.source.isdigit():
-        # Camera
-        camera_id = int(args.source)
-        print(f"Processing camera feed from camera ID {camera_id}")
-        process_camera(camera_id=camera_id, output_path=args.output, conf_threshold=args.conf)
+    if is_live_source(args.source):
+        # Camera, network stream, image directory or recorded replay
+        camera_id = int(args.source) if args.source.isdigit() else args.source
+        print(f"Processing live source {camera_id}")
+        process_camera(camera_id=camera_id, output_path=args.output, conf_threshold=args.conf, trace_path=args.trace,
+                       record_path=args.record, img_size=args.img_size,
+                       latency_budget=args.latency_budget / 1000.0 if args.latency_budget else None,
+                       daemon=args.daemon)
     elif os.path.isfile(args.source):
         # Check if it's an image or video
         if args.source.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
             # Image
             print(f"Processing image: {args.source}")
-            process_image(args.source, args.output, args.conf)
+            process_image(args.source, args.output, args.conf, daemon=args.daemon)
         elif args.source.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
             # Video
-            print(f"Processing video: {args.source}")
-            process_video(args.source, args.output, args.conf)
+            if args.scan_interval:
+                print(f"Scanning video: {args.source}")
+                scan_video(args.source, args.output, args.conf, args.scan_interval, args.refine_interval,
+                           daemon=args.daemon)
+            else:
+                print(f"Processing video: {args.source}")
+                process_video(args.source, args.output, args.conf, trace_path=args.trace, daemon=args.daemon)
         else:
             print(f"Unsupported file format: {args.source}")
     else:
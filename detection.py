@@ -1,4 +1,5 @@
 import os
+import time
 import cv2
 import torch
 import numpy as np
@@ -7,17 +8,28 @@ from datetime import datetime
 import urllib.request
 import zipfile
 import shutil
+import metrics
+from overlay import renderer
+from preprocess import LetterboxPreprocessor, non_max_suppression, raw_prediction, scale_boxes
+
+# COCO classes reported as trash when running the pre-trained model
+COCO_TRASH = {'bottle', 'cup', 'wine glass', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple', 'sandwich',
+              'orange', 'paper', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'toothbrush', 'laptop',
+              'cell phone'}
 
 class GarbageDetector:
-    def __init__(self, model_path='model/best.pt', conf_threshold=0.25):
+    def __init__(self, model_path='model/best.pt', conf_threshold=0.25, img_size=640):
         """
         Initialize the garbage detector with a trained YOLOv5 model
         
         Args:
             model_path: Path to the YOLOv5 model weights
             conf_threshold: Confidence threshold for detections
+            img_size: Inference size of the longest side (see sweep.py)
         """
         self.conf_threshold = conf_threshold
+        self.img_size = img_size
+        self.preprocessor = LetterboxPreprocessor()
         
         print(f"Initializing garbage detector with threshold: {conf_threshold}")
         
@@ -94,69 +106,167 @@ class GarbageDetector:
             print(f"Error downloading pre-trained model: {e}")
             raise
     
-    def detect(self, frame):
+    def predict(self, frame, img_size=None, timings=None):
+        """
+        Raw detections of a frame, without class mapping or drawing
+        
+        Args:
+            frame: OpenCV image (BGR format)
+            img_size: Inference size for this frame (defaults to self.img_size)
+            timings: Optional dict filled with the preprocess, inference and postprocess stages
+            
+        Returns:
+            (N, 6) array of [x1, y1, x2, y2, confidence, class_id] in frame coordinates
+        """
+        t0 = time.perf_counter()
+        
+        # Letterbox into a reused RGB input tensor
+        tensor, meta = self.preprocessor(frame, img_size or self.img_size)
+        t1 = time.perf_counter()
+        
+        # Run inference
+        with torch.no_grad():
+            prediction = raw_prediction(self.model(tensor))
+        t2 = time.perf_counter()
+        
+        # Apply NMS and map boxes back to the frame
+        results = non_max_suppression(prediction, self.conf_threshold, getattr(self.model, 'iou', 0.45))[0]
+        results = scale_boxes(results, meta).cpu().numpy()
+        
+        if timings is not None:
+            timings.update(preprocess=(t0, t1), inference=(t1, t2), postprocess=(t2, time.perf_counter()))
+        return results
+    
+    def detect(self, frame, copy=True, img_size=None, timings=None):
         """
         Detect garbage in a frame
         
         Args:
             frame: OpenCV image (BGR format)
+            copy: Annotate a copy; pass False to draw on the frame itself when the caller owns it
+            img_size: Inference size for this frame (defaults to self.img_size)
+            timings: Optional dict filled with this call's stage timings; unlike
+                last_timings it is safe when several threads share the detector
             
         Returns:
             detections: List of detection results
             annotated_frame: Frame with bounding boxes
         """
-        # Convert to RGB for YOLOv5
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        stages = {}
+        results = self.predict(frame, img_size, stages)
+        (t0, t1), (_, t2) = stages['preprocess'], stages['inference']
         
-        # Run inference
-        results = self.model(rgb_frame, size=640)
+        # Class mapping counts as postprocessing
+        detections = self._to_detections(results)
+        t3 = time.perf_counter()
         
-        # Convert results to detections list
-        detections = []
+        annotated_frame = self.draw(frame.copy() if copy else frame, detections)
+        t4 = time.perf_counter()
+        
+        # Stage timings of the last call, picked up by the frame tracer
+        self.last_timings = {'preprocess': (t0, t1), 'inference': (t1, t2), 'postprocess': (t2, t3), 'draw': (t3, t4)}
+        if timings is not None:
+            timings.update(self.last_timings)
         
-        # Get detection pandas dataframe
-        df = results.pandas().xyxy[0]
+        metrics.INFERENCES.inc()
+        metrics.PREPROCESS.observe(t1 - t0)
+        metrics.INFERENCE.observe(t2 - t1)
+        metrics.POSTPROCESS.observe(t3 - t2)
+        metrics.DRAW.observe(t4 - t3)
         
-        for _, row in df.iterrows():
-            # Map to trash if this is general COCO dataset
-            name = row['name']
-            class_id = row['class']
+        return detections, annotated_frame
+    
+    def detect_batch(self, frames, img_size=None):
+        """
+        Detect garbage in several frames with one forward pass per input shape
+        
+        Frames that letterbox to the same input shape (typically all images
+        from one device) are stacked into a single batch. Nothing is drawn.
+        
+        Args:
+            frames: List of OpenCV images (BGR format)
+            img_size: Inference size (defaults to self.img_size)
             
-            # Map COCO classes to trash categories (for pre-trained model)
-            if name in ['bottle', 'cup', 'wine glass', 'fork', 'knife', 'spoon', 
-                       'bowl', 'banana', 'apple', 'sandwich', 'orange', 'paper', 
-                       'book', 'clock', 'vase', 'scissors', 'teddy bear', 
-                       'toothbrush', 'laptop', 'cell phone']:
-                name = 'trash'
+        Returns:
+            List of detection lists, one per frame
+        """
+        groups = {}
+        for index, frame in enumerate(frames):
+            tensor, meta = self.preprocessor(frame, img_size or self.img_size)
+            # The preprocessor reuses its buffer for same-shaped frames
+            groups.setdefault(tuple(tensor.shape), []).append((index, tensor.clone(), meta))
+        
+        results = [None] * len(frames)
+        for group in groups.values():
+            start = time.perf_counter()
+            with torch.no_grad():
+                prediction = raw_prediction(self.model(torch.cat([tensor for _, tensor, _ in group])))
+            end = time.perf_counter()
+            metrics.INFERENCE.observe((end - start) / len(group))
+            outputs = non_max_suppression(prediction, self.conf_threshold, getattr(self.model, 'iou', 0.45))
+            for (index, _, meta), output in zip(group, outputs):
+                results[index] = self._to_detections(scale_boxes(output, meta).cpu().numpy())
+            metrics.INFERENCES.inc(len(group))
+        return results
+    
+    def _to_detections(self, results):
+        """Turn [x1, y1, x2, y2, confidence, class_id] rows into detection dictionaries"""
+        classes = self._classes()
+        detections = []
+        
+        for x1, y1, x2, y2, confidence, class_id in results:
+            class_id = int(class_id)
+            name, counter = classes[class_id]
             
             detection = {
                 'class': class_id,
                 'name': name,
-                'confidence': row['confidence'],
-                'bbox': [row['xmin'], row['ymin'], row['xmax'], row['ymax']]
+                'confidence': float(confidence),
+                'bbox': [float(x1), float(y1), float(x2), float(y2)]
             }
             detections.append(detection)
+            counter.inc()
         
+        return detections
+    
+    def _classes(self):
+        """
+        Reported name and detection counter of every class id
+
+        COCO classes are mapped to trash (for the pre-trained model). Built on
+        first use, so the metric children are not looked up per detection.
+        """
+        classes = getattr(self, '_class_table', None)
+        if classes is None:
+            names = self.class_names
+            classes = {}
+            for class_id, name in (names.items() if isinstance(names, dict) else enumerate(names)):
+                name = 'trash' if name in COCO_TRASH else name
+                classes[int(class_id)] = (name, metrics.DETECTIONS.labels(name=name))
+            self._class_table = classes
+        return classes
+    
+    def draw(self, frame, detections):
+        """Draw detections on a frame in place and return it"""
         # Render the detections on the frame with different colors for trash
-        annotated_frame = frame.copy()
+        annotated_frame = frame
         for detection in detections:
             x1, y1, x2, y2 = [int(coord) for coord in detection['bbox']]
             
             # Use red color for trash items
-            if detection['name'] == 'trash':
+            if detection['name'] in ('trash', 'garbage'):
                 color = (0, 0, 255)  # Red for trash
             else:
                 color = (0, 255, 0)  # Green for others
             
             # Draw bounding box
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            renderer.box(annotated_frame, (x1, y1, x2, y2), color, 2)
             
-            # Add label
+            # Add label (cached sprite)
             label = f"{detection['name']}: {detection['confidence']:.2f}"
-            cv2.putText(annotated_frame, label, (x1, y1 - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            renderer.text(annotated_frame, label, (x1, y1 - 10), color, 0.5, 2)
         
-        return detections, annotated_frame
+        return annotated_frame
     
     def is_garbage_detected(self, detections):
         """
@@ -168,16 +278,29 @@ class GarbageDetector:
         Returns:
             bool: True if garbage is detected
         """
-        for detection in detections:
-            # Check for trash or garbage-related classes
-            if detection['name'] == 'trash' and detection['confidence'] >= self.conf_threshold:
-                return True
-            
-            # For pre-trained COCO model, check additional classes that often represent garbage
-            if detection['name'] in ['bottle', 'cup', 'wine glass', 'book', 'cell phone', 'laptop', 'vase'] and detection['confidence'] >= self.conf_threshold:
-                return True
+        return contains_garbage(detections, self.conf_threshold)
+
+def contains_garbage(detections, conf_threshold=0.0):
+    """
+    Check if detection dictionaries (from any detector backend) include garbage
+    
+    Args:
+        detections: List of detection results
+        conf_threshold: Minimum confidence that counts
         
-        return False
+    Returns:
+        bool: True if garbage is detected
+    """
+    for detection in detections:
+        # Check for trash or garbage-related classes
+        if detection['name'] in ('trash', 'garbage') and detection['confidence'] >= conf_threshold:
+            return True
+        
+        # For pre-trained COCO model, check additional classes that often represent garbage
+        if detection['name'] in ['bottle', 'cup', 'wine glass', 'book', 'cell phone', 'laptop', 'vase'] and detection['confidence'] >= conf_threshold:
+            return True
+    
+    return False
 
 # Helper function to convert detections to a simplified format
 def format_detections(detections):
@@ -205,7 +328,7 @@ def save_detection_image(frame, filename=None):
     Save a detection image to disk
     
     Args:
-        frame: OpenCV image
+        frame: OpenCV image, or JPEG bytes that are written as they are
         filename: Optional filename, otherwise uses timestamp
         
     Returns:
@@ -219,6 +342,10 @@ def save_detection_image(frame, filename=None):
     os.makedirs(save_dir, exist_ok=True)
     
     save_path = os.path.join(save_dir, filename)
-    cv2.imwrite(save_path, frame)
+    if isinstance(frame, bytes):
+        with open(save_path, 'wb') as f:
+            f.write(frame)
+    else:
+        cv2.imwrite(save_path, frame)
     
     return save_path 
@@ -4,15 +4,34 @@ import torch
 import numpy as np
 import argparse
 import time
+import atexit
 from pathlib import Path
+import frame_trace
+import inference_service
+import frame_sources
+from overlay import renderer
+from cascade import CascadeDetector, wrap_detector
+from governor import Governor
+from snapshot_writer import SnapshotWriter
+from preprocess import LetterboxPreprocessor, non_max_suppression, raw_prediction, scale_boxes
 
 # YOLOv5 confidence threshold for detection
 CONFIDENCE_THRESHOLD = 0.30
 
+# Class names that count as garbage (the GarbageDataSet model has a single 'garbage' class)
+GARBAGE_CLASS_NAMES = ('garbage', 'trash', 'litter', 'waste')
+
+def is_garbage_class(class_name):
+    """Check if a class name denotes garbage"""
+    name = class_name.lower()
+    return any(garbage in name for garbage in GARBAGE_CLASS_NAMES)
+
 class GarbageDetector:
-    def __init__(self, model_path='model/best.pt', conf_threshold=CONFIDENCE_THRESHOLD):
+    def __init__(self, model_path='model/best.pt', conf_threshold=CONFIDENCE_THRESHOLD, img_size=640):
         """Initialize garbage detector"""
         self.conf_threshold = conf_threshold
+        self.img_size = img_size
+        self.preprocessor = LetterboxPreprocessor()
         
         # Check if model exists
         if not os.path.exists(model_path):
@@ -56,25 +75,24 @@ class GarbageDetector:
         self.class_names = self.model.names
         print(f"Detected classes: {self.class_names}")
     
-    def detect(self, frame):
+    def detect(self, frame, copy=True, img_size=None):
         """
         Detect objects in a frame
         
         Args:
             frame: OpenCV BGR image
+            copy: Annotate a copy; pass False to draw on the frame itself when the caller owns it
+            img_size: Inference size for this frame (defaults to self.img_size)
             
         Returns:
             detections: List of detection results
             annotated_frame: Frame with bounding boxes
         """
-        # Run inference
-        results = self.model(frame)
-        
-        # Process results
-        detections = results.xyxy[0].cpu().numpy()  # Get detections as numpy array
+        detections = self.predict(frame, img_size)
+        t2 = time.perf_counter()
         
         # Create annotated frame
-        annotated_frame = frame.copy()
+        annotated_frame = frame.copy() if copy else frame
         
         # Draw detections
         for detection in detections:
@@ -92,25 +110,54 @@ class GarbageDetector:
             class_name = self.class_names[cls_id]
             
             # Select color based on class
-            if 'trash' in class_name.lower() or cls_id == 1:
+            if is_garbage_class(class_name):
                 color = (0, 0, 255)  # Red for trash
-            elif 'bin' in class_name.lower() or cls_id == 0:
+            elif 'bin' in class_name.lower():
                 color = (0, 255, 0)  # Green for bins
             else:
                 color = (255, 255, 0)  # Yellow for others
             
             # Draw rectangle
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            renderer.box(annotated_frame, (x1, y1, x2, y2), color, 2)
             
-            # Add label
-            label = f"{class_name}: {conf:.2f}"
-            text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(annotated_frame, (x1, y1-25), (x1+text_size[0], y1), color, -1)
-            cv2.putText(annotated_frame, label, (x1, y1-5), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+            # Add label (cached sprite)
+            renderer.label(annotated_frame, f"{class_name}: {conf:.2f}", (x1, y1), color, box_height=25)
+        
+        self.last_timings['draw'] = (t2, time.perf_counter())
         
         return detections, annotated_frame
     
+    def predict(self, frame, img_size=None):
+        """
+        Run the model on a frame without drawing
+        
+        Args:
+            frame: OpenCV BGR image
+            img_size: Inference size for this frame (defaults to self.img_size)
+            
+        Returns:
+            numpy array of [x1, y1, x2, y2, confidence, class_id] rows
+        """
+        t0 = time.perf_counter()
+        
+        # Letterbox into a reused RGB input tensor
+        tensor, meta = self.preprocessor(frame, img_size or self.img_size)
+        t_pre = time.perf_counter()
+        
+        # Run inference
+        with torch.no_grad():
+            prediction = raw_prediction(self.model(tensor))
+        t1 = time.perf_counter()
+        
+        # Process results
+        detections = non_max_suppression(prediction, self.conf_threshold, self.model.iou)[0]
+        detections = scale_boxes(detections, meta).cpu().numpy()  # Get detections as numpy array
+        
+        # Stage timings of the last call, picked up by the frame tracer
+        self.last_timings = {'preprocess': (t0, t_pre), 'inference': (t_pre, t1), 'postprocess': (t1, time.perf_counter())}
+        
+        return detections
+    
     def is_garbage_detected(self, detections):
         """Check if any garbage is detected"""
         for det in detections:
@@ -119,13 +166,40 @@ class GarbageDetector:
             cls_name = self.class_names[cls_id]
             
             # Check if class is trash/garbage
-            if 'trash' in cls_name.lower() or cls_id == 1:
+            if is_garbage_class(cls_name):
                 if conf >= self.conf_threshold:
                     return True
         
         return False
 
-def process_image(image_path, output_path=None, conf_threshold=CONFIDENCE_THRESHOLD):
+class DaemonDetector(inference_service.ServiceDetector, GarbageDetector):
+    """GarbageDetector whose model runs in the shared inference service (see inference_service.py)"""
+
+# Detectors by (conf_threshold, daemon address), so repeated calls in one process load the model once
+_detectors = {}
+
+def get_detector(conf_threshold=CONFIDENCE_THRESHOLD, daemon=None):
+    """Shared GarbageDetector, or DaemonDetector when an inference service address is given"""
+    key = (conf_threshold, daemon)
+    if key not in _detectors:
+        if daemon:
+            detector = DaemonDetector(daemon, conf_threshold=conf_threshold)
+            atexit.register(detector.close)
+        else:
+            detector = GarbageDetector(conf_threshold=conf_threshold)
+        _detectors[key] = detector
+    return _detectors[key]
+
+def print_cascade_stats(detector):
+    """Print how many frames the presence classifier spared the detector"""
+    if not isinstance(detector, CascadeDetector):
+        return
+    stats = detector.stats()
+    print(f"Cascade skipped {stats['skipped']}/{stats['frames']} frames ({stats['skip_rate']*100:.1f}%), "
+          f"pass precision {stats['pass_precision']:.2f}, "
+          f"missed {stats['misses']}/{stats['audited']} audited skips")
+
+def process_image(image_path, output_path=None, conf_threshold=CONFIDENCE_THRESHOLD, daemon=None):
     """Process a single image for garbage detection"""
     # Load image
     img = cv2.imread(image_path)
@@ -133,8 +207,8 @@ def process_image(image_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
         print(f"Error: Could not load image from {image_path}")
         return
     
-    # Create detector
-    detector = GarbageDetector(conf_threshold=conf_threshold)
+    # Create detector (loaded once per process, or kept warm by the daemon)
+    detector = get_detector(conf_threshold, daemon)
     
     # Detect objects
     start_time = time.time()
@@ -159,8 +233,9 @@ def process_image(image_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
         cv2.waitKey(0)
         cv2.destroyAllWindows()
 
-def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESHOLD):
-    """Process a video for garbage detection"""
+def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESHOLD, trace_path=None,
+                  cascade_path=None, cascade_threshold=None, daemon=None):
+    """Process a video for garbage detection, optionally recording a frame trace"""
     # Open video
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
@@ -174,7 +249,8 @@ def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
     # Create detector
-    detector = GarbageDetector(conf_threshold=conf_threshold)
+    detector = get_detector(conf_threshold, daemon)
+    detector = wrap_detector(detector, cascade_path, cascade_threshold)
     
     # Setup video writer if needed
     writer = None
@@ -187,26 +263,36 @@ def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
     frame_count = 0
     garbage_frames = 0
     start_time = time.time()
+    tracer = frame_trace.open_recorder(trace_path)
     
     while True:
+        capture_start = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
             break
+        tracer.start_frame(capture_start)
+        tracer.span(frame_trace.CAPTURE, capture_start, time.perf_counter())
         
         frame_count += 1
         
         # Process every 3rd frame to improve performance
-        if frame_count % 3 == 0 or frame_count == 1:
+        detected = frame_count % 3 == 0 or frame_count == 1
+        is_garbage = False
+        if detected:
             # Detect objects
-            detections, annotated_frame = detector.detect(frame)
+            detections, annotated_frame = detector.detect(frame, copy=False)
+            tracer.spans(detector.last_timings)
             
             # Check for garbage
-            if detector.is_garbage_detected(detections):
+            is_garbage = detector.is_garbage_detected(detections)
+            if is_garbage:
                 garbage_frames += 1
         else:
             # Skip detection, use previous frame
             annotated_frame = frame
         
+        output_start = time.perf_counter()
+        
         # Write or display frame
         if writer:
             writer.write(annotated_frame)
@@ -220,6 +306,8 @@ def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
         # Display frame
         cv2.imshow("Garbage Detection", annotated_frame)
         key = cv2.waitKey(1) & 0xFF
+        tracer.span(frame_trace.OUTPUT, output_start, time.perf_counter())
+        tracer.end_frame(detection=detected, garbage=is_garbage)
         if key == 27:  # ESC
             break
     
@@ -228,6 +316,7 @@ def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
     if writer:
         writer.release()
     cv2.destroyAllWindows()
+    tracer.close()
     
     # Print results
     processing_time = time.time() - start_time
@@ -237,28 +326,38 @@ def process_video(video_path, output_path=None, conf_threshold=CONFIDENCE_THRESH
     print(f"Average FPS: {fps:.2f}")
     print(f"Garbage detected in {garbage_frames}/{frame_count} frames "
           f"({garbage_frames/frame_count*100:.2f}%)")
+    print_cascade_stats(detector)
 
-def process_camera(camera_id=0, output_path=None, conf_threshold=CONFIDENCE_THRESHOLD):
-    """Process live camera feed for garbage detection"""
-    # Open camera
-    cap = cv2.VideoCapture(camera_id)
-    if not cap.isOpened():
-        print(f"Error: Could not open camera {camera_id}")
+def process_camera(camera_id=0, output_path=None, conf_threshold=CONFIDENCE_THRESHOLD, trace_path=None,
+                   cascade_path=None, cascade_threshold=None, record_path=None, latency_budget=None, daemon=None):
+    """
+    Process a live source (camera, stream, image directory or replay), optionally recording a frame trace
+
+    With latency_budget (seconds per detection), a Governor lowers the input
+    size and detection rate when detection can't keep up. With daemon (an
+    inference service address), detection runs in the shared service.
+    """
+    # Open camera on a reader thread that reconnects with backoff if it drops
+    cap = frame_sources.open_stream(camera_id, record_path, resolution=(1280, 720))
+    if not cap.wait_connected():
+        print(f"Error: Could not open camera {camera_id}: {cap.last_error}")
+        cap.release()
         return
     
-    # Set camera properties
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-    
     # Get actual properties
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    _, _, first_frame = cap.latest()
+    height, width = first_frame.shape[:2]
+    fps = cap.fps or 30.0
     
     print(f"Camera initialized: {width}x{height}@{fps:.1f}fps")
     
     # Create detector
-    detector = GarbageDetector(conf_threshold=conf_threshold)
+    detector = get_detector(conf_threshold, daemon)
+    detector = wrap_detector(detector, cascade_path, cascade_threshold)
+    # Process every 3rd frame to improve performance, fewer under load
+    governor = Governor(camera_id, budget=latency_budget, img_size=detector.img_size, base_interval=3)
+    # 's' captures are written in the background so the preview doesn't stall
+    snapshots = SnapshotWriter('.', min_interval=0, quota_bytes=None, prefixes=('capture_',))
     
     # Setup video writer if needed
     writer = None
@@ -273,19 +372,28 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=CONFIDENCE_THRE
     garbage_detected = False
     start_time = time.time()
     last_detection_time = None
+    tracer = frame_trace.open_recorder(trace_path)
     
     while True:
+        capture_start = time.perf_counter()
         ret, frame = cap.read()
         if not ret:
-            print("Error reading from camera")
-            break
+            if not cap.isOpened():
+                break
+            print("Waiting for camera to reconnect...")
+            continue
+        tracer.start_frame(capture_start)
+        tracer.span(frame_trace.CAPTURE, capture_start, time.perf_counter())
         
         frame_count += 1
         
-        # Process every 3rd frame to improve performance
-        if frame_count % 3 == 0 or frame_count == 1:
+        detected = governor.should_detect(frame_count) or frame_count == 1
+        if detected:
             # Detect objects
-            detections, annotated_frame = detector.detect(frame)
+            detect_start = time.perf_counter()
+            detections, annotated_frame = detector.detect(frame, copy=False, img_size=governor.img_size)
+            governor.observe(time.perf_counter() - detect_start)
+            tracer.spans(detector.last_timings)
             
             # Check for garbage
             new_garbage_detected = detector.is_garbage_detected(detections)
@@ -303,24 +411,26 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=CONFIDENCE_THRE
             # Skip detection, use previous frame
             annotated_frame = frame
         
+        draw_start = time.perf_counter()
+        
         # Add status info to frame
         status = "Garbage Detected" if garbage_detected else "No Garbage"
         status_color = (0, 0, 255) if garbage_detected else (0, 255, 0)
         
-        # Add timestamp
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        cv2.putText(annotated_frame, timestamp, (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        # Add timestamp (re-rendered once per second)
+        renderer.timestamp(annotated_frame, (10, 30), (255, 255, 255))
         
         # Add status
-        cv2.putText(annotated_frame, status, (10, 70), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
+        renderer.text(annotated_frame, status, (10, 70), status_color)
         
-        # Add FPS
+        # Add FPS (changes every frame, so not worth caching)
         current_fps = frame_count / (time.time() - start_time)
         cv2.putText(annotated_frame, f"FPS: {current_fps:.1f}", (10, 110), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
+        output_start = time.perf_counter()
+        tracer.span(frame_trace.DRAW, draw_start, output_start)
+        
         # Write frame if requested
         if writer:
             writer.write(annotated_frame)
@@ -328,18 +438,23 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=CONFIDENCE_THRE
         # Display frame
         cv2.imshow("Garbage Detection", annotated_frame)
         key = cv2.waitKey(1) & 0xFF
+        tracer.span(frame_trace.OUTPUT, output_start, time.perf_counter())
+        tracer.end_frame(detection=detected, garbage=garbage_detected)
         if key == 27:  # ESC
             break
         elif key == ord('s'):  # Save image
-            img_name = f"capture_{time.strftime('%Y%m%d_%H%M%S')}.jpg"
-            cv2.imwrite(img_name, annotated_frame)
-            print(f"Saved {img_name}")
+            img_name = snapshots.submit(annotated_frame, camera_id,
+                                        f"capture_{time.strftime('%Y%m%d_%H%M%S')}_{frame_count}.jpg")
+            if img_name:
+                print(f"Saving {img_name}")
     
     # Clean up
     cap.release()
+    snapshots.close()
     if writer:
         writer.release()
     cv2.destroyAllWindows()
+    tracer.close()
     
     # Print results
     processing_time = time.time() - start_time
@@ -349,6 +464,16 @@ def process_camera(camera_id=0, output_path=None, conf_threshold=CONFIDENCE_THRE
     print(f"Average FPS: {fps:.2f}")
     print(f"Garbage detected in {garbage_frames}/{frame_count} frames "
           f"({garbage_frames/frame_count*100:.2f}%)")
+    print_cascade_stats(detector)
+    if latency_budget:
+        status = governor.status()
+        print(f"Governor: ended at {status['img_size']}px every {status['interval']} frames, "
+              f"{status['adjustments']['down']} downgrade(s), {status['adjustments']['up']} upgrade(s)")
+
+def is_live_source(source):
+    """Whether a --source is read as a live stream (camera, URL, image directory or .frames replay)"""
+    return (source.isdigit() or source.lower().startswith(frame_sources.STREAM_PREFIXES)
+            or source.endswith(frame_sources.REPLAY_EXTENSION) or os.path.isdir(source))
 
 def main():
     """Main function"""
@@ -360,24 +485,43 @@ def main():
                        help='Output path for results (optional)')
     parser.add_argument('--conf', type=float, default=CONFIDENCE_THRESHOLD,
                        help='Confidence threshold')
+    parser.add_argument('--trace', type=str, default=None,
+                       help='Record per-frame stage timings to this trace file (see frame_trace.py)')
+    parser.add_argument('--cascade', type=str, default=None,
+                       help='Presence classifier that gates detection on video/camera (see cascade.py)')
+    parser.add_argument('--cascade-threshold', type=float, default=None,
+                       help='Override the classifier threshold chosen at training time')
+    parser.add_argument('--record', type=str, default=None,
+                       help='Record live frames to a .frames file for replay (see frame_sources.py)')
+    parser.add_argument('--latency-budget', type=float, default=None,
+                       help='Detection latency budget in ms on live sources; lowers size and rate under load (see governor.py)')
+    parser.add_argument('--daemon', type=str, nargs='?', const=inference_service.DEFAULT_ADDRESS, default=None,
+                       help='Detect in the shared inference service at this address, starting it if needed, '
+                            'so repeated runs skip loading the model (see inference_service.py)')
     args = parser.parse_args()
     
     # Determine source type
-    if args.source.isdigit():
-        # Camera
-        print(f"Processing camera feed from camera {args.source}")
-        process_camera(int(args.source), args.output, args.conf)
+    if is_live_source(args.source):
+        # Camera, network stream, image directory or recorded replay
+        camera_id = int(args.source) if args.source.isdigit() else args.source
+        print(f"Processing live source {camera_id}")
+        process_camera(camera_id, args.output, args.conf, trace_path=args.trace,
+                       cascade_path=args.cascade, cascade_threshold=args.cascade_threshold,
+                       record_path=args.record,
+                       latency_budget=args.latency_budget / 1000.0 if args.latency_budget else None,
+                       daemon=args.daemon)
     elif os.path.isfile(args.source):
         # Check file type
         ext = os.path.splitext(args.source)[1].lower()
         if ext in ['.jpg', '.jpeg', '.png', '.bmp']:
             # Image
             print(f"Processing image: {args.source}")
-            process_image(args.source, args.output, args.conf)
+            process_image(args.source, args.output, args.conf, daemon=args.daemon)
         elif ext in ['.mp4', '.avi', '.mov', '.mkv']:
             # Video
             print(f"Processing video: {args.source}")
-            process_video(args.source, args.output, args.conf)
+            process_video(args.source, args.output, args.conf, trace_path=args.trace,
+                          cascade_path=args.cascade, cascade_threshold=args.cascade_threshold, daemon=args.daemon)
         else:
             print(f"Unsupported file type: {ext}")
     else:
@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+# Headless edge agent: detects on site and ships compact detection events to the central app
+
+import os
+import json
+import gzip
+import time
+import uuid
+import base64
+import socket
+import argparse
+import threading
+import urllib.request
+import urllib.error
+
+import cv2
+
+import metrics
+import frame_sources
+import inference_service
+from governor import Governor
+from detection import GarbageDetector, contains_garbage, format_detections
+from ingest import ServiceDetector, serve_metrics
+
+DEFAULT_SPOOL = 'edge_spool'
+DEFAULT_SPOOL_BYTES = 200 * 1024 * 1024
+
+# Events are sent in batches of this many, or after this many seconds
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_BATCH_INTERVAL = 5.0
+
+# While garbage stays in view, a camera repeats its event at most this often,
+# and it reports it cleared once none has been seen for CLEAR_AFTER seconds
+DEFAULT_EVENT_INTERVAL = 30.0
+CLEAR_AFTER = 10.0
+
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_QUALITY = 70
+
+# Resend backoff while the server is unreachable
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 60.0
+SEND_TIMEOUT = 15.0
+
+EVENTS_PATH = '/api/edge/events'
+
+# Spool file holding the run id and last sequence number
+STATE_FILE = 'state.json'
+
+
+def make_thumbnail(frame, width=THUMBNAIL_WIDTH, quality=THUMBNAIL_QUALITY):
+    """Small JPEG of a frame, base64 encoded for the event body"""
+    height = int(frame.shape[0] * width / frame.shape[1])
+    if frame.shape[1] > width:
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None
+    return base64.b64encode(buffer.tobytes()).decode('ascii')
+
+
+class EventSpool:
+    """
+    On-disk queue of gzipped event batches, sent oldest first
+
+    Each batch is one file named after its sequence number, written to a
+    temporary name, fsynced and renamed, so it survives a crash or power
+    loss and is resent after a restart. Beyond max_bytes the oldest batches
+    are dropped.
+
+    The last sequence number is kept in state.json together with a run id.
+    The server only treats a resent sequence as a duplicate within one run, so
+    a spool that loses its state starts a new run instead of having its
+    batches acknowledged and discarded unapplied.
+    """
+
+    def __init__(self, directory=DEFAULT_SPOOL, max_bytes=DEFAULT_SPOOL_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.files = sorted(name for name in os.listdir(directory) if name.endswith('.json.gz'))
+        self.bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in self.files)
+        self.epoch, last_sequence = self._load_state()
+        self.last_sequence = max(last_sequence, int(self.files[-1].split('.')[0]) if self.files else 0)
+        metrics.EDGE_SPOOL_BYTES.set(self.bytes)
+
+    def _load_state(self):
+        try:
+            with open(os.path.join(self.directory, STATE_FILE)) as f:
+                state = json.load(f)
+            return str(state['epoch']), int(state['sequence'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return uuid.uuid4().hex, 0
+
+    def _save_state(self):
+        path = os.path.join(self.directory, STATE_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'epoch': self.epoch, 'sequence': self.last_sequence}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def next_sequence(self):
+        # Stored before the batch is, so a restart never hands out a sequence twice
+        with self._lock:
+            self.last_sequence += 1
+            self._save_state()
+            return self.last_sequence
+
+    def new_epoch(self):
+        """Start a new run, whose sequences the server tracks apart from earlier ones"""
+        with self._lock:
+            self.epoch = uuid.uuid4().hex
+            self._save_state()
+
+    def append(self, body, sequence):
+        """Store an encoded batch; returns its file name"""
+        name = f"{sequence:016d}.json.gz"
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            self.files.append(name)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes and len(self.files) > 1:
+                self._remove(self.files[0])
+                self.dropped += 1
+                metrics.EDGE_BATCHES.labels(outcome='dropped').inc()
+                print(f"Edge spool over {self.max_bytes} bytes; dropped the oldest batch")
+            metrics.EDGE_SPOOL_BYTES.set(self.bytes)
+        return name
+
+    def oldest(self):
+        """(name, body) of the oldest batch, or None if the spool is empty"""
+        with self._lock:
+            if not self.files:
+                return None
+            name = self.files[0]
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return name, f.read()
+
+    def remove(self, name):
+        with self._lock:
+            if self.files and self.files[0] == name:
+                self._remove(name)
+            metrics.EDGE_SPOOL_BYTES.set(self.bytes)
+
+    def _remove(self, name):
+        path = os.path.join(self.directory, name)
+        self.files.remove(name)
+        try:
+            self.bytes -= os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return len(self.files)
+
+
+class EdgeShipper:
+    """
+    Batches detection events and delivers them to the central app in order
+
+    Events are collected in memory and written to the spool as one gzipped
+    batch when batch_size is reached or batch_interval has passed. A
+    background task posts the oldest spooled batch and deletes it once the
+    server accepts it; while the server is unreachable it retries the same
+    batch with exponential backoff, so batches arrive in the order they were
+    made. A batch the server rejects as malformed is dropped rather than
+    blocking the rest.
+
+    Args:
+        server: Base URL of the central app, e.g. http://central:5000
+        agent_id: Name of this agent in alerts
+        spool: EventSpool batches wait in
+        batch_size, batch_interval: When the pending events are spooled
+        location: Default location given to this agent's alerts
+        token: Shared secret checked by the app (CLEANSIGHT_EDGE_TOKEN)
+        spawn, sleep: As for SnapshotWriter, to run the sender as another kind of task
+    """
+
+    def __init__(self, server, agent_id, spool, batch_size=DEFAULT_BATCH_SIZE, batch_interval=DEFAULT_BATCH_INTERVAL,
+                 location=None, token=None, spawn=None, sleep=time.sleep, clock=time.monotonic):
+        self.url = server.rstrip('/') + EVENTS_PATH
+        self.agent_id = agent_id
+        self.spool = spool
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.location = location
+        self.token = token
+        self.spawn = spawn or self._spawn_thread
+        self.sleep = sleep
+        self.clock = clock
+
+        self.pending = []
+        self.counts = {'events': 0, 'sent': 0, 'failed': 0, 'rejected': 0}
+        self.online = None
+        self.running = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_spool = clock()
+
+    @staticmethod
+    def _spawn_thread(fn):
+        thread = threading.Thread(target=fn, daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.spawn(self._sender_loop)
+        return self
+
+    def add(self, event):
+        """Queue an event; it is spooled with the next batch"""
+        with self._lock:
+            self.pending.append(event)
+            self.counts['events'] += 1
+            full = len(self.pending) >= self.batch_size
+        metrics.EDGE_EVENTS.labels(kind=event['type']).inc()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Spool the pending events as one batch"""
+        with self._lock:
+            events, self.pending = self.pending, []
+            self._last_spool = self.clock()
+        if not events:
+            return None
+        # Cameras flush from their own threads; batches must reach the spool in sequence order
+        with self._flush_lock:
+            sequence = self.spool.next_sequence()
+            batch = {'agent': self.agent_id, 'batch': sequence, 'location': self.location, 'events': events}
+            name = self.spool.append(gzip.compress(json.dumps(batch).encode(), compresslevel=6), sequence)
+        self._wake.set()
+        return name
+
+    def tick(self):
+        """Spool a partial batch once batch_interval has passed"""
+        if self.pending and self.clock() - self._last_spool >= self.batch_interval:
+            self.flush()
+
+    def send(self, body, resync=True):
+        """
+        Post one spooled batch
+
+        Returns:
+            True when the server accepted it, False to retry later, None if it was rejected for good
+        """
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip', 'X-Edge-Epoch': self.spool.epoch}
+        if self.token:
+            headers['X-Edge-Token'] = self.token
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=SEND_TIMEOUT) as response:
+                response.read()
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code in (400, 413):
+                print(f"Server rejected an event batch ({e.code}); dropping it")
+                return None
+            if e.code == 409 and resync:
+                # The server has applied later batches of this run than we hold;
+                # a new run makes it take this one rather than count it as done
+                print("Server is ahead of this spool's sequence; starting a new run")
+                self.spool.new_epoch()
+                return self.send(body, resync=False)
+            print(f"Server returned {e.code} for an event batch; will retry")
+        except (urllib.error.URLError, OSError) as e:
+            if self.online is not False:
+                print(f"Central server unreachable ({e}); spooling events to {self.spool.directory}")
+        return False
+
+    def _sender_loop(self):
+        backoff = BACKOFF_INITIAL
+        while self.running or len(self.spool):
+            entry = self.spool.oldest()
+            if entry is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            name, body = entry
+            result = self.send(body)
+            if result is False:
+                self.online = False
+                self.counts['failed'] += 1
+                metrics.EDGE_BATCHES.labels(outcome='failed').inc()
+                if not self.running:
+                    break
+                self.sleep(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+                continue
+            if self.online is False:
+                print(f"Central server reachable again; resending {len(self.spool)} spooled batches")
+            self.online = True
+            backoff = BACKOFF_INITIAL
+            outcome = 'sent' if result else 'rejected'
+            self.counts[outcome] += 1
+            metrics.EDGE_BATCHES.labels(outcome=outcome).inc()
+            self.spool.remove(name)
+
+    def close(self, timeout=5.0):
+        """Spool what is pending and give the sender up to timeout seconds to deliver it"""
+        self.flush()
+        deadline = self.clock() + timeout
+        while len(self.spool) and self.online is not False and self.clock() < deadline:
+            self.sleep(0.1)
+        self.running = False
+        self._wake.set()
+        if len(self.spool):
+            print(f"{len(self.spool)} event batches left in {self.spool.directory}; they are sent on the next start")
+
+    def status(self):
+        return {
+            'server': self.url,
+            'online': self.online,
+            'pending': len(self.pending),
+            'spooled': len(self.spool),
+            'spool_bytes': self.spool.bytes,
+            'counts': dict(self.counts, dropped=self.spool.dropped),
+        }
+
+
+class CameraWatch:
+    """
+    Detection loop of one camera, reduced to events
+
+    Built from detect.process_camera: frames are read through a reconnecting
+    ThreadedReader that only decodes as many frames as are detected, and the
+    Governor shrinks the input size when detections fall behind. Nothing is
+    displayed or streamed; garbage produces an event with an annotated
+    thumbnail, repeated at most every event_interval while it stays in view,
+    and a 'cleared' event once it has been gone for CLEAR_AFTER seconds.
+    """
+
+    def __init__(self, name, spec, detector, detector_lock, shipper, detect_interval=1.0, img_size=640,
+                 latency_budget=None, event_interval=DEFAULT_EVENT_INTERVAL, thumbnail_width=THUMBNAIL_WIDTH):
+        self.name = name
+        self.spec = spec
+        self.detector = detector
+        self.detector_lock = detector_lock
+        self.shipper = shipper
+        self.detect_interval = detect_interval
+        self.event_interval = event_interval
+        self.thumbnail_width = thumbnail_width
+        self.governor = Governor(name, budget=latency_budget, img_size=img_size, base_interval=1)
+        self.running = False
+        self.garbage = False
+        self._last_event = None
+        self._last_seen = None
+
+    def start(self):
+        """Run on a background thread; running is set before it starts, so callers can poll it at once"""
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self):
+        cap = frame_sources.open_stream(self.spec)
+        scale = None
+        try:
+            while self.running:
+                if self.governor.interval_scale != scale:
+                    scale = self.governor.interval_scale
+                    cap.set_max_fps(1.0 / (self.detect_interval * scale))
+                ret, frame = cap.read()
+                if not ret:
+                    if not cap.isOpened():
+                        print(f"Camera {self.name} ended")
+                        break
+                    continue
+                self.process(frame)
+        finally:
+            self.running = False
+            cap.release()
+
+    def process(self, frame, now=None):
+        now = time.time() if now is None else now
+        start = time.perf_counter()
+        with self.detector_lock:
+            detections = self.detector.detect_batch([frame], self.governor.img_size)[0]
+        self.governor.observe(time.perf_counter() - start)
+
+        if contains_garbage(detections, self.detector.conf_threshold):
+            self._last_seen = now
+            if not self.garbage or now - self._last_event >= self.event_interval:
+                self.garbage = True
+                self._last_event = now
+                self.detector.draw(frame, detections)
+                self.shipper.add(self.event('garbage', now, detections, make_thumbnail(frame, self.thumbnail_width)))
+        elif self.garbage and now - self._last_seen >= CLEAR_AFTER:
+            self.garbage = False
+            self.shipper.add(self.event('cleared', now))
+
+    def event(self, kind, now, detections=None, thumbnail=None):
+        event = {
+            'type': kind,
+            'camera': self.name,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)),
+            'time': now,
+        }
+        if detections is not None:
+            event['detections'] = format_detections(detections)
+        if thumbnail:
+            event['thumbnail'] = thumbnail
+        return event
+
+    def stop(self):
+        self.running = False
+
+
+def parse_source(value, index):
+    """'name=spec' or just spec (named camN); URLs may contain '=' themselves"""
+    name, separator, spec = value.partition('=')
+    if separator and name and not any(c in name for c in ':/?'):
+        return name, spec
+    return f"cam{index}", value
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Detect garbage on site and send only detection events to the central app')
+    parser.add_argument('--server', type=str, required=True, help='Base URL of the central CleanSight app')
+    parser.add_argument('--source', type=str, action='append', required=True,
+                        help="Camera to watch, as 'name=spec' or spec (camera index, stream URL, video, "
+                             "image directory or .frames replay); may be repeated")
+    parser.add_argument('--agent-id', type=str, default=socket.gethostname(), help='Name of this agent in alerts')
+    parser.add_argument('--location', type=str, default=None, help='Location given to alerts from this agent')
+    parser.add_argument('--token', type=str, default=os.environ.get('CLEANSIGHT_EDGE_TOKEN'),
+                        help='Shared secret matching the app\'s CLEANSIGHT_EDGE_TOKEN')
+    parser.add_argument('--spool', type=str, default=DEFAULT_SPOOL, help='Directory events wait in while offline')
+    parser.add_argument('--spool-mb', type=float, default=DEFAULT_SPOOL_BYTES / (1024 * 1024),
+                        help='Spool size beyond which the oldest batches are dropped')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Events per batch')
+    parser.add_argument('--batch-interval', type=float, default=DEFAULT_BATCH_INTERVAL,
+                        help='Seconds before a partial batch is sent')
+    parser.add_argument('--event-interval', type=float, default=DEFAULT_EVENT_INTERVAL,
+                        help='Seconds between repeated events while garbage stays in view')
+    parser.add_argument('--detect-interval', type=float, default=1.0, help='Seconds between detections per camera')
+    parser.add_argument('--thumbnail-width', type=int, default=THUMBNAIL_WIDTH, help='Width of event thumbnails')
+    parser.add_argument('--model', type=str, default=inference_service.DEFAULT_MODEL, help='Path to the model weights')
+    parser.add_argument('--conf', type=float, default=0.35, help='Confidence threshold for detections')
+    parser.add_argument('--img-size', type=int, default=640, help='Inference size')
+    parser.add_argument('--latency-budget', type=float, default=None,
+                        help='Detection latency budget in ms; lowers size and rate under load (see governor.py)')
+    parser.add_argument('--daemon', type=str, nargs='?', const=inference_service.DEFAULT_ADDRESS, default=None,
+                        help='Detect in the shared inference service at this address (see inference_service.py)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if args.daemon:
+        detector = ServiceDetector(args.daemon, args.model, args.conf, args.img_size)
+    else:
+        detector = GarbageDetector(args.model, args.conf, args.img_size)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    spool = EventSpool(args.spool, int(args.spool_mb * 1024 * 1024))
+    if len(spool):
+        print(f"{len(spool)} event batches spooled from a previous run; resending them first")
+    shipper = EdgeShipper(args.server, args.agent_id, spool, args.batch_size, args.batch_interval,
+                          location=args.location, token=args.token).start()
+
+    detector_lock = threading.Lock()
+    watches = []
+    for index, value in enumerate(args.source):
+        name, spec = parse_source(value, index)
+        spec = int(spec) if spec.isdigit() else spec
+        watch = CameraWatch(name, spec, detector, detector_lock, shipper, args.detect_interval, args.img_size,
+                            args.latency_budget / 1000.0 if args.latency_budget else None,
+                            args.event_interval, args.thumbnail_width)
+        watch.start()
+        watches.append(watch)
+    print(f"Edge agent {args.agent_id} watching {len(watches)} cameras, sending to {args.server}")
+
+    try:
+        while any(watch.running for watch in watches):
+            shipper.tick()
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("Stopping edge agent")
+    finally:
+        for watch in watches:
+            watch.stop()
+        shipper.close()
+        if args.daemon:
+            detector.close()
+        status = shipper.status()
+        print(f"Events: {status['counts']['events']}, batches sent: {status['counts']['sent']}, "
+              f"spooled: {status['spooled']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# Detection accuracy metrics (precision, recall, mAP) shared by the sweep and evaluation tools
+
+import numpy as np
+
+# COCO IoU thresholds 0.50:0.05:0.95
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+# np.trapz was renamed in numpy 2
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+
+def box_iou(a, b):
+    """
+    Pairwise IoU between two sets of xyxy boxes
+
+    Args:
+        a: (N, 4) array
+        b: (M, 4) array
+
+    Returns:
+        (N, M) array
+    """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def yolo_to_xyxy(labels, width, height):
+    """
+    Convert normalized YOLO labels to pixel boxes
+
+    Args:
+        labels: (N, 5) array [class, cx, cy, w, h]
+
+    Returns:
+        (N, 5) array [x1, y1, x2, y2, class]
+    """
+    labels = np.asarray(labels, dtype=np.float64).reshape(-1, 5)
+    cx, cy = labels[:, 1] * width, labels[:, 2] * height
+    w, h = labels[:, 3] * width, labels[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2, labels[:, 0]], axis=1)
+
+
+def match_detections(detections, targets, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Mark each detection as a true positive at every IoU threshold
+
+    Detections are matched greedily in order of IoU to same-class targets,
+    each target matched at most once (YOLOv5/COCO style).
+
+    Args:
+        detections: (N, 6) array [x1, y1, x2, y2, confidence, class]
+        targets: (M, 5) array [x1, y1, x2, y2, class]
+
+    Returns:
+        (N, len(iou_thresholds)) boolean array
+    """
+    detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 5)
+    correct = np.zeros((len(detections), len(iou_thresholds)), dtype=bool)
+    if not len(detections) or not len(targets):
+        return correct
+
+    iou = box_iou(targets[:, :4], detections[:, :4])
+    same_class = targets[:, 4:5] == detections[:, 5]
+    for i, threshold in enumerate(iou_thresholds):
+        t, d = np.nonzero((iou >= threshold) & same_class)
+        if not len(t):
+            continue
+        order = np.argsort(-iou[t, d], kind='stable')
+        t, d = t[order], d[order]
+        _, first_d = np.unique(d, return_index=True)
+        t, d = t[first_d], d[first_d]
+        order = np.argsort(-iou[t, d], kind='stable')
+        t, d = t[order], d[order]
+        _, first_t = np.unique(t, return_index=True)
+        correct[d[first_t], i] = True
+    return correct
+
+
+def average_precision(recall, precision):
+    """Area under a precision-recall curve with COCO 101-point interpolation"""
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    return float(_trapezoid(np.interp(points, recall, precision), points))
+
+
+def summarize(correct, confidence, pred_classes, target_classes, conf_threshold=0.0):
+    """
+    Precision, recall and mAP over a dataset
+
+    Args:
+        correct: (N, T) true-positive matrix from match_detections, for all images
+        confidence: (N,) detection confidences
+        pred_classes: (N,) detection classes
+        target_classes: (M,) classes of every ground-truth box
+        conf_threshold: Detections below this confidence are ignored
+
+    Returns:
+        dict with precision, recall, f1, map50 and map (mAP@0.5:0.95), plus
+        per-class AP@0.5 and AP@0.5:0.95
+    """
+    correct = np.asarray(correct, dtype=bool).reshape(-1, len(IOU_THRESHOLDS))
+    confidence = np.asarray(confidence, dtype=np.float64)
+    pred_classes = np.asarray(pred_classes).astype(int)
+    target_classes = np.asarray(target_classes).astype(int)
+
+    keep = confidence >= conf_threshold
+    correct, confidence, pred_classes = correct[keep], confidence[keep], pred_classes[keep]
+    order = np.argsort(-confidence, kind='stable')
+    correct, confidence, pred_classes = correct[order], confidence[order], pred_classes[order]
+
+    classes = np.unique(np.concatenate([target_classes, pred_classes]))
+    per_class = {}
+    tp_total = fp_total = 0
+    for cls in classes:
+        is_class = pred_classes == cls
+        n_targets = int((target_classes == cls).sum())
+        tp = np.cumsum(correct[is_class], axis=0)
+        fp = np.cumsum(~correct[is_class], axis=0)
+        if n_targets == 0 or not is_class.any():
+            per_class[int(cls)] = {'ap50': 0.0, 'ap': 0.0, 'targets': n_targets}
+            fp_total += int(is_class.sum())
+            continue
+        recall = tp / n_targets
+        precision = tp / np.maximum(tp + fp, 1e-9)
+        ap = [average_precision(recall[:, i], precision[:, i]) for i in range(correct.shape[1])]
+        per_class[int(cls)] = {'ap50': ap[0], 'ap': float(np.mean(ap)), 'targets': n_targets}
+        tp_total += int(tp[-1, 0])
+        fp_total += int(fp[-1, 0])
+
+    n_targets = len(target_classes)
+    precision = tp_total / max(tp_total + fp_total, 1)
+    recall = tp_total / max(n_targets, 1)
+    scored = [c for c in per_class.values() if c['targets']]
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / max(precision + recall, 1e-9),
+        'map50': float(np.mean([c['ap50'] for c in scored])) if scored else 0.0,
+        'map': float(np.mean([c['ap'] for c in scored])) if scored else 0.0,
+        'detections': int(len(confidence)),
+        'targets': n_targets,
+        'per_class': per_class,
+    }
+
+
+def score(predictions, targets, conf_threshold=0.0, agnostic=False):
+    """
+    Accuracy of per-image predictions at one confidence threshold
+
+    Args:
+        predictions: list of (N, 6) arrays [x1, y1, x2, y2, confidence, class]
+        targets: list of (M, 5) arrays [x1, y1, x2, y2, class], same order
+        conf_threshold: Detections below this confidence are ignored
+        agnostic: Ignore classes (every box counts as class 0)
+
+    Returns:
+        dict from summarize()
+    """
+    correct, confidence, classes, target_classes = [], [], [], []
+    for detections, image_targets in zip(predictions, targets):
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+        image_targets = np.asarray(image_targets, dtype=np.float64).reshape(-1, 5)
+        detections = detections[detections[:, 4] >= conf_threshold]
+        if agnostic:
+            detections = detections.copy()
+            detections[:, 5] = 0
+            image_targets = image_targets.copy()
+            image_targets[:, 4] = 0
+        correct.append(match_detections(detections, image_targets))
+        confidence.append(detections[:, 4])
+        classes.append(detections[:, 5])
+        target_classes.append(image_targets[:, 4])
+    if not correct:
+        return summarize(np.zeros((0, len(IOU_THRESHOLDS))), [], [], [])
+    return summarize(np.concatenate(correct), np.concatenate(confidence),
+                     np.concatenate(classes), np.concatenate(target_classes))
+
+
+def latency_summary(seconds):
+    """Latency percentiles (ms) and throughput for a list of per-image timings"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000.0
+    if not len(ms):
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p90_ms': 0.0, 'p99_ms': 0.0, 'fps': 0.0}
+    return {
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'fps': float(1000.0 / ms.mean()),
+    }
+
+
+def pareto_frontier(rows, cost='p50_ms', benefit='recall'):
+    """
+    Rows not dominated by any cheaper-and-better row
+
+    A row is dominated when another row has lower-or-equal cost and
+    higher-or-equal benefit, and is strictly better in one of them.
+
+    Returns:
+        the frontier rows, sorted by cost
+    """
+    frontier = []
+    best = -np.inf
+    for row in sorted(rows, key=lambda r: (r[cost], -r[benefit])):
+        if row[benefit] > best:
+            frontier.append(row)
+            best = row[benefit]
+    return frontier
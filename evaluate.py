@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# Offline evaluation of any GarbageDetector backend with cached predictions
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+import eval_metrics
+from dataset_cache import label_path, list_images, read_labels
+from dataset_index import split_files
+
+BACKENDS = ('detect', 'detection', 'direct', 'service')
+CACHE_DIR = '.eval_cache'
+
+# Predictions are cached at this confidence, so any higher threshold can be re-scored
+MIN_CONF = 0.001
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_backend(backend, model_path, img_size, address=None):
+    """
+    Instantiate a detector backend with its confidence threshold lowered to MIN_CONF
+
+    The 'service' backend asks the inference service for the same weights and
+    threshold; it runs the service's detection.py pipeline, started if needed.
+    """
+    if backend == 'detect':
+        from detect import GarbageDetector
+        return GarbageDetector(model_path=model_path, conf_threshold=MIN_CONF)
+    if backend == 'detection':
+        from detection import GarbageDetector
+        return GarbageDetector(model_path=model_path, conf_threshold=MIN_CONF, img_size=img_size)
+    if backend == 'direct':
+        from direct_detect import GarbageDetector
+        return GarbageDetector(model_path=model_path, conf_threshold=MIN_CONF, img_size=img_size)
+    if backend == 'service':
+        from inference_service import connect, DEFAULT_ADDRESS
+        return connect(address or DEFAULT_ADDRESS, model_path, MIN_CONF)
+    raise ValueError(f"Unknown backend {backend}")
+
+
+def run_backend(detector, backend, image, img_size):
+    """
+    Run one image through a backend
+
+    Returns:
+        (detections, stages): (N, 6) array [x1, y1, x2, y2, confidence, class]
+        and the backend's stage timings in ms
+    """
+    if backend == 'detect':
+        detections = detector.detect(image, img_size)
+    else:
+        detections, _ = detector.detect(image, copy=False, img_size=img_size)
+
+    if isinstance(detections, list):
+        detections = [d['bbox'] + [d['confidence'], d['class']] for d in detections]
+    detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+
+    stages = {name: (end - start) * 1000.0 for name, (start, end) in getattr(detector, 'last_timings', {}).items()}
+    return detections, stages
+
+
+class PredictionCache:
+    """
+    Raw predictions per image for one (model hash, backend, image size)
+
+    Entries are keyed by image path and invalidated when the image's mtime
+    changes. Stored as JSON in .eval_cache/<key>.json.
+    """
+
+    def __init__(self, key, cache_dir=CACHE_DIR):
+        self.path = Path(cache_dir) / f"{key}.json"
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def get(self, image_path):
+        entry = self.entries.get(os.path.abspath(image_path))
+        if entry and entry['mtime'] == os.stat(image_path).st_mtime_ns:
+            return entry
+        return None
+
+    def put(self, image_path, detections, width, height, stages, wall_ms):
+        self.entries[os.path.abspath(image_path)] = {
+            'mtime': os.stat(image_path).st_mtime_ns,
+            'width': width,
+            'height': height,
+            'detections': np.round(detections, 4).tolist(),
+            'stages': stages,
+            'wall_ms': wall_ms,
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def collect_predictions(files, args):
+    """
+    Predictions for every image, running the backend only for uncached images
+
+    Returns:
+        list of cache entries in file order
+    """
+    # The detectors quietly fall back to pretrained COCO weights, which must not
+    # be scored (or cached) as if they were this model
+    if not os.path.isfile(args.model):
+        raise FileNotFoundError(f"Model {args.model} not found")
+    model_hash = file_hash(args.model)[:16]
+    key = f"{model_hash}-{args.backend}-{args.img_size}"
+    cache = PredictionCache(key, args.cache_dir)
+
+    detector = None
+    entries, ran = [], 0
+    for i, path in enumerate(files):
+        entry = None if args.rerun else cache.get(path)
+        if entry is None:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"Warning: could not read {path}, skipping")
+                continue
+            if detector is None:
+                detector = create_backend(args.backend, args.model, args.img_size, args.address)
+                # Warm up so the first timed image doesn't pay for lazy initialization
+                run_backend(detector, args.backend, image.copy(), args.img_size)
+            height, width = image.shape[:2]
+            start = time.perf_counter()
+            detections, stages = run_backend(detector, args.backend, image, args.img_size)
+            wall_ms = (time.perf_counter() - start) * 1000.0
+            cache.put(path, detections, width, height, stages, wall_ms)
+            entry = cache.get(path)
+            ran += 1
+            if ran % 50 == 0:
+                cache.save()
+                print(f"  {i + 1}/{len(files)} images")
+        entries.append((path, entry))
+
+    cache.save()
+    if hasattr(detector, 'close'):
+        detector.close()
+    print(f"Ran inference on {ran} image(s), {len(entries) - ran} from cache ({cache.path})")
+    return entries
+
+
+def class_names_from_yaml(data_yaml):
+    if not data_yaml or not os.path.exists(data_yaml):
+        return []
+    with open(data_yaml) as f:
+        names = (yaml.safe_load(f) or {}).get('names') or []
+    return [names[k] for k in sorted(names)] if isinstance(names, dict) else list(names)
+
+
+def report(entries, args):
+    """Score the cached predictions at every requested threshold and summarize latency"""
+    predictions, targets = [], []
+    for path, entry in entries:
+        predictions.append(np.asarray(entry['detections'], dtype=np.float64).reshape(-1, 6))
+        targets.append(eval_metrics.yolo_to_xyxy(read_labels(label_path(path)), entry['width'], entry['height']))
+
+    results = {'images': len(entries), 'model': args.model, 'backend': args.backend,
+               'img_size': args.img_size, 'thresholds': []}
+    print(f"\n{len(entries)} images, {sum(len(t) for t in targets)} labelled boxes")
+    print(f"{'conf':>6} {'P':>7} {'R':>7} {'F1':>7} {'mAP50':>7} {'mAP':>7} {'dets':>7}")
+    for conf in args.confs:
+        result = eval_metrics.score(predictions, targets, conf, args.agnostic)
+        results['thresholds'].append(dict(result, conf=conf))
+        print(f"{conf:>6.2f} {result['precision']:>7.3f} {result['recall']:>7.3f} {result['f1']:>7.3f} "
+              f"{result['map50']:>7.3f} {result['map']:>7.3f} {result['detections']:>7}")
+
+    names = class_names_from_yaml(args.data)
+    per_class = results['thresholds'][0]['per_class'] if results['thresholds'] else {}
+    if len(per_class) > 1 or names:
+        print(f"\nPer class at conf {args.confs[0]:.2f}:")
+        for cls, row in per_class.items():
+            name = names[cls] if cls < len(names) else f"class_{cls}"
+            print(f"  {name:<20} targets {row['targets']:>5}  AP50 {row['ap50']:.3f}  AP {row['ap']:.3f}")
+
+    # Latency without drawing, which at MIN_CONF would draw far more boxes than in production
+    model_ms = [sum(v for k, v in entry['stages'].items() if k != 'draw') or entry['wall_ms'] for _, entry in entries]
+    wall_ms = [entry['wall_ms'] for _, entry in entries]
+    results['latency'] = eval_metrics.latency_summary(np.array(model_ms) / 1000.0)
+    results['wall_latency'] = eval_metrics.latency_summary(np.array(wall_ms) / 1000.0)
+    stage_names = sorted({k for _, entry in entries for k in entry['stages']})
+    results['stages'] = {
+        name: eval_metrics.latency_summary(np.array([e['stages'][name] for _, e in entries if name in e['stages']]) / 1000.0)
+        for name in stage_names
+    }
+
+    print(f"\n{'latency':<14} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    rows = [('model', results['latency']), ('wall', results['wall_latency'])] + list(results['stages'].items())
+    for name, row in rows:
+        print(f"{name:<14} {row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['mean_ms']:>8.2f}")
+    return results
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Evaluate a garbage detector on a labelled split')
+    parser.add_argument('--backend', type=str, default='detection', choices=BACKENDS,
+                        help='detect.py, detection.py (app), direct_detect.py or the inference service')
+    parser.add_argument('--model', type=str, default='model/best.pt', help='Model weights (hashed for the cache)')
+    parser.add_argument('--data', type=str, default='data/garbage_data.yaml', help='Data YAML with the split')
+    parser.add_argument('--split', type=str, default='val', help='Split to evaluate')
+    parser.add_argument('--images', type=str, default=None, help='Evaluate an image directory instead')
+    parser.add_argument('--img-size', type=int, default=640, help='Inference size')
+    parser.add_argument('--confs', type=float, nargs='+', default=[0.25, 0.35, 0.5],
+                        help='Confidence thresholds to score (no re-inference needed)')
+    parser.add_argument('--agnostic', action='store_true', help='Ignore class ids when matching')
+    parser.add_argument('--address', type=str, default=None, help='Inference service address')
+    parser.add_argument('--cache-dir', type=str, default=CACHE_DIR, help='Prediction cache directory')
+    parser.add_argument('--rerun', action='store_true', help='Ignore cached predictions')
+    parser.add_argument('--output', type=str, default=None, help='Write the report as JSON')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    files = list_images(args.images) if args.images else split_files(args.data, args.split)
+    if not files:
+        print("Error: no images to evaluate")
+        sys.exit(1)
+
+    try:
+        entries = collect_predictions(files, args)
+    except (OSError, RuntimeError, ValueError, ConnectionError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    results = report(entries, args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nReport saved to {args.output}")
@@ -0,0 +1,793 @@
+#!/usr/bin/env python
+# Camera, stream, file and replay frame sources with a latest-frame reader thread
+
+import os
+import sys
+import time
+import atexit
+import struct
+import weakref
+import argparse
+
+import cv2
+import numpy as np
+
+import metrics
+from dataset_cache import list_images
+
+STREAM_PREFIXES = ('rtsp://', 'rtsps://', 'http://', 'https://', 'udp://', 'tcp://')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+REPLAY_EXTENSION = '.frames'
+
+# Reconnect backoff for the reader thread, in seconds
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+
+# How long read() waits for a new frame before reporting a failure
+DEFAULT_READ_TIMEOUT = 1.0
+
+# Replay file layout: header, then (timestamp, length) + encoded frame records
+REPLAY_MAGIC = b'CSFR'
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct('<4sHH')
+REPLAY_RECORD = struct.Struct('<dI')
+
+
+def _native_thread():
+    """
+    (allocate_lock, start_new_thread) that bypass eventlet/gevent monkey-patching
+
+    OpenCV reads block in C without yielding, so the reader has to be a real OS
+    thread even when the app runs on green threads.
+    """
+    try:
+        from eventlet.patcher import original
+        native = original('_thread')
+        return native.allocate_lock, native.start_new_thread
+    except ImportError:
+        pass
+    try:
+        from gevent.monkey import get_original
+        return get_original('_thread', 'allocate_lock'), get_original('_thread', 'start_new_thread')
+    except ImportError:
+        pass
+    import _thread
+    return _thread.allocate_lock, _thread.start_new_thread
+
+
+class FrameSource:
+    """
+    Base class for frame sources with a cv2.VideoCapture-like interface
+
+    Subclasses implement open(), read() and release(). A source whose frames
+    have run out (a non-looping file or replay) sets exhausted so readers stop
+    instead of reconnecting. Live sources (cameras, streams) keep producing
+    frames whether or not they are read, so throttled readers grab() them.
+    """
+
+    name = 'source'
+    live = False
+
+    def __init__(self):
+        self.exhausted = False
+        self.fps = 0.0
+
+    def open(self):
+        raise NotImplementedError
+
+    def read(self):
+        raise NotImplementedError
+
+    def grab(self):
+        """Advance past a frame without decoding it where the source allows"""
+        return self.read()[0]
+
+    def release(self):
+        pass
+
+    def isOpened(self):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+
+class CaptureSource(FrameSource):
+    """
+    Webcam index or network stream (RTSP/HTTP) through cv2.VideoCapture
+
+    Network streams get a one-frame buffer and open/read timeouts so a dead
+    camera fails fast instead of hanging the reader.
+    """
+
+    live = True
+
+    def __init__(self, target, resolution=None, timeout_ms=5000):
+        super().__init__()
+        self.target = target
+        self.name = str(target)
+        self.resolution = resolution
+        self.timeout_ms = timeout_ms
+        self.cap = None
+
+    @property
+    def is_stream(self):
+        return isinstance(self.target, str) and self.target.lower().startswith(STREAM_PREFIXES)
+
+    def open(self):
+        self.release()
+        if self.is_stream:
+            params = []
+            for prop in ('CAP_PROP_OPEN_TIMEOUT_MSEC', 'CAP_PROP_READ_TIMEOUT_MSEC'):
+                if hasattr(cv2, prop):
+                    params += [getattr(cv2, prop), self.timeout_ms]
+            self.cap = cv2.VideoCapture(self.target, cv2.CAP_ANY, params) if params else cv2.VideoCapture(self.target)
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        else:
+            self.cap = cv2.VideoCapture(self.target)
+            if self.resolution:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.cap is None:
+            return False, None
+        return self.cap.read()
+
+    def grab(self):
+        return self.cap is not None and self.cap.grab()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+
+class _PacedSource(FrameSource):
+    """Source that can be paced to its frame rate to behave like a live camera"""
+
+    def __init__(self, realtime=True):
+        super().__init__()
+        self.realtime = realtime
+        self._next_time = None
+
+    def _pace(self, interval):
+        if not self.realtime or interval <= 0:
+            return
+        now = time.perf_counter()
+        if self._next_time is None or self._next_time < now - interval:
+            self._next_time = now
+        delay = self._next_time - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time += interval
+
+
+class VideoFileSource(_PacedSource):
+    """Video file, optionally looped and paced to its native frame rate"""
+
+    def __init__(self, path, loop=True, realtime=True):
+        super().__init__(realtime)
+        self.path = path
+        self.name = path
+        self.loop = loop
+        self.cap = None
+
+    def open(self):
+        self.release()
+        self.cap = cv2.VideoCapture(self.path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.exhausted = False
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.cap is None:
+            return False, None
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if not ok:
+            self.exhausted = not self.loop
+            return False, None
+        self._pace(1.0 / self.fps)
+        return True, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+
+class ImageDirSource(_PacedSource):
+    """Images from a directory (or a single image) in name order, as a video at a fixed rate"""
+
+    def __init__(self, path, fps=5.0, loop=True, realtime=True):
+        super().__init__(realtime)
+        self.path = path
+        self.name = path
+        self.fps = fps
+        self.loop = loop
+        self.files = []
+        self.index = 0
+
+    def open(self):
+        if os.path.isdir(self.path):
+            self.files = list_images(self.path)
+        else:
+            self.files = [self.path] if os.path.exists(self.path) else []
+        self.index = 0
+        self.exhausted = False
+        return bool(self.files)
+
+    def read(self):
+        # Unreadable files are skipped, but a pass with no readable image is a failure
+        for _ in range(len(self.files)):
+            if self.index >= len(self.files):
+                if not self.loop:
+                    self.exhausted = True
+                    return False, None
+                self.index = 0
+            path = self.files[self.index]
+            self.index += 1
+            frame = cv2.imread(path)
+            if frame is not None:
+                self._pace(1.0 / self.fps)
+                return True, frame
+        self.exhausted = not self.loop or not self.files
+        return False, None
+
+    def release(self):
+        self.files = []
+
+    def isOpened(self):
+        return bool(self.files)
+
+
+class FrameRecorder:
+    """
+    Append frames with their capture timestamps to a replay file
+
+    Frames are stored JPEG-encoded (or PNG with lossless=True). Replaying
+    decodes the same bytes, so every replay yields identical frames.
+    """
+
+    def __init__(self, path, quality=95, lossless=False):
+        self.path = path
+        self.lossless = lossless
+        self.params = [] if lossless else [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.frames = 0
+        self._start = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'wb')
+        self._file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, 0))
+
+    def write(self, frame, timestamp=None):
+        """Record a frame; timestamps are stored relative to the first frame"""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self._start is None:
+            self._start = timestamp
+        ok, data = cv2.imencode('.png' if self.lossless else '.jpg', frame, self.params)
+        if not ok:
+            raise ValueError("Could not encode frame")
+        self.write_encoded(data.tobytes(), timestamp)
+
+    def write_encoded(self, data, timestamp):
+        """Record an already-encoded JPEG/PNG frame as it is"""
+        if self._start is None:
+            self._start = timestamp
+        self._file.write(REPLAY_RECORD.pack(timestamp - self._start, len(data)))
+        self._file.write(data)
+        self.frames += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_replay_index(path):
+    """
+    Scan a replay file
+
+    Returns:
+        list of (timestamp, offset, length) for every complete record
+    """
+    index = []
+    with open(path, 'rb') as f:
+        magic, version, _ = REPLAY_HEADER.unpack(f.read(REPLAY_HEADER.size))
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a frame replay file")
+        size = os.fstat(f.fileno()).st_size
+        offset = REPLAY_HEADER.size
+        while offset + REPLAY_RECORD.size <= size:
+            f.seek(offset)
+            timestamp, length = REPLAY_RECORD.unpack(f.read(REPLAY_RECORD.size))
+            offset += REPLAY_RECORD.size
+            # A recording cut short by a crash ends with a partial record
+            if offset + length > size:
+                break
+            index.append((timestamp, offset, length))
+            offset += length
+    return index
+
+
+class ReplaySource(FrameSource):
+    """
+    Deterministic playback of a FrameRecorder file
+
+    Read it directly to process every recorded frame; through a
+    ThreadedReader it behaves like a live camera and slow consumers skip frames.
+
+    Args:
+        speed: 1.0 replays at the recorded timing, 2.0 twice as fast, and 0
+            as fast as frames can be decoded (for throughput tests)
+        loop: Start over at the end instead of finishing
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        super().__init__()
+        self.path = path
+        self.name = path
+        self.speed = speed
+        self.loop = loop
+        self.index = []
+        self.position = 0
+        self._file = None
+        self._clock_start = None
+
+    def open(self):
+        self.release()
+        self.index = read_replay_index(self.path)
+        if not self.index:
+            return False
+        self._file = open(self.path, 'rb')
+        duration = self.index[-1][0]
+        self.fps = (len(self.index) - 1) / duration if duration > 0 else 0.0
+        self.position = 0
+        self.exhausted = False
+        self._clock_start = None
+        return True
+
+    def read(self):
+        if self._file is None:
+            return False, None
+        if self.position >= len(self.index):
+            if not self.loop:
+                self.exhausted = True
+                return False, None
+            self.position = 0
+            self._clock_start = None
+
+        timestamp, offset, length = self.index[self.position]
+        self.position += 1
+        if self.speed > 0:
+            now = time.perf_counter()
+            if self._clock_start is None:
+                self._clock_start = now - timestamp / self.speed
+            delay = self._clock_start + timestamp / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+
+        self._file.seek(offset)
+        data = np.frombuffer(self._file.read(length), dtype=np.uint8)
+        frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def isOpened(self):
+        return self._file is not None
+
+
+def open_source(spec, resolution=(1280, 720), loop=True, realtime=True, speed=1.0):
+    """
+    Build a frame source from a command-line style description
+
+    Args:
+        spec: Camera index ("0"), stream URL (rtsp://, http://), video file,
+            image file or directory, or a .frames replay file
+        resolution: Requested webcam resolution
+        loop: Loop files and replays
+        realtime: Pace files and image directories at their frame rate
+        speed: Replay speed (0 = as fast as possible)
+
+    Returns:
+        an unopened FrameSource
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CaptureSource(int(spec), resolution)
+    spec = str(spec)
+    if spec.lower().startswith(STREAM_PREFIXES):
+        return CaptureSource(spec)
+    if spec.endswith(REPLAY_EXTENSION):
+        return ReplaySource(spec, speed=speed, loop=loop)
+    if os.path.isdir(spec) or spec.lower().endswith(IMAGE_EXTENSIONS):
+        return ImageDirSource(spec, loop=loop, realtime=realtime)
+    if spec.lower().endswith(VIDEO_EXTENSIONS):
+        return VideoFileSource(spec, loop=loop, realtime=realtime)
+    raise ValueError(f"Unrecognized frame source: {spec}")
+
+
+class Subscription:
+    """
+    One consumer's view of a ThreadedReader
+
+    read() hands over the newest frame this consumer has not seen yet and
+    waits up to timeout seconds for one. When several consumers share the
+    reader each gets its own copy, so every caller may draw on its frame.
+    """
+
+    def __init__(self, reader, ready):
+        self.reader = reader
+        # Held while this consumer has no unread frame; released by the reader thread
+        self._ready = ready
+        self._ready.acquire()
+        self.unread = False
+        self.skipped = 0
+
+    def _signal(self):
+        try:
+            self._ready.release()
+        except RuntimeError:
+            pass
+
+    def read(self, timeout=DEFAULT_READ_TIMEOUT):
+        """
+        Returns:
+            (ok, frame) like cv2.VideoCapture.read()
+        """
+        reader = self.reader
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not self._ready.acquire(True, remaining):
+                return False, None
+            with reader._lock:
+                unread, frame = self.unread, reader._frame
+                shared = len(reader._subscriptions) > 1
+                self.unread = False
+            if unread:
+                return True, frame.copy() if shared else frame
+            if reader.ended:
+                # Keep later reads from waiting on a finished reader
+                self._signal()
+                return False, None
+
+    def isOpened(self):
+        return not self.reader.ended
+
+    def close(self):
+        self.reader.unsubscribe(self)
+
+
+class ThreadedReader:
+    """
+    Reads a frame source on its own thread and keeps only the newest frame
+
+    Consumers never wait on the camera: read() hands over the newest frame
+    the consumer has not seen yet, and frames it was too slow for are dropped
+    rather than queued. Several consumers can share one reader through
+    subscribe(). When the source fails, the reader thread reconnects with
+    exponential backoff while read() keeps returning (False, None) after its
+    timeout, so a stream can show a status frame instead of freezing.
+
+    set_max_fps() throttles decoding for idle periods; live sources keep
+    grabbing so the next decoded frame is current rather than buffered.
+
+    Args:
+        source: FrameSource (or spec for open_source)
+        record_path: Also record every captured frame to this replay file
+    """
+
+    def __init__(self, source, record_path=None, backoff_initial=BACKOFF_INITIAL, backoff_max=BACKOFF_MAX):
+        self.source = open_source(source)
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.recorder = FrameRecorder(record_path) if record_path else None
+        self.max_fps = None
+
+        self._allocate_lock, self._start_thread = _native_thread()
+        self._lock = self._allocate_lock()
+        # Held until release(); the reader thread uses it as an interruptible sleep
+        self._running = self._allocate_lock()
+        # Held by the reader thread until it has released the source
+        self._finished = self._allocate_lock()
+
+        self._subscriptions = []
+        self._default = None
+        self._frame = None
+        self._frame_time = None
+        self._next_decode = 0.0
+        self.sequence = 0
+        self.connected = False
+        self.ended = False
+        self.stopped = False
+        self.reconnects = 0
+        self.skipped = 0
+        self.last_error = None
+
+    @property
+    def name(self):
+        return self.source.name
+
+    @property
+    def fps(self):
+        return self.source.fps
+
+    def start(self):
+        self._running.acquire()
+        self._finished.acquire()
+        _readers.add(self)
+        self._start_thread(self._run, ())
+        return self
+
+    def subscribe(self):
+        """New consumer that only sees frames captured from now on"""
+        subscription = Subscription(self, self._allocate_lock())
+        with self._lock:
+            self._subscriptions.append(subscription)
+        if self.ended:
+            subscription._signal()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def set_max_fps(self, fps):
+        """Decode at most fps frames per second, or every frame with None"""
+        if fps == self.max_fps:
+            # Restarting the throttle on every call would let each one decode at once
+            return
+        self.max_fps = fps
+        self._next_decode = 0.0
+
+    def _wait(self, seconds):
+        """Sleep that returns early (True) when release() is called"""
+        if self._running.acquire(True, seconds):
+            self._running.release()
+            return True
+        return False
+
+    def _set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            metrics.SOURCE_CONNECTED.inc(1 if connected else -1)
+
+    def _throttle(self):
+        """
+        Hold back decoding while max_fps is set
+
+        Returns:
+            True when it is time to decode a frame, False to go round again
+            (or None if release() was called or the source failed)
+        """
+        max_fps = self.max_fps
+        if not max_fps:
+            return True
+        now = time.perf_counter()
+        if now >= self._next_decode:
+            self._next_decode = now + 1.0 / max_fps
+            return True
+        if self.source.live:
+            # Keep the device/stream drained without decoding
+            return False if self.source.grab() else None
+        # Wake up at least twice a second in case the rate is raised
+        return None if self._wait(min(self._next_decode - now, 0.5)) else False
+
+    def _run(self):
+        backoff = self.backoff_initial
+        try:
+            while not self.stopped:
+                if not self.source.isOpened():
+                    try:
+                        opened = self.source.open()
+                    except Exception as e:
+                        opened, self.last_error = False, str(e)
+                    if not opened:
+                        self.last_error = self.last_error or f"Could not open {self.source.name}"
+                        print(f"Frame source {self.source.name} unavailable, retrying in {backoff:.1f}s")
+                        if self._wait(backoff):
+                            break
+                        backoff = min(backoff * 2, self.backoff_max)
+                        continue
+
+                due = self._throttle()
+                if due is False:
+                    continue
+                ok, frame = self.source.read() if due else (False, None)
+                if not ok:
+                    if self.stopped or self.source.exhausted:
+                        break
+                    self._set_connected(False)
+                    self.last_error = f"Read from {self.source.name} failed"
+                    self.source.release()
+                    self.reconnects += 1
+                    metrics.SOURCE_RECONNECTS.inc()
+                    print(f"Lost frame source {self.source.name}, reconnecting in {backoff:.1f}s")
+                    if self._wait(backoff):
+                        break
+                    backoff = min(backoff * 2, self.backoff_max)
+                    continue
+
+                captured = time.perf_counter()
+                backoff = self.backoff_initial
+                self.last_error = None
+                self._set_connected(True)
+                if self.recorder is not None:
+                    self.recorder.write(frame, captured)
+                with self._lock:
+                    self._frame, self._frame_time = frame, captured
+                    self.sequence += 1
+                    subscriptions = list(self._subscriptions)
+                    for subscription in subscriptions:
+                        if subscription.unread:
+                            subscription.skipped += 1
+                            self.skipped += 1
+                            metrics.SKIPPED_FRAMES.inc()
+                        subscription.unread = True
+                for subscription in subscriptions:
+                    subscription._signal()
+        finally:
+            self.ended = True
+            self._set_connected(False)
+            self.source.release()
+            if self.recorder is not None:
+                self.recorder.close()
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+            for subscription in subscriptions:
+                subscription._signal()
+            self._finished.release()
+
+    def read(self, timeout=DEFAULT_READ_TIMEOUT):
+        """
+        Newest frame not returned before, waiting up to timeout seconds for one
+
+        The frame belongs to the caller and may be drawn on.
+
+        Returns:
+            (ok, frame) like cv2.VideoCapture.read()
+        """
+        if self._default is None:
+            self._default = self.subscribe()
+        return self._default.read(timeout)
+
+    def latest(self):
+        """(sequence, capture time, frame) of the newest frame without consuming it; the frame is shared, do not modify it"""
+        with self._lock:
+            return self.sequence, self._frame_time, self._frame
+
+    def wait_connected(self, timeout=5.0):
+        """Block until the first frame arrives or the source ends"""
+        deadline = time.perf_counter() + timeout
+        while not self.connected and not self.ended and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        return self.connected
+
+    def isOpened(self):
+        return not self.ended
+
+    def release(self, timeout=2.0):
+        """
+        Stop the reader thread and wait up to timeout seconds for it to release the source
+
+        A camera read in progress is not interrupted, so the thread may
+        outlive a short timeout; it exits as soon as that read returns.
+        """
+        if not self.stopped:
+            self.stopped = True
+            try:
+                self._running.release()
+            except RuntimeError:
+                pass
+        if timeout and self._finished.acquire(True, timeout):
+            self._finished.release()
+
+    def status(self):
+        return {
+            'source': self.source.name,
+            'connected': self.connected,
+            'ended': self.ended,
+            'frames': self.sequence,
+            'skipped': self.skipped,
+            'reconnects': self.reconnects,
+            'subscribers': len(self._subscriptions),
+            'max_fps': self.max_fps,
+            'error': self.last_error,
+        }
+
+
+# Readers still running at exit are stopped so no native thread is inside OpenCV during shutdown
+_readers = weakref.WeakSet()
+
+
+@atexit.register
+def _release_readers():
+    for reader in list(_readers):
+        reader.release()
+
+
+def open_stream(spec, record_path=None, **kwargs):
+    """Start a ThreadedReader over open_source(spec, **kwargs)"""
+    return ThreadedReader(open_source(spec, **kwargs), record_path).start()
+
+
+def record(spec, output, seconds=None, frames=None, lossless=False):
+    """Record a source to a replay file for a duration or frame count"""
+    source = open_source(spec, loop=False)
+    if not source.open():
+        raise RuntimeError(f"Could not open {spec}")
+    recorder = FrameRecorder(output, lossless=lossless)
+    start = time.perf_counter()
+    try:
+        while True:
+            if frames and recorder.frames >= frames:
+                break
+            if seconds and time.perf_counter() - start >= seconds:
+                break
+            ok, frame = source.read()
+            if not ok:
+                if source.exhausted:
+                    break
+                continue
+            recorder.write(frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.release()
+        recorder.close()
+    print(f"Recorded {recorder.frames} frames to {output}")
+    return recorder.frames
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Record and inspect frame replay files')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record a source to a .frames file')
+    record_parser.add_argument('--source', type=str, default='0', help='Camera index, URL, video or image directory')
+    record_parser.add_argument('--output', type=str, required=True, help='Replay file to write (.frames)')
+    record_parser.add_argument('--seconds', type=float, default=None, help='Stop after this many seconds')
+    record_parser.add_argument('--frames', type=int, default=None, help='Stop after this many frames')
+    record_parser.add_argument('--lossless', action='store_true', help='Store PNG instead of JPEG')
+
+    info_parser = subparsers.add_parser('info', help='Describe a replay file')
+    info_parser.add_argument('path', type=str, help='Replay file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    try:
+        if args.command == 'record':
+            if not args.output.endswith(REPLAY_EXTENSION):
+                args.output += REPLAY_EXTENSION
+            record(args.source, args.output, args.seconds, args.frames, args.lossless)
+        else:
+            index = read_replay_index(args.path)
+            duration = index[-1][0] if index else 0.0
+            size = sum(length for _, _, length in index)
+            print(f"{args.path}: {len(index)} frames over {duration:.1f}s "
+                  f"({(len(index) - 1) / duration if duration > 0 else 0:.1f} fps), "
+                  f"{size / len(index) / 1024 if index else 0:.1f} KiB/frame")
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# Per-frame stage trace recorder and offline trace analyzer
+
+import os
+import gc
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+import threading
+
+import numpy as np
+
+# Pipeline stages recorded for every frame, in pipeline order
+STAGES = ('capture', 'preprocess', 'inference', 'postprocess', 'draw', 'encode', 'output', 'gc')
+CAPTURE, PREPROCESS, INFERENCE, POSTPROCESS, DRAW, ENCODE, OUTPUT, GC = range(len(STAGES))
+
+# Frame flags
+FLAG_DETECTION = 1
+FLAG_DROPPED = 2
+FLAG_GARBAGE = 4
+
+MAGIC = b'CSTR'
+VERSION = 1
+
+# magic, version, record size, capacity, records written, wall clock at start
+HEADER = struct.Struct('<4sHHIQd')
+HEADER_SIZE = 64
+# frame id, flags, gc collections, frame start (ns since trace start),
+# then (offset us, duration us) for every stage
+RECORD = struct.Struct('<IHHq' + 'II' * len(STAGES))
+
+DEFAULT_CAPACITY = 65536
+
+
+class FrameTrace:
+    """
+    The frame one stream is currently recording
+
+    Streams served at the same time (several viewers or cameras) each get their
+    own FrameTrace from TraceRecorder.stream(), so one stream's stages never
+    land in another's record. Finished frames go into the recorder's shared ring.
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self._frame_start = None
+        self._spans = [0] * (2 * len(STAGES))
+        self._gc_start = None
+        self._gc_count = 0
+
+    def _on_gc(self, phase, now):
+        if self._frame_start is None:
+            return
+        if phase == 'start':
+            self._gc_start = now
+        elif self._gc_start is not None:
+            # Several collections in one frame are folded into one span
+            if self._gc_count == 0:
+                self._spans[2 * GC] = int((self._gc_start - self._frame_start) * 1e6)
+            self._spans[2 * GC + 1] += int((now - self._gc_start) * 1e6)
+            self._gc_count += 1
+            self._gc_start = None
+
+    def start_frame(self, start=None):
+        """Begin a new frame record"""
+        self._gc_start = None
+        self._gc_count = 0
+        spans = self._spans
+        for i in range(len(spans)):
+            spans[i] = 0
+        self._frame_start = time.perf_counter() if start is None else start
+
+    def span(self, stage, start, end):
+        """Record a stage that ran from start to end (perf_counter seconds)"""
+        if self._frame_start is None:
+            return
+        self._spans[2 * stage] = max(0, int((start - self._frame_start) * 1e6))
+        self._spans[2 * stage + 1] = max(0, int((end - start) * 1e6))
+
+    def spans(self, timings):
+        """Record several stages from a {stage name: (start, end)} dictionary"""
+        for name, (start, end) in timings.items():
+            # Stages outside the fixed record layout (e.g. the cascade's 'classify') are skipped
+            if name in STAGES:
+                self.span(STAGES.index(name), start, end)
+
+    def end_frame(self, detection=False, garbage=False, dropped=False):
+        """Write the current frame into the ring"""
+        if self._frame_start is None:
+            return
+        flags = (FLAG_DETECTION if detection else 0) | (FLAG_GARBAGE if garbage else 0) | \
+                (FLAG_DROPPED if dropped else 0)
+        frame_start, self._frame_start = self._frame_start, None
+        self.recorder._write(flags, self._gc_count, frame_start, self._spans)
+
+    def close(self):
+        """Stop following GC pauses; call when the stream ends"""
+        self._frame_start = None
+        self.recorder._release(self)
+
+
+class TraceRecorder:
+    """
+    Records per-frame stage timings into a fixed-size binary ring file
+
+    The file is memory-mapped, so recording a frame is a struct.pack_into and
+    the newest `capacity` frames survive a crash. Timestamps passed in are
+    time.perf_counter() values.
+
+    Code that runs one pipeline can call start_frame/span/end_frame on the
+    recorder itself. Concurrent streams each take their own stream().
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.written = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = HEADER_SIZE + RECORD.size * capacity
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+        self._base = time.perf_counter()
+        self._wall = time.time()
+        self._write_header()
+
+        self._lock = threading.Lock()
+        self._frame_id = 0
+        # Replaced rather than mutated, so the GC callback can walk it without a lock
+        self._streams = ()
+        self._default = self.stream()
+        gc.callbacks.append(self._on_gc)
+
+        print(f"Recording frame trace to {path} ({capacity} frames)")
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, self.capacity, self.written, self._wall)
+
+    def _on_gc(self, phase, info):
+        # A collection stops every thread, so it counts against each open frame
+        now = time.perf_counter()
+        for trace in self._streams:
+            trace._on_gc(phase, now)
+
+    def stream(self):
+        """A frame context of its own for one concurrently running stream"""
+        trace = FrameTrace(self)
+        with self._lock:
+            self._streams += (trace,)
+        return trace
+
+    def _release(self, trace):
+        with self._lock:
+            self._streams = tuple(t for t in self._streams if t is not trace)
+
+    def _write(self, flags, gc_count, frame_start, spans):
+        with self._lock:
+            if self._map is None:
+                return
+            offset = HEADER_SIZE + (self.written % self.capacity) * RECORD.size
+            RECORD.pack_into(self._map, offset, self._frame_id & 0xFFFFFFFF, flags, gc_count,
+                             int((frame_start - self._base) * 1e9), *spans)
+            self._frame_id += 1
+            self.written += 1
+            struct.pack_into('<Q', self._map, 12, self.written)
+
+    def start_frame(self, start=None):
+        """Begin a new frame record"""
+        self._default.start_frame(start)
+
+    def span(self, stage, start, end):
+        """Record a stage that ran from start to end (perf_counter seconds)"""
+        self._default.span(stage, start, end)
+
+    def spans(self, timings):
+        """Record several stages from a {stage name: (start, end)} dictionary"""
+        self._default.spans(timings)
+
+    def end_frame(self, detection=False, garbage=False, dropped=False):
+        """Write the current frame into the ring"""
+        self._default.end_frame(detection, garbage, dropped)
+
+    def close(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+        print(f"Frame trace saved to {self.path} ({min(self.written, self.capacity)} frames)")
+
+
+class NullRecorder:
+    """Stand-in used when tracing is disabled"""
+
+    def stream(self):
+        return self
+
+    def start_frame(self, start=None):
+        pass
+
+    def span(self, stage, start, end):
+        pass
+
+    def spans(self, timings):
+        pass
+
+    def end_frame(self, detection=False, garbage=False, dropped=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_recorder(path=None, capacity=DEFAULT_CAPACITY):
+    """
+    Create a recorder for path, or a no-op recorder when path is empty
+
+    Args:
+        path: Trace file path (None or '' disables tracing)
+        capacity: Number of frames kept in the ring
+
+    Returns:
+        TraceRecorder or NullRecorder
+    """
+    if not path:
+        return NullRecorder()
+    return TraceRecorder(path, capacity)
+
+
+def load_trace(path):
+    """
+    Read a trace file into a numpy structured array in recording order
+
+    Returns:
+        (records, wall_clock_start)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, record_size, capacity, written, wall = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path} is not a CleanSight frame trace")
+
+    fields = [('frame', '<u4'), ('flags', '<u2'), ('gc_count', '<u2'), ('start_ns', '<i8')]
+    for name in STAGES:
+        fields += [(f'{name}_offset', '<u4'), (f'{name}_us', '<u4')]
+    dtype = np.dtype(fields)
+
+    count = min(written, capacity)
+    records = np.frombuffer(data, dtype=dtype, count=count, offset=HEADER_SIZE)
+    if written > capacity:
+        head = written % capacity
+        records = np.concatenate([records[head:], records[:head]])
+    return records, wall
+
+
+def percentile_table(records):
+    """
+    Compute latency percentiles (ms) per stage
+
+    Stages are only counted on frames where they ran.
+    """
+    table = {}
+    for name in STAGES:
+        values = records[f'{name}_us'][records[f'{name}_us'] > 0] / 1000.0
+        if len(values) == 0:
+            continue
+        table[name] = {
+            'frames': int(len(values)),
+            'p50': float(np.percentile(values, 50)),
+            'p90': float(np.percentile(values, 90)),
+            'p99': float(np.percentile(values, 99)),
+            'max': float(values.max()),
+        }
+
+    intervals = np.diff(records['start_ns']) / 1e6
+    if len(intervals):
+        table['frame_interval'] = {
+            'frames': int(len(intervals)),
+            'p50': float(np.percentile(intervals, 50)),
+            'p90': float(np.percentile(intervals, 90)),
+            'p99': float(np.percentile(intervals, 99)),
+            'max': float(intervals.max()),
+        }
+    return table
+
+
+def find_spikes(records, factor=3.0, limit=20):
+    """
+    Find frames where a stage took more than `factor` times its median
+
+    Returns:
+        list of (frame, stage, ms, median ms) sorted by severity
+    """
+    spikes = []
+    for name in STAGES:
+        durations = records[f'{name}_us']
+        ran = durations > 0
+        if not ran.any():
+            continue
+        median = float(np.median(durations[ran]))
+        threshold = median * factor if name != 'gc' else 0
+        for index in np.nonzero(durations > max(threshold, 1000))[0]:
+            spikes.append((int(records['frame'][index]), name, durations[index] / 1000.0, median / 1000.0))
+    spikes.sort(key=lambda s: s[2] / max(s[3], 0.001), reverse=True)
+    return spikes[:limit]
+
+
+def to_chrome_trace(records, wall=0.0):
+    """
+    Convert records into Chrome trace-event JSON (chrome://tracing, Perfetto)
+
+    Every stage becomes a complete ("X") event on the pipeline track; GC pauses
+    go to their own track so they are easy to line up against stalls.
+    """
+    events = [
+        {'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': 'CleanSight'}},
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': 'frame pipeline'}},
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 2, 'args': {'name': 'gc'}},
+    ]
+    for record in records:
+        frame_ts = record['start_ns'] / 1000.0
+        args = {'frame': int(record['frame']), 'flags': int(record['flags'])}
+        for name in STAGES:
+            duration = int(record[f'{name}_us'])
+            if duration == 0:
+                continue
+            events.append({
+                'name': name,
+                'cat': 'gc' if name == 'gc' else 'stage',
+                'ph': 'X',
+                'pid': 1,
+                'tid': 2 if name == 'gc' else 1,
+                'ts': frame_ts + int(record[f'{name}_offset']),
+                'dur': duration,
+                'args': args,
+            })
+        if record['flags'] & FLAG_DROPPED:
+            events.append({'name': 'dropped frame', 'ph': 'i', 's': 't', 'pid': 1, 'tid': 1,
+                           'ts': frame_ts, 'args': args})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'wall_clock_start': wall}}
+
+
+def analyze(path, chrome_path=None, factor=3.0):
+    """Print percentile tables and spikes for a trace, optionally exporting it for Chrome"""
+    records, wall = load_trace(path)
+    if len(records) == 0:
+        print(f"{path} contains no frames")
+        return
+
+    duration = (records['start_ns'][-1] - records['start_ns'][0]) / 1e9
+    detections = int(np.count_nonzero(records['flags'] & FLAG_DETECTION))
+    dropped = int(np.count_nonzero(records['flags'] & FLAG_DROPPED))
+    print(f"{len(records)} frames over {duration:.1f} seconds "
+          f"({detections} with detection, {dropped} dropped)")
+
+    print(f"\n{'stage':<16} {'frames':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, row in percentile_table(records).items():
+        print(f"{name:<16} {row['frames']:>7} {row['p50']:>9.2f} {row['p90']:>9.2f} "
+              f"{row['p99']:>9.2f} {row['max']:>9.2f}")
+
+    spikes = find_spikes(records, factor)
+    if spikes:
+        print(f"\nWorst spikes (> {factor}x stage median):")
+        for frame, stage, ms, median in spikes:
+            print(f"  frame {frame:>7}  {stage:<12} {ms:>8.2f} ms  (median {median:.2f} ms)")
+
+    if chrome_path:
+        with open(chrome_path, 'w') as f:
+            json.dump(to_chrome_trace(records, wall), f)
+        print(f"\nChrome trace saved to {chrome_path} (open in chrome://tracing or ui.perfetto.dev)")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Analyze a CleanSight frame trace')
+    parser.add_argument('trace', type=str, help='Trace file written with --trace or CLEANSIGHT_TRACE')
+    parser.add_argument('--chrome', type=str, default=None,
+                        help='Write a Chrome trace-event JSON file')
+    parser.add_argument('--spike-factor', type=float, default=3.0,
+                        help='Report stages slower than this multiple of their median')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    try:
+        analyze(args.trace, args.chrome, args.spike_factor)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
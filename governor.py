@@ -0,0 +1,208 @@
+# Load-adaptive inference size and detection interval, one governor per camera
+
+import time
+import threading
+
+import metrics
+
+# Input sizes stepped through when detection is too slow, largest first
+SIZE_LADDER = (640, 512, 416, 320)
+
+# Multiples of the base detection interval stepped through when inference backs up
+INTERVAL_STEPS = (1, 2, 3, 4)
+
+# Weight of the newest latency sample in the moving average
+EWMA_ALPHA = 0.3
+
+# Seconds between two downgrades, so the effect of one is measured before the next
+DOWN_COOLDOWN = 1.0
+
+# Seconds of headroom required before upgrading again; doubled (up to MAX_UP_HOLD)
+# each time an upgrade has to be undone soon after
+UP_HOLD = 5.0
+MAX_UP_HOLD = 60.0
+
+# An upgrade is only made if the predicted latency stays below this share of the budget
+HEADROOM = 0.7
+
+# Detection requests already waiting for the detector that count as overload
+MAX_QUEUE = 2
+
+
+def size_steps(img_size, sizes=SIZE_LADDER):
+    """The configured size followed by the smaller sizes of the ladder"""
+    return [img_size] + [s for s in sizes if s < img_size]
+
+
+class Governor:
+    """
+    Keeps one camera's detection latency within a budget
+
+    Every detection reports its wall time (including any wait for the
+    detector) and how many requests were queued ahead of it. Two knobs are
+    turned one step at a time:
+
+    - the input size, when the smoothed latency exceeds the budget (a
+      smaller input is what makes each detection faster);
+    - the detection interval, when the queue backs up (fewer detections is
+      what drains it), or when the size is already at its floor.
+
+    Upgrades go the other way, interval first, once there has been no
+    overload for a while and the latency predicted at the larger size fits
+    well inside the budget. Every change is counted and the current choice
+    is exported as gauges.
+
+    Args:
+        camera_id: Name used in metrics and status
+        budget: Latency budget per detection in seconds (None never adjusts)
+        img_size: Configured (maximum) inference size
+        base_interval: Configured detection interval in frames
+        max_queue: Queue depth that counts as overload
+        clock: Time source in seconds
+    """
+
+    def __init__(self, camera_id, budget=None, img_size=640, base_interval=5, max_queue=MAX_QUEUE,
+                 clock=time.perf_counter):
+        self.camera_id = str(camera_id)
+        self.budget = budget
+        self.max_queue = max_queue
+        self.clock = clock
+        self.sizes = size_steps(img_size)
+        self.intervals = [base_interval * m for m in INTERVAL_STEPS]
+        self.size_step = 0
+        self.interval_step = 0
+        self.latency = None
+        self.queue_depth = 0
+        self.adjustments = {'down': 0, 'up': 0}
+        self.up_hold = UP_HOLD
+
+        now = clock()
+        self._last_change = now
+        self._last_overload = now
+        self._last_direction = None
+        self._lock = threading.Lock()
+
+        labels = {'camera': self.camera_id}
+        self._level_gauge = metrics.GOVERNOR_LEVEL.labels(**labels)
+        self._size_gauge = metrics.GOVERNOR_IMG_SIZE.labels(**labels)
+        self._interval_gauge = metrics.GOVERNOR_INTERVAL.labels(**labels)
+        self._latency_gauge = metrics.GOVERNOR_LATENCY.labels(**labels)
+        self._queue_gauge = metrics.GOVERNOR_QUEUE.labels(**labels)
+        self._export()
+
+    @property
+    def img_size(self):
+        return self.sizes[self.size_step]
+
+    @property
+    def interval(self):
+        return self.intervals[self.interval_step]
+
+    @property
+    def interval_scale(self):
+        """How many times the base interval the current one is (see scheduler.py)"""
+        return self.interval / self.intervals[0]
+
+    @property
+    def level(self):
+        """Steps taken down from full quality, over both knobs"""
+        return self.size_step + self.interval_step
+
+    def should_detect(self, frame_count):
+        """Whether the frame_count-th frame of a stream gets a detection"""
+        return frame_count % self.interval == 0
+
+    def _export(self):
+        self._level_gauge.set(self.level)
+        self._size_gauge.set(self.img_size)
+        self._interval_gauge.set(self.interval)
+
+    def _predicted(self, size_step):
+        """Latency expected at another size, assuming it scales with the input area"""
+        return self.latency * (self.sizes[size_step] / self.img_size) ** 2
+
+    def _change(self, size_step, interval_step, now, direction, reason):
+        if direction == 'down' and self._last_direction == 'up' and now - self._last_change < self.up_hold:
+            # The last upgrade did not hold; wait longer before trying again
+            self.up_hold = min(self.up_hold * 2, MAX_UP_HOLD)
+        elif direction == 'up' and now - self._last_change >= 2 * self.up_hold:
+            self.up_hold = UP_HOLD
+
+        # Samples taken at the old size no longer apply; rescale instead of starting over
+        self.latency = self._predicted(size_step)
+        self.size_step, self.interval_step = size_step, interval_step
+        self._last_change = now
+        self._last_direction = direction
+        self.adjustments[direction] += 1
+        metrics.GOVERNOR_ADJUSTMENTS.labels(camera=self.camera_id, direction=direction).inc()
+        self._export()
+        print(f"Governor camera {self.camera_id}: {direction} to {self.img_size}px, "
+              f"detection interval x{self.interval_scale:g} ({reason})")
+
+    def _step_down(self, now, slow, queue_depth):
+        can_shrink = self.size_step < len(self.sizes) - 1
+        can_stretch = self.interval_step < len(self.intervals) - 1
+        if slow and can_shrink or not can_stretch and can_shrink:
+            size_step, interval_step = self.size_step + 1, self.interval_step
+        elif can_stretch:
+            size_step, interval_step = self.size_step, self.interval_step + 1
+        else:
+            return
+        reason = (f"latency {self.latency * 1000:.0f} ms > {self.budget * 1000:.0f} ms" if slow
+                  else f"queue depth {queue_depth}")
+        self._change(size_step, interval_step, now, 'down', reason)
+
+    def _step_up(self, now):
+        limit = HEADROOM * self.budget
+        if self.interval_step > 0 and self.latency < limit:
+            self._change(self.size_step, self.interval_step - 1, now, 'up',
+                         f"latency {self.latency * 1000:.0f} ms")
+        elif self.size_step > 0 and self._predicted(self.size_step - 1) < limit:
+            self._change(self.size_step - 1, self.interval_step, now, 'up',
+                         f"predicted {self._predicted(self.size_step - 1) * 1000:.0f} ms")
+
+    def observe(self, latency, queue_depth=0):
+        """
+        Record one detection and adjust the size or interval if needed
+
+        Args:
+            latency: Seconds from submitting the frame to getting detections back
+            queue_depth: Detection calls already waiting or running when this one was submitted
+        """
+        with self._lock:
+            now = self.clock()
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EWMA_ALPHA * (latency - self.latency)
+            self.queue_depth = queue_depth
+            self._latency_gauge.set(self.latency)
+            self._queue_gauge.set(queue_depth)
+            if self.budget is None:
+                return
+
+            slow = self.latency > self.budget
+            if slow or queue_depth >= self.max_queue:
+                self._last_overload = now
+                if now - self._last_change >= DOWN_COOLDOWN:
+                    self._step_down(now, slow, queue_depth)
+            elif (self.level > 0 and queue_depth == 0
+                    and now - self._last_change >= self.up_hold
+                    and now - self._last_overload >= self.up_hold):
+                self._step_up(now)
+
+    def status(self):
+        return {
+            'camera': self.camera_id,
+            'enabled': self.budget is not None,
+            'budget_ms': None if self.budget is None else self.budget * 1000.0,
+            'level': self.level,
+            'img_size': self.img_size,
+            'interval': self.interval,
+            'sizes': self.sizes,
+            'intervals': self.intervals,
+            'latency_ms': None if self.latency is None else self.latency * 1000.0,
+            'queue_depth': self.queue_depth,
+            'up_hold': self.up_hold,
+            'adjustments': dict(self.adjustments),
+        }
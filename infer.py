@@ -5,6 +5,11 @@ import torch
 import cv2
 import numpy as np
 from pathlib import Path
+import inference_service
+from preprocess import LetterboxPreprocessor, scale_boxes
+
+# Reused across images so same-sized inputs don't allocate new buffers
+preprocessor = LetterboxPreprocessor()
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Run inference with trained YOLOv5 garbage detection model')
@@ -16,6 +21,11 @@ def parse_args():
     parser.add_argument('--save_dir', type=str, default='results', help='Directory to save results')
     parser.add_argument('--show', action='store_true', help='Display results')
     parser.add_argument('--device', type=str, default='', help='cuda device, i.e. 0 or 0,1,2,3 or cpu')
+    parser.add_argument('--cache', action='store_true',
+                        help='Read a source directory from its dataset cache (results are drawn at img_size)')
+    parser.add_argument('--daemon', type=str, nargs='?', const=inference_service.DEFAULT_ADDRESS, default=None,
+                        help='Run the model in the shared inference service at this address, starting it if '
+                             'needed, so repeated runs skip loading it (NMS IoU is the model default there)')
     return parser.parse_args()
 
 def setup_model(weights_path, device=''):
@@ -35,8 +45,8 @@ def setup_model(weights_path, device=''):
     from models.experimental import attempt_load
     return attempt_load(weights_path, map_location=device)
 
-def preprocess_image(img_path, img_size=640):
-    """Preprocess image for inference"""
+def load_image(img_path):
+    """Read an image file, or grab one frame from a webcam index"""
     # Read image
     if img_path.isdigit():  # Webcam
         cap = cv2.VideoCapture(int(img_path))
@@ -48,21 +58,21 @@ def preprocess_image(img_path, img_size=640):
         img = cv2.imread(img_path)
         if img is None:
             raise Exception(f"Failed to read image {img_path}")
+    return img
+
+def preprocess_image(img_path, img_size=640):
+    """
+    Preprocess image for inference
     
-    # Resize and convert to RGB
-    h, w = img.shape[:2]
-    img = cv2.resize(img, (img_size, img_size))
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    Returns the letterboxed input tensor (reused by the next call), the
+    metadata needed to scale boxes back, and the original BGR image.
+    """
+    img = load_image(img_path)
     
-    # Normalize and convert to tensor
-    img = img.transpose(2, 0, 1)  # HWC to CHW
-    img = np.ascontiguousarray(img)
-    img = torch.from_numpy(img).float()
-    img /= 255.0  # 0 - 255 to 0.0 - 1.0
-    if img.ndimension() == 3:
-        img = img.unsqueeze(0)
+    # Letterbox, convert to RGB and normalize in one pass into a reused tensor
+    tensor, meta = preprocessor(img, img_size)
     
-    return img, (h, w)
+    return tensor, meta, img
 
 def main():
     args = parse_args()
@@ -71,15 +81,20 @@ def main():
     save_dir = Path(args.save_dir)
     save_dir.mkdir(exist_ok=True)
     
-    # Initialize device
-    device = args.device if args.device else ('cuda:0' if torch.cuda.is_available() else 'cpu')
-    print(f"Using device: {device}")
-    
-    # Load model
-    print(f"Loading model from {args.weights}...")
-    model = setup_model(args.weights, device)
-    model.eval()
-    model.to(device)
+    client = None
+    if args.daemon:
+        # The service keeps the model loaded between runs
+        client = inference_service.connect(args.daemon, args.weights, args.conf_thres, slots=1)
+    else:
+        # Initialize device
+        device = args.device if args.device else ('cuda:0' if torch.cuda.is_available() else 'cpu')
+        print(f"Using device: {device}")
+        
+        # Load model
+        print(f"Loading model from {args.weights}...")
+        model = setup_model(args.weights, device)
+        model.eval()
+        model.to(device)
     
     # Check if source is a directory or a single file
     source = Path(args.source)
@@ -91,37 +106,52 @@ def main():
     else:
         raise Exception(f"Source {source} does not exist")
     
+    # Already decoded and resized images, built once by dataset_cache.py
+    cache = None
+    if args.cache and source.is_dir():
+        from dataset_cache import open_cache
+        cache = open_cache(source, args.img_size)
+    
     # Process each file
     for file_path in files:
         try:
             print(f"Processing {file_path}...")
-            img, original_size = preprocess_image(str(file_path), args.img_size)
-            img = img.to(device)
-            
-            # Run inference
-            with torch.no_grad():
-                pred = model(img)[0]
+            index = cache.index_of(file_path) if cache is not None else None
+            if client is not None:
+                orig_img = cache.image(index) if index is not None else load_image(str(file_path))
+                # Boxes come back in original image coordinates
+                detections = client.predict(orig_img, args.img_size)
+            else:
+                if index is not None:
+                    orig_img = cache.image(index)
+                    img, meta = preprocessor(orig_img, args.img_size)
+                else:
+                    img, meta, orig_img = preprocess_image(str(file_path), args.img_size)
+                img = img.to(device)
+                
+                # Run inference
+                with torch.no_grad():
+                    pred = model(img)[0]
+                    
+                    # Apply NMS
+                    from utils.general import non_max_suppression
+                    pred = non_max_suppression(pred, args.conf_thres, args.iou_thres)
                 
-                # Apply NMS
-                from utils.general import non_max_suppression
-                pred = non_max_suppression(pred, args.conf_thres, args.iou_thres)
+                detections = pred[0]
+                if len(detections):
+                    # Scale coordinates to original size
+                    scale_boxes(detections, meta)
             
             # Process predictions
-            if len(pred[0]):
-                # Read image for visualization
-                orig_img = cv2.imread(str(file_path)) if file_path != Path('0') else img.squeeze(0).permute(1, 2, 0).cpu().numpy() * 255
-                orig_img = orig_img.astype(np.uint8)
+            if len(detections):
+                # Cached images are read-only views of the memory map
+                if not orig_img.flags.writeable:
+                    orig_img = orig_img.copy()
                 
                 # Process detections
-                for det in pred[0]:
+                for det in detections:
                     xyxy, conf, cls = det[:4], det[4], det[5]
                     
-                    # Scale coordinates to original size
-                    xyxy[0] = xyxy[0].item() * original_size[1] / args.img_size
-                    xyxy[1] = xyxy[1].item() * original_size[0] / args.img_size
-                    xyxy[2] = xyxy[2].item() * original_size[1] / args.img_size
-                    xyxy[3] = xyxy[3].item() * original_size[0] / args.img_size
-                    
                     # Draw bounding box
                     cv2.rectangle(orig_img, 
                                (int(xyxy[0]), int(xyxy[1])), 
@@ -148,6 +178,8 @@ def main():
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
     
+    if client is not None:
+        client.close()
     cv2.destroyAllWindows()
     print("Inference completed")
 
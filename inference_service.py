@@ -0,0 +1,742 @@
+#!/usr/bin/env python
+# Out-of-process inference service with shared-memory frame transfer
+
+import os
+import sys
+import time
+import queue
+import tempfile
+import subprocess
+import argparse
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import get_context, shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+import metrics
+
+DEFAULT_ADDRESS = '/tmp/cleansight-inference.sock'
+DEFAULT_AUTHKEY = b'cleansight'
+DEFAULT_SLOTS = 4
+DEFAULT_MAX_SHAPE = (1080, 1920, 3)
+DEFAULT_MODEL = 'model/best.pt'
+
+# Models kept loaded at once; the least recently used one without clients is unloaded beyond this
+DEFAULT_MAX_MODELS = 2
+
+# A service started on demand by a CLI exits after this many seconds without clients
+AUTOSTART_IDLE_TIMEOUT = 600
+
+# Seconds to wait for a service (and its model) to come up
+START_TIMEOUT = 300
+
+
+def parse_address(address):
+    """Turn 'host:port' into a tuple, leaving Unix socket paths untouched"""
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return address
+
+
+def default_authkey():
+    """CLEANSIGHT_INFERENCE_KEY, or the built-in key"""
+    authkey = os.environ.get('CLEANSIGHT_INFERENCE_KEY', DEFAULT_AUTHKEY)
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def _attach_shared_memory(name):
+    """
+    Attach to an existing shared memory block without taking ownership of it
+
+    The resource tracker would otherwise unlink the client's block when this
+    process exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+def _plain_detections(detections):
+    """Convert detections to plain Python types so they pickle compactly"""
+    return [{
+        'class': int(d['class']),
+        'name': str(d['name']),
+        'confidence': float(d['confidence']),
+        'bbox': [float(c) for c in d['bbox']]
+    } for d in detections]
+
+
+def _worker_main(worker_id, model_path, conf_threshold, tasks, results, max_attached=16):
+    """
+    Inference worker process: loads the model once and serves tasks forever
+
+    Each task names a client's shared memory block and a slot inside it. The
+    frame is read in place; for 'detect' tasks the annotated frame is written
+    back into the same slot, for 'predict' tasks only the raw boxes are
+    returned. Either way only small results travel over the result queue.
+    """
+    from detection import GarbageDetector
+
+    try:
+        if model_path:
+            # A missing model must fail the load, not be served as pretrained COCO weights
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Model {model_path} not found")
+            detector = GarbageDetector(model_path=model_path, conf_threshold=conf_threshold)
+        else:
+            detector = GarbageDetector(conf_threshold=conf_threshold)
+    except Exception as e:
+        results.put(('failed', model_path, f"{type(e).__name__}: {e}", None))
+        return
+    names = detector.class_names
+    names = dict(enumerate(names)) if isinstance(names, (list, tuple)) else dict(names)
+    print(f"Inference worker {worker_id} ready ({model_path})")
+    results.put(('ready', model_path, names, None))
+
+    attached = OrderedDict()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        conn_id, request_id, shm_name, offset, shape, img_size, conf, annotate = task
+        try:
+            shm = attached.get(shm_name)
+            if shm is None:
+                shm = _attach_shared_memory(shm_name)
+                attached[shm_name] = shm
+                # Forget blocks of clients that went away
+                while len(attached) > max_attached:
+                    attached.popitem(last=False)[1].close()
+            attached.move_to_end(shm_name)
+
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+            detector.conf_threshold = conf_threshold if conf is None else conf
+            start = time.perf_counter()
+            if annotate:
+                # Annotated straight into the shared slot
+                detections, _ = detector.detect(frame, copy=False, img_size=img_size)
+                payload = _plain_detections(detections)
+            else:
+                payload = detector.predict(frame, img_size)
+            elapsed = time.perf_counter() - start
+            del frame
+            results.put((conn_id, request_id, payload, elapsed))
+        except Exception as e:
+            # Only text crosses the queue: an exception holding a tensor or a handle
+            # may not pickle, and the queue would drop it while the client waits
+            results.put((conn_id, request_id, f"{type(e).__name__}: {e}", None))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class _ModelPool:
+    """Worker processes serving one model, with their own task queue"""
+
+    def __init__(self, context, model_path, workers, conf_threshold, results):
+        self.model_path = model_path
+        self.tasks = context.Queue()
+        self.processes = [
+            context.Process(target=_worker_main, args=(i, model_path, conf_threshold, self.tasks, results),
+                            daemon=True)
+            for i in range(workers)
+        ]
+        self.ready = threading.Event()
+        self.ready_workers = 0
+        self.names = None
+        self.error = None
+        self.clients = 0
+        self.last_used = time.monotonic()
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        return self
+
+    def worker_ready(self, names):
+        self.names = names
+        self.ready_workers += 1
+        if self.ready_workers == len(self.processes):
+            self.ready.set()
+
+    def worker_failed(self, error):
+        self.error = error
+        self.ready.set()
+
+    def stop(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+
+
+class InferenceServer:
+    """
+    Broker between clients and pools of inference worker processes
+
+    Clients connect over a multiprocessing connection (Unix socket or TCP),
+    announce their shared memory ring and the model they want, and then send
+    (request id, slot, shape) messages. Every model gets its own pool of
+    workers, started on first use and kept loaded while there is room for it,
+    so clients asking for the same weights share warm workers and any idle
+    worker picks up the next frame. With idle_timeout the service exits once
+    it has had no clients for that many seconds.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, workers=1, model_path=DEFAULT_MODEL,
+                 conf_threshold=0.25, authkey=DEFAULT_AUTHKEY, max_models=DEFAULT_MAX_MODELS, idle_timeout=None):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.workers = workers
+        self.model_path = os.path.abspath(model_path)
+        self.conf_threshold = conf_threshold
+        self.max_models = max_models
+        self.idle_timeout = idle_timeout
+
+        self._context = get_context('spawn')
+        self.results = self._context.Queue()
+        self.pools = OrderedDict()
+
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._conn_ids = itertools.count()
+        self._listener = None
+        self._stopping = False
+        self._last_activity = time.monotonic()
+
+    def _pool(self, model_path):
+        """The pool serving a model, started (and another one unloaded) if needed"""
+        with self._lock:
+            pool = self.pools.get(model_path)
+            if pool is None:
+                idle = [p for p in self.pools.values() if p.clients == 0]
+                while len(self.pools) >= self.max_models and idle:
+                    evicted = idle.pop(0)
+                    del self.pools[evicted.model_path]
+                    print(f"Unloading {evicted.model_path}")
+                    threading.Thread(target=evicted.stop, daemon=True).start()
+                print(f"Loading {model_path} in {self.workers} worker(s)")
+                pool = _ModelPool(self._context, model_path, self.workers, self.conf_threshold, self.results).start()
+                self.pools[model_path] = pool
+            self.pools.move_to_end(model_path)
+            pool.last_used = time.monotonic()
+        return pool
+
+    def _is_running_elsewhere(self):
+        """Whether another service already answers on our Unix socket"""
+        try:
+            Client(self.address, authkey=self.authkey).close()
+            return True
+        except (OSError, EOFError):
+            return False
+
+    def serve_forever(self):
+        """Start the workers and accept clients until interrupted"""
+        threading.Thread(target=self._dispatch_results, daemon=True).start()
+
+        # Wait for the default model to load before accepting frames
+        pool = self._pool(self.model_path)
+        pool.ready.wait()
+        if pool.error:
+            raise RuntimeError(f"Could not load {self.model_path}: {pool.error}")
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            if self._is_running_elsewhere():
+                print(f"Another inference service is already listening on {self.address}")
+                self.close(remove_socket=False)
+                return
+            os.remove(self.address)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if self.idle_timeout:
+            threading.Thread(target=self._idle_watchdog, daemon=True).start()
+        print(f"Inference service listening on {self.address} with {self.workers} worker(s) per model")
+
+        try:
+            while True:
+                conn = self._listener.accept()
+                if self._stopping:
+                    conn.close()
+                    break
+                conn_id = next(self._conn_ids)
+                with self._lock:
+                    self._connections[conn_id] = (conn, threading.Lock())
+                    self._last_activity = time.monotonic()
+                threading.Thread(target=self._serve_client, args=(conn_id, conn), daemon=True).start()
+        except KeyboardInterrupt:
+            print("Shutting down inference service")
+        finally:
+            self.close()
+
+    def _idle_watchdog(self):
+        while not self._stopping:
+            time.sleep(1.0)
+            with self._lock:
+                idle = not self._connections and time.monotonic() - self._last_activity >= self.idle_timeout
+            if idle:
+                print(f"No clients for {self.idle_timeout:g}s, shutting down inference service")
+                self._stopping = True
+                # Wake the accept() in serve_forever
+                try:
+                    Client(self.address, authkey=self.authkey).close()
+                except (OSError, EOFError):
+                    pass
+
+    def _serve_client(self, conn_id, conn):
+        shm_name = None
+        slot_size = 0
+        pool = None
+        try:
+            while True:
+                message = conn.recv()
+                kind = message[0]
+                if kind == 'hello':
+                    _, shm_name, slot_size, model_path = message
+                    pool = self._pool(model_path or self.model_path)
+                    # Blocks only this client while a newly requested model loads
+                    pool.ready.wait()
+                    if pool.error:
+                        conn.send(('error', pool.error))
+                        with self._lock:
+                            self.pools.pop(pool.model_path, None)
+                        pool = None
+                        break
+                    with self._lock:
+                        pool.clients += 1
+                    conn.send(('welcome', pool.names))
+                    print(f"Client {conn_id} connected ({pool.model_path})")
+                elif kind == 'detect':
+                    _, request_id, slot, shape, img_size, conf, annotate = message
+                    pool.last_used = time.monotonic()
+                    pool.tasks.put((conn_id, request_id, shm_name, slot * slot_size, tuple(shape), img_size,
+                                    conf, annotate))
+                elif kind == 'bye':
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._connections.pop(conn_id, None)
+                self._last_activity = time.monotonic()
+                if pool is not None:
+                    pool.clients -= 1
+            conn.close()
+            print(f"Client {conn_id} disconnected")
+
+    def _dispatch_results(self):
+        while True:
+            conn_id, request_id, payload, elapsed = self.results.get()
+            if conn_id in ('ready', 'failed'):
+                # Worker start-up: request_id is the model path
+                pool = self.pools.get(request_id)
+                if pool is not None:
+                    if conn_id == 'ready':
+                        pool.worker_ready(payload)
+                    else:
+                        print(f"Could not load {request_id}: {payload}")
+                        pool.worker_failed(payload)
+                continue
+            with self._lock:
+                entry = self._connections.get(conn_id)
+            if entry is None:
+                continue
+            conn, send_lock = entry
+            try:
+                with send_lock:
+                    # Workers report a failed task with its error message and no elapsed time
+                    conn.send(('result' if elapsed is not None else 'error', request_id, payload, elapsed))
+            except (OSError, ValueError):
+                pass
+
+    def status(self):
+        with self._lock:
+            return {
+                'clients': len(self._connections),
+                'models': [{'model': pool.model_path, 'workers': len(pool.processes), 'clients': pool.clients,
+                            'ready': pool.ready.is_set() and not pool.error}
+                           for pool in self.pools.values()],
+            }
+
+    def close(self, remove_socket=True):
+        self._stopping = True
+        for pool in list(self.pools.values()):
+            pool.stop()
+        self.pools.clear()
+        if self._listener is not None:
+            self._listener.close()
+        if remove_socket and isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class InferenceClient:
+    """
+    Drop-in replacement for GarbageDetector that runs inference in the service
+
+    Frames are copied once into a shared memory ring owned by the client; the
+    service reads them in place and writes the annotated frame back into the
+    same slot. Only small control messages and detections go over the socket.
+
+    Args:
+        address: Service address (Unix socket path or host:port)
+        slots: Frames that can be in flight at once
+        max_shape: Largest frame a slot holds
+        authkey: Connection key (default: CLEANSIGHT_INFERENCE_KEY or the built-in one)
+        timeout: Seconds to wait for a result
+        model_path: Weights to run (default: the service's own model); loaded on first use
+        conf_threshold: Confidence threshold for this client's frames (default: the service's)
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, slots=DEFAULT_SLOTS, max_shape=DEFAULT_MAX_SHAPE,
+                 authkey=None, timeout=10.0, model_path=None, conf_threshold=None):
+        self.timeout = timeout
+        self.slot_size = int(np.prod(max_shape))
+        self.conf_threshold = conf_threshold
+        self.model_path = os.path.abspath(model_path) if model_path else None
+        self.last_timings = {}
+
+        self._conn = Client(parse_address(address), authkey=authkey or default_authkey())
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_size * slots)
+        self._free_slots = queue.Queue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+
+        self._pending = {}
+        # Slots of requests that timed out, by request id; the worker may still write
+        # into them, so they rejoin the pool only when its late reply arrives
+        self._abandoned = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._closed = False
+
+        try:
+            self._conn.send(('hello', self._shm.name, self.slot_size, self.model_path))
+            # The service answers once the model is loaded, which takes a while the first time
+            if not self._conn.poll(START_TIMEOUT):
+                raise TimeoutError(f"Inference service at {address} did not load the model in time")
+            reply = self._conn.recv()
+            if reply[0] == 'error':
+                raise RuntimeError(f"Inference service could not load the model: {reply[1]}")
+        except BaseException:
+            self._conn.close()
+            self._shm.close()
+            self._shm.unlink()
+            raise
+        self.class_names = reply[1]
+        threading.Thread(target=self._receive_results, daemon=True).start()
+        print(f"Connected to inference service at {address}")
+
+    def _receive_results(self):
+        try:
+            while True:
+                kind, request_id, payload, elapsed = self._conn.recv()
+                with self._pending_lock:
+                    future = self._pending.pop(request_id, None)
+                    late_slot = self._abandoned.pop(request_id, None)
+                if late_slot is not None:
+                    self._free_slots.put(late_slot)
+                if future is None:
+                    continue
+                if kind == 'error':
+                    future.set_exception(RuntimeError(f"Inference failed: {payload}"))
+                else:
+                    future.set_result(payload)
+        except (EOFError, OSError):
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError("Inference service connection lost"))
+
+    def submit(self, frame, img_size=None, annotate=True):
+        """
+        Send a frame for inference without waiting for the result
+
+        Args:
+            frame: BGR frame, at most max_shape
+            img_size: Inference size (defaults to the workers' size)
+            annotate: Have the worker draw the detections into the slot; without it the
+                future resolves to raw [x1, y1, x2, y2, confidence, class] rows instead
+
+        Returns:
+            (future, slot, view): the future resolves to the detections list;
+            the annotated frame stays in view until collect() releases the slot
+        """
+        if frame.nbytes > self.slot_size:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit in a {self.slot_size} byte slot")
+
+        slot = self._free_slots.get(timeout=self.timeout)
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self.slot_size)
+        np.copyto(view, frame)
+
+        request_id = next(self._request_ids)
+        future = Future()
+        future.request_id = request_id
+        with self._pending_lock:
+            self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send(('detect', request_id, slot, frame.shape, img_size, self.conf_threshold, annotate))
+        except Exception:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            self._free_slots.put(slot)
+            raise
+        return future, slot, view
+
+    def collect(self, future, slot, view, out=None):
+        """
+        Wait for a submitted frame and return (detections, annotated_frame)
+
+        The annotated frame is copied out of the slot into `out` when given,
+        otherwise into a new array.
+        """
+        detections = self._result(future, slot)
+        try:
+            if out is None:
+                annotated_frame = view.copy()
+            else:
+                np.copyto(out, view)
+                annotated_frame = out
+        finally:
+            del view
+            self._free_slots.put(slot)
+        return detections, annotated_frame
+    
+    def _result(self, future, slot):
+        """
+        Wait for a request's result
+        
+        On a timeout the request is forgotten and its slot kept out of the
+        pool until the worker's late reply shows it is done with it.
+        """
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._pending_lock:
+                if self._pending.pop(future.request_id, None) is not None:
+                    self._abandoned[future.request_id] = slot
+                    slot = None
+            if slot is not None:
+                # The reply came in just now; the slot is free after all
+                self._free_slots.put(slot)
+            raise
+        except BaseException:
+            self._free_slots.put(slot)
+            raise
+
+    def detect(self, frame, copy=True, img_size=None, timings=None):
+        """
+        Detect garbage in a frame using the inference service
+
+        Args:
+            frame: OpenCV image (BGR format)
+            copy: Return a new array; pass False to write the annotations back into frame
+            img_size: Inference size for this frame (defaults to the workers' size)
+            timings: Optional dict filled with this call's stage timings
+
+        Returns:
+            detections: List of detection results
+            annotated_frame: Frame with bounding boxes
+        """
+        start = time.perf_counter()
+        detections, annotated_frame = self.collect(*self.submit(frame, img_size), out=None if copy else frame)
+        end = time.perf_counter()
+
+        metrics.INFERENCES.inc()
+        metrics.INFERENCE.observe(end - start)
+        self.last_timings = {'inference': (start, end)}
+        if timings is not None:
+            timings.update(self.last_timings)
+        return detections, annotated_frame
+
+    def predict(self, frame, img_size=None):
+        """
+        Raw detections of a frame, without annotation
+
+        Frames larger than a slot are shrunk to fit and the boxes scaled back;
+        inference runs at img_size anyway, so this costs no accuracy.
+
+        Returns:
+            (N, 6) array of [x1, y1, x2, y2, confidence, class] in frame coordinates
+        """
+        start = time.perf_counter()
+        scale = 1.0
+        if frame.nbytes > self.slot_size:
+            import cv2
+            scale = (self.slot_size / frame.nbytes) ** 0.5 * 0.99
+            height, width = frame.shape[:2]
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        future, slot, view = self.submit(frame, img_size, annotate=False)
+        del view
+        detections = self._result(future, slot)
+        self._free_slots.put(slot)
+        if scale != 1.0:
+            detections[:, :4] /= scale
+        end = time.perf_counter()
+
+        metrics.INFERENCES.inc()
+        metrics.INFERENCE.observe(end - start)
+        self.last_timings = {'inference': (start, end)}
+        return detections
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            with self._send_lock:
+                self._conn.send(('bye',))
+        except OSError:
+            pass
+        self._conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+
+def start_service(address=DEFAULT_ADDRESS, model_path=DEFAULT_MODEL, idle_timeout=AUTOSTART_IDLE_TIMEOUT):
+    """
+    Start the service as a detached background process
+
+    Its output goes to a log file next to the socket (or in the temp directory
+    for TCP addresses), whose path is printed.
+
+    Returns:
+        subprocess.Popen of the service
+    """
+    parsed = parse_address(address)
+    log_path = (parsed + '.log' if isinstance(parsed, str)
+                else os.path.join(tempfile.gettempdir(), 'cleansight-inference.log'))
+    command = [sys.executable, os.path.abspath(__file__), '--address', address,
+               '--model', os.path.abspath(model_path or DEFAULT_MODEL)]
+    if idle_timeout:
+        command += ['--idle-timeout', str(idle_timeout)]
+    options = {'start_new_session': True} if os.name == 'posix' else {
+        'creationflags': getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)}
+    print(f"Starting inference service on {address} (log: {log_path})")
+    with open(log_path, 'ab') as log:
+        # Run from the repository so yolov5/ and model/ resolve as they do for the app
+        return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), **options)
+
+
+def connect(address=DEFAULT_ADDRESS, model_path=None, conf_threshold=None, autostart=True,
+            idle_timeout=AUTOSTART_IDLE_TIMEOUT, **kwargs):
+    """
+    Connect to the service, starting it first if nothing is listening
+
+    This is what the CLIs' --daemon option uses: the first run starts the
+    service and pays for loading the model, later runs reuse it while it is
+    warm. A service started here exits after idle_timeout seconds without
+    clients.
+
+    Args:
+        address: Service address
+        model_path: Weights to run (loaded by the service if it has not yet)
+        conf_threshold: Confidence threshold for this client's frames
+        autostart: Start the service when none is running
+        kwargs: Passed on to InferenceClient
+
+    Returns:
+        InferenceClient
+    """
+    def attempt():
+        return InferenceClient(address, model_path=model_path, conf_threshold=conf_threshold, **kwargs)
+
+    try:
+        return attempt()
+    except (FileNotFoundError, ConnectionRefusedError):
+        if not autostart:
+            raise
+
+    process = start_service(address, model_path, idle_timeout)
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        try:
+            return attempt()
+        except (FileNotFoundError, ConnectionRefusedError):
+            # A service started by a concurrent run may have won the socket instead
+            if process.poll() is not None:
+                raise RuntimeError(f"Inference service exited with code {process.returncode}; see its log")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Inference service did not start on {address} in {START_TIMEOUT}s")
+            time.sleep(0.5)
+
+
+class ServiceDetector:
+    """
+    Mixin that moves a detector's model into the inference service
+
+    Put it in front of a GarbageDetector class (detection.py, direct_detect.py,
+    detect.py): predict() goes to the service, while class mapping and drawing
+    are the detector's own. The constructor connects instead of loading a model.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, model_path=DEFAULT_MODEL, conf_threshold=0.25, img_size=640):
+        """
+        Connect to the service, starting it if it is not running
+
+        Args:
+            address: Inference service address
+            model_path: Weights to run, loaded by the service on first use
+            conf_threshold: Confidence threshold for detections
+            img_size: Default inference size
+        """
+        self.conf_threshold = conf_threshold
+        self.img_size = img_size
+        self.client = connect(address, model_path, conf_threshold, slots=1)
+        self.class_names = self.client.class_names
+        self.model = None
+
+    def predict(self, frame, img_size=None, timings=None):
+        """Raw [x1, y1, x2, y2, confidence, class] rows of a frame, from the service"""
+        detections = self.client.predict(frame, img_size or self.img_size)
+        self.last_timings = dict(self.client.last_timings)
+        if timings is not None:
+            # The service does all three stages; they show up as one inference span
+            start, end = self.last_timings['inference']
+            timings.update(preprocess=(start, start), inference=(start, end), postprocess=(end, end))
+        return detections
+
+    def close(self):
+        self.client.close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Run the CleanSight inference service')
+    parser.add_argument('--address', type=str, default=DEFAULT_ADDRESS,
+                        help='Unix socket path or host:port to listen on')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of inference worker processes')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL,
+                        help='Path to the model weights loaded at start-up (clients may ask for others)')
+    parser.add_argument('--conf', type=float, default=0.25,
+                        help='Default confidence threshold for detections')
+    parser.add_argument('--max-models', type=int, default=DEFAULT_MAX_MODELS,
+                        help='Models kept loaded at once')
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help='Exit after this many seconds without clients')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    server = InferenceServer(args.address, args.workers, args.model, args.conf, default_authkey(),
+                             args.max_models, args.idle_timeout)
+    try:
+        server.serve_forever()
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
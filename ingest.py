@@ -0,0 +1,654 @@
+#!/usr/bin/env python
+# Watch-folder ingest: detects garbage in images as field devices drop them into directories
+
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+import metrics
+import inference_service
+from detection import GarbageDetector, contains_garbage, format_detections
+from snapshot_writer import SnapshotWriter, SNAPSHOT_DIR
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# A file is taken once its size and modification time have not changed for this long
+# (or straight away when inotify saw the writer close it)
+SETTLE_SECONDS = 2.0
+
+# Files that still look truncated after this long are processed anyway
+INCOMPLETE_TIMEOUT = 60.0
+
+POLL_INTERVAL = 2.0
+
+# With inotify, the directories are still rescanned this often to pick up
+# anything it cannot see (e.g. files written by another host on a network share)
+RESCAN_INTERVAL = 60.0
+
+DEFAULT_BATCH_SIZE = 8
+
+# A partial batch is run once its oldest image has waited this long
+BATCH_WAIT = 0.5
+
+# Seconds between checkpoint writes; a crash reprocesses at most this much work
+CHECKPOINT_INTERVAL = 5.0
+
+# Seconds between attempts to deliver alerts the app did not accept
+ALERT_RETRY = 30.0
+
+DEFAULT_CHECKPOINT = '.ingest_checkpoint.json'
+DEFAULT_LOG = 'ingest_results.jsonl'
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct('iIII')
+
+
+def is_image(path):
+    """Image files by extension; hidden names (e.g. rsync's .name.XXXXXX temporaries) are skipped"""
+    name = os.path.basename(path)
+    return not name.startswith('.') and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def scan(directory, recursive=True):
+    """Yield the image files under a directory"""
+    if recursive:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if is_image(path):
+                    yield path
+    elif os.path.isdir(directory):
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and is_image(entry.path):
+                    yield entry.path
+
+
+def looks_complete(path):
+    """
+    Cheap check that a JPEG or PNG has been written to the end
+
+    JPEGs end with an EOI marker and PNGs with an IEND chunk; other formats
+    are assumed complete once their size is stable.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 32))
+            tail = f.read()
+    except OSError:
+        return False
+    if head.startswith(b'\xff\xd8'):
+        return b'\xff\xd9' in tail
+    if head.startswith(b'\x89PNG'):
+        return b'IEND' in tail
+    return True
+
+
+class InotifyWatcher:
+    """
+    Directory watcher on Linux inotify
+
+    Reports files as they are created, closed after writing or moved into
+    a watched directory. New subdirectories are watched as they appear and
+    reported for a rescan, since files can land in them before the watch is
+    added; a queue overflow asks for a rescan of every root.
+    """
+
+    def __init__(self, roots, recursive=True):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.roots = list(roots)
+        self.recursive = recursive
+        self.watches = {}
+        for root in self.roots:
+            self.add_tree(root)
+
+    def add(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            print(f"Could not watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.watches[wd] = directory
+
+    def add_tree(self, root):
+        self.add(root)
+        if self.recursive:
+            for dirpath, dirnames, _ in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for dirname in dirnames:
+                    self.add(os.path.join(dirpath, dirname))
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds for changes
+
+        Returns:
+            (events, rescan): (path, written) pairs, where written means the
+            writer has closed the file or it was moved in complete, and the
+            directories that need a full scan
+        """
+        events, rescan = [], []
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return events, rescan
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return events, rescan
+
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan.extend(self.roots)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if self.recursive and not os.path.basename(path).startswith('.'):
+                    self.add_tree(path)
+                    rescan.append(path)
+            elif is_image(path):
+                events.append((path, bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO))))
+        return events, rescan
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher that rescans the directories every poll_interval seconds"""
+
+    def __init__(self, roots, poll_interval=POLL_INTERVAL, sleep=time.sleep, clock=time.monotonic):
+        self.roots = list(roots)
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.clock = clock
+        self._next = clock()
+
+    def read(self, timeout):
+        wait = self._next - self.clock()
+        if wait > timeout:
+            self.sleep(timeout)
+            return [], []
+        if wait > 0:
+            self.sleep(wait)
+        self._next = self.clock() + self.poll_interval
+        return [], list(self.roots)
+
+    def close(self):
+        pass
+
+
+def open_watcher(roots, recursive=True, poll=False, poll_interval=POLL_INTERVAL):
+    """inotify where available, polling otherwise (or when asked, e.g. for network shares)"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(roots, recursive)
+        except OSError as e:
+            print(f"inotify unavailable ({e}); polling every {poll_interval}s")
+    return PollingWatcher(roots, poll_interval)
+
+
+class Checkpoint:
+    """
+    Files already ingested, keyed by absolute path with their size and mtime
+
+    A file that is replaced (different size or mtime) is ingested again.
+    Saved atomically through a temporary file, so a crash leaves either the
+    old or the new checkpoint.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT):
+        self.path = path
+        self.files = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return
+        # Forget files that have since been removed, so the checkpoint does not grow forever
+        self.files = {path: tuple(entry) for path, entry in data.get('files', {}).items() if os.path.exists(path)}
+        self.dirty = len(self.files) != len(data.get('files', {}))
+
+    def done(self, path, size, mtime_ns):
+        return self.files.get(path) == (size, mtime_ns)
+
+    def mark(self, path, size, mtime_ns):
+        self.files[path] = (size, mtime_ns)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': 1, 'files': {path: list(entry) for path, entry in self.files.items()}}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+class _Pending:
+    def __init__(self, path, size, mtime_ns, changed_at, seen_at):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.changed_at = changed_at
+        self.seen_at = seen_at
+        self.written = False
+        self.ready_at = None
+        self.alert_pending = False
+
+
+class ServiceDetector(inference_service.ServiceDetector, GarbageDetector):
+    """GarbageDetector whose model runs in the shared inference service (see inference_service.py)"""
+
+    def detect_batch(self, frames, img_size=None):
+        # The service batches across clients itself; frames go one at a time
+        return [self._to_detections(self.predict(frame, img_size)) for frame in frames]
+
+
+class Ingestor:
+    """
+    Watches directories and runs new images through the detector in batches
+
+    Files are debounced before they are read: a file is ready once inotify
+    has seen its writer close it, or its size and mtime have been stable for
+    `settle` seconds, and in both cases a JPEG or PNG must also end with its
+    trailer. Ready files are batched into one detect_batch call. Each result
+    is appended to the results log (and fsynced) before the file is marked in
+    the checkpoint, so after a crash a file may be logged twice but is never
+    skipped. Garbage raises an alert in the app, at most one per directory
+    per alert_cooldown; alerts the app does not accept are retried, and
+    their files are not checkpointed until they are delivered.
+
+    Args:
+        roots: Directories to watch
+        detector: GarbageDetector (or ServiceDetector)
+        checkpoint: Checkpoint of files already ingested
+        results_log: JSON-lines file results are appended to (None to skip)
+        alerts_url: Base URL of the CleanSight app to raise alerts in (None to skip)
+        location: Alert location (default: the image's directory)
+        snapshots: SnapshotWriter for the annotated image attached to alerts
+        batch_size: Images per inference batch
+        img_size: Inference size (defaults to the detector's)
+        settle: Seconds a file must be unchanged before it is read
+        recursive: Watch subdirectories too
+        watcher: InotifyWatcher or PollingWatcher
+        alert_cooldown: Minimum seconds between alerts for one directory
+    """
+
+    def __init__(self, roots, detector, checkpoint, results_log=DEFAULT_LOG, alerts_url=None, location=None,
+                 snapshots=None, batch_size=DEFAULT_BATCH_SIZE, img_size=None, settle=SETTLE_SECONDS,
+                 recursive=True, watcher=None, alert_cooldown=300.0, clock=time.time):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.detector = detector
+        self.checkpoint = checkpoint
+        self.results_log = results_log
+        self.alerts_url = alerts_url.rstrip('/') if alerts_url else None
+        self.location = location
+        self.snapshots = snapshots
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.settle = settle
+        self.recursive = recursive
+        self.watcher = watcher or open_watcher(self.roots, recursive)
+        self.alert_cooldown = alert_cooldown
+        self.clock = clock
+
+        self.pending = {}
+        self.ready = []
+        self.unsent = []
+        self.counts = {'clean': 0, 'garbage': 0, 'failed': 0, 'alerts': 0}
+        self._last_alert = {}
+        self._last_rescan = clock()
+        self._last_save = clock()
+        self._next_retry = 0.0
+        self._log = open(results_log, 'a') if results_log else None
+        self.running = False
+
+    def track(self, path, written=False):
+        """Start (or keep) debouncing a file"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.pending.pop(path, None)
+            return
+        if self.checkpoint.done(path, stat.st_size, stat.st_mtime_ns):
+            return
+        if any(entry.path == path for entry in self.ready):
+            return
+        now = self.clock()
+        entry = self.pending.get(path)
+        if entry is None:
+            # Files that were already there are as settled as their mtime says
+            entry = self.pending[path] = _Pending(path, stat.st_size, stat.st_mtime_ns,
+                                                  min(now, stat.st_mtime), now)
+        elif (stat.st_size, stat.st_mtime_ns) != (entry.size, entry.mtime_ns):
+            entry.size, entry.mtime_ns, entry.changed_at = stat.st_size, stat.st_mtime_ns, now
+            entry.written = False
+        if written:
+            entry.written = True
+
+    def rescan(self, directories):
+        for directory in directories:
+            for path in scan(directory, self.recursive):
+                self.track(path)
+
+    def settle_pending(self):
+        """Move the files that are done being written to the ready list"""
+        now = self.clock()
+        for path, entry in list(self.pending.items()):
+            self.track(path)
+            entry = self.pending.get(path)
+            if entry is None:
+                continue
+            stable = entry.written or now - entry.changed_at >= self.settle
+            if not stable or (entry.size == 0 and now - entry.seen_at < INCOMPLETE_TIMEOUT):
+                continue
+            if not looks_complete(path) and now - entry.seen_at < INCOMPLETE_TIMEOUT:
+                # Closed early or still growing between stats; wait for more data
+                entry.written = False
+                continue
+            del self.pending[path]
+            entry.ready_at = now
+            self.ready.append(entry)
+        metrics.INGEST_PENDING.set(len(self.pending) + len(self.ready))
+
+    def process_batch(self):
+        batch, self.ready = self.ready[:self.batch_size], self.ready[self.batch_size:]
+        frames, loaded = [], []
+        for entry in batch:
+            frame = cv2.imread(entry.path)
+            if frame is None:
+                self.record(entry, None, error='could not read image')
+            else:
+                frames.append(frame)
+                loaded.append(entry)
+
+        if frames:
+            try:
+                results = self.detector.detect_batch(frames, self.img_size)
+            except Exception as e:
+                print(f"Detection failed for a batch of {len(frames)}: {e}")
+                results = [None] * len(frames)
+            for entry, frame, detections in zip(loaded, frames, results):
+                self.record(entry, detections, frame=frame, error=None if detections is not None else 'detection failed')
+
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+        for entry in batch:
+            if not entry.alert_pending:
+                self.checkpoint.mark(entry.path, entry.size, entry.mtime_ns)
+        metrics.INGEST_PENDING.set(len(self.pending) + len(self.ready))
+
+    def record(self, entry, detections, frame=None, error=None):
+        """Log one image's result and raise its alert"""
+        now = self.clock()
+        garbage = detections is not None and contains_garbage(detections, self.detector.conf_threshold)
+        outcome = 'failed' if detections is None else ('garbage' if garbage else 'clean')
+        self.counts[outcome] += 1
+        metrics.INGESTED.labels(outcome=outcome).inc()
+        metrics.INGEST_LAG.observe(max(0.0, now - entry.mtime_ns / 1e9))
+
+        result = {
+            'path': entry.path,
+            'size': entry.size,
+            'mtime': entry.mtime_ns / 1e9,
+            'processed_at': now,
+            'garbage': garbage,
+            'detections': format_detections(detections) if detections else [],
+        }
+        if error:
+            result['error'] = error
+            print(f"Failed to ingest {entry.path}: {error}")
+        if self._log is not None:
+            self._log.write(json.dumps(result) + '\n')
+        if garbage:
+            print(f"Garbage detected in {entry.path}")
+            self.alert(entry, detections, frame)
+
+    def alert(self, entry, detections, frame):
+        if self.alerts_url is None:
+            return
+        directory = os.path.dirname(entry.path)
+        now = self.clock()
+        last = self._last_alert.get(directory)
+        if last is not None and now - last < self.alert_cooldown:
+            return
+        self._last_alert[directory] = now
+
+        alert = {
+            'message': f"Garbage detected in {os.path.basename(entry.path)}",
+            'location': self.location or directory,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.mtime_ns / 1e9)),
+            'status': 'pending',
+            'source': 'ingest',
+        }
+        if self.snapshots is not None and frame is not None:
+            snapshot_path = self.snapshots.submit(self.detector.draw(frame, detections), camera_id=directory, force=True)
+            # The app serves it only when written under its own directory (run ingest from there)
+            relative = os.path.relpath(snapshot_path) if snapshot_path else '..'
+            if not relative.startswith('..'):
+                alert['image_path'] = '/' + relative.replace(os.sep, '/')
+        if not self.send(alert):
+            entry.alert_pending = True
+            self.unsent.append((entry, alert))
+
+    def send(self, alert):
+        request = urllib.request.Request(self.alerts_url + '/api/alerts', data=json.dumps(alert).encode(),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Could not raise alert at {self.alerts_url}: {e}")
+            return False
+        self.counts['alerts'] += 1
+        return True
+
+    def retry_alerts(self):
+        unsent, self.unsent = self.unsent, []
+        for index, (entry, alert) in enumerate(unsent):
+            if not self.send(alert):
+                # The app is still down; keep this and the rest for later
+                self.unsent.extend(unsent[index:])
+                break
+            entry.alert_pending = False
+            self.checkpoint.mark(entry.path, entry.size, entry.mtime_ns)
+
+    def step(self, timeout=1.0):
+        """One round of watching, debouncing, detecting and checkpointing"""
+        if self.pending or self.ready:
+            timeout = min(timeout, BATCH_WAIT / 2)
+        events, rescan = self.watcher.read(timeout)
+        for path, written in events:
+            self.track(path, written)
+        now = self.clock()
+        if isinstance(self.watcher, InotifyWatcher) and now - self._last_rescan >= RESCAN_INTERVAL:
+            rescan = self.roots
+        if rescan:
+            self.rescan(rescan)
+            self._last_rescan = now
+
+        self.settle_pending()
+        while len(self.ready) >= self.batch_size or (self.ready and now - self.ready[0].ready_at >= BATCH_WAIT):
+            self.process_batch()
+
+        if self.unsent and now >= self._next_retry:
+            self.retry_alerts()
+            self._next_retry = now + ALERT_RETRY
+        if now - self._last_save >= CHECKPOINT_INTERVAL:
+            self.checkpoint.save()
+            self._last_save = now
+
+    def run(self, once=False):
+        """
+        Ingest until stopped
+
+        Args:
+            once: Process what is in the directories now, then return
+        """
+        self.running = True
+        self.rescan(self.roots)
+        print(f"Watching {', '.join(self.roots)} ({len(self.pending)} images to ingest)")
+        try:
+            while self.running:
+                self.step()
+                if once and not self.pending and not self.ready:
+                    break
+        finally:
+            self.close()
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        if self.unsent:
+            print(f"{len(self.unsent)} alerts not delivered; their images will be ingested again on restart")
+        self.checkpoint.save()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self.snapshots is not None:
+            self.snapshots.close()
+        self.watcher.close()
+        print(f"Ingested: {self.counts['clean']} clean, {self.counts['garbage']} with garbage, "
+              f"{self.counts['failed']} failed, {self.counts['alerts']} alerts raised")
+
+
+def serve_metrics(port):
+    """Serve the Prometheus metrics on a background thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Detect garbage in images as they arrive in watched directories')
+    parser.add_argument('dirs', nargs='+', help='Directories to watch')
+    parser.add_argument('--checkpoint', type=str, default=DEFAULT_CHECKPOINT,
+                        help='File recording the images already ingested')
+    parser.add_argument('--log', type=str, default=DEFAULT_LOG,
+                        help="JSON-lines results log ('' to disable)")
+    parser.add_argument('--alerts', type=str, default=None,
+                        help='Base URL of the CleanSight app to raise alerts in, e.g. http://localhost:5000')
+    parser.add_argument('--location', type=str, default=None,
+                        help='Location given to alerts (default: the image directory)')
+    parser.add_argument('--alert-cooldown', type=float, default=300.0,
+                        help='Minimum seconds between alerts for one directory')
+    parser.add_argument('--snapshots', type=str, default=SNAPSHOT_DIR,
+                        help='Where annotated images attached to alerts are written')
+    parser.add_argument('--model', type=str, default=inference_service.DEFAULT_MODEL,
+                        help='Path to the model weights')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold for detections')
+    parser.add_argument('--img-size', type=int, default=640, help='Inference size')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Images per inference batch')
+    parser.add_argument('--daemon', type=str, nargs='?', const=inference_service.DEFAULT_ADDRESS, default=None,
+                        help='Detect in the shared inference service at this address (see inference_service.py)')
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help='Seconds a file must be unchanged before it is read')
+    parser.add_argument('--poll', action='store_true',
+                        help='Poll instead of using inotify (needed for network shares written by other hosts)')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds between polls')
+    parser.add_argument('--no-recursive', action='store_true', help='Do not watch subdirectories')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port')
+    parser.add_argument('--once', action='store_true', help='Ingest what is there now and exit')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    for directory in args.dirs:
+        if not os.path.isdir(directory):
+            print(f"Error: {directory} is not a directory")
+            sys.exit(1)
+
+    if args.daemon:
+        detector = ServiceDetector(args.daemon, args.model, args.conf, args.img_size)
+    else:
+        detector = GarbageDetector(args.model, args.conf, args.img_size)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    roots = [os.path.abspath(directory) for directory in args.dirs]
+    recursive = not args.no_recursive
+    ingestor = Ingestor(roots, detector, Checkpoint(args.checkpoint), results_log=args.log or None,
+                        alerts_url=args.alerts, location=args.location,
+                        snapshots=SnapshotWriter(args.snapshots) if args.alerts else None,
+                        batch_size=args.batch_size, settle=args.settle, recursive=recursive,
+                        watcher=open_watcher(roots, recursive, args.poll, args.poll_interval),
+                        alert_cooldown=args.alert_cooldown)
+    try:
+        ingestor.run(once=args.once)
+    except KeyboardInterrupt:
+        print("Stopping ingest")
+    finally:
+        if args.daemon:
+            detector.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+import bisect
+import threading
+import time
+
+# Default latency buckets in seconds (1ms .. 2.5s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _Metric:
+    """Base class for metrics with optional labels"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+        if registry is None:
+            registry = REGISTRY
+        if registry is not False:
+            registry.register(self)
+
+    def labels(self, **labels):
+        """
+        Get the child metric for a combination of label values
+
+        Children are cached, so hot paths should look them up once and keep
+        the returned object around.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _samples(self):
+        """Yield (labels dict, child) pairs, including the unlabelled metric"""
+        if not self.labelnames:
+            yield {}, self
+        for key, child in sorted(self._children.items()):
+            yield dict(zip(self.labelnames, key)), child
+
+    def render(self):
+        help_text = self.documentation.replace('\\', '\\\\').replace('\n', '\\n')
+        lines = [f"# HELP {self.name} {help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, child in self._samples():
+            lines.extend(child._render_values(self.name, labels))
+        return lines
+
+
+def _escape(value):
+    """Escape a label value as the Prometheus text format requires"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self._value = 0.0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation, registry=False)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def _render_values(self, name, labels):
+        return [f"{name}_total{_format_labels(labels)} {_format_value(self._value)}"]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self._value = 0.0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation, registry=False)
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def _render_values(self, name, labels):
+        return [f"{name}{_format_labels(labels)} {_format_value(self._value)}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets, registry=False)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self):
+        """Context manager observing the duration of the block in seconds"""
+        return _Timer(self)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def _render_values(self, name, labels):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            bucket_labels = dict(labels, le=_format_value(bound))
+            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """Collection of metrics rendered together at /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Metrics shared by the detector and the web application
+STAGE_LATENCY = Histogram(
+    'cleansight_stage_seconds',
+    'Time spent in each stage of the frame pipeline',
+    labelnames=('stage',)
+)
+FRAMES = Counter('cleansight_frames', 'Frames read from the camera')
+DROPPED_FRAMES = Counter('cleansight_dropped_frames', 'Camera reads that failed or frames that could not be processed')
+INFERENCES = Counter('cleansight_inferences', 'Frames passed through the detector')
+DETECTIONS = Counter('cleansight_detections', 'Objects detected', labelnames=('name',))
+ALERTS = Counter('cleansight_alerts', 'Alerts raised', labelnames=('source',))
+VIEWERS = Gauge('cleansight_viewers', 'Clients currently streaming /video_feed')
+SOCKET_CLIENTS = Gauge('cleansight_socket_clients', 'Connected Socket.IO clients')
+SOURCE_CONNECTED = Gauge('cleansight_sources_connected', 'Frame sources currently delivering frames')
+SOURCE_RECONNECTS = Counter('cleansight_source_reconnects', 'Frame source failures followed by a reconnect attempt')
+SKIPPED_FRAMES = Counter('cleansight_source_skipped_frames', 'Captured frames replaced by a newer one before being processed')
+CAMERA_MODE = Gauge('cleansight_camera_mode', 'Camera state: 0 stopped, 1 alert-only (no viewers), 2 live', labelnames=('camera',))
+IDLE_CHECKS = Counter('cleansight_idle_checks', 'Alert-only detections run while nobody was watching', labelnames=('camera',))
+CASCADE = Counter('cleansight_cascade_frames', 'Presence classifier outcomes (see cascade.py)', labelnames=('outcome',))
+GOVERNOR_LEVEL = Gauge('cleansight_governor_level', 'Load governor quality level, 0 = full size and rate (see governor.py)', labelnames=('camera',))
+GOVERNOR_IMG_SIZE = Gauge('cleansight_governor_img_size', 'Inference size chosen by the load governor', labelnames=('camera',))
+GOVERNOR_INTERVAL = Gauge('cleansight_governor_detect_interval', 'Detection interval chosen by the load governor, in frames or multiples of the scheduled interval', labelnames=('camera',))
+GOVERNOR_LATENCY = Gauge('cleansight_governor_latency_seconds', 'Smoothed detection latency seen by the load governor', labelnames=('camera',))
+GOVERNOR_QUEUE = Gauge('cleansight_governor_queue_depth', 'Inference executor queue depth at the last detection', labelnames=('camera',))
+GOVERNOR_ADJUSTMENTS = Counter('cleansight_governor_adjustments', 'Load governor level changes', labelnames=('camera', 'direction'))
+SCHEDULED = Counter('cleansight_scheduled_detections', 'Scheduled detections per camera: served, late (over a slot behind) or replaced by a newer frame (see scheduler.py)', labelnames=('camera', 'outcome'))
+SCHEDULER_TARGET_RATE = Gauge('cleansight_scheduler_target_rate', 'Detections per second the scheduler aims for, after boosts', labelnames=('camera',))
+SCHEDULER_RATE = Gauge('cleansight_scheduler_achieved_rate', 'Detections per second achieved over the last 10 seconds', labelnames=('camera',))
+CLIPS = Counter('cleansight_clips', 'Event clips by outcome: written, dropped (writer behind), failed or evicted (disk quota)', labelnames=('outcome',))
+CLIP_BUFFER = Gauge('cleansight_clip_buffer_bytes', 'Encoded frames held for pre/post-roll clips', labelnames=('camera',))
+SNAPSHOTS = Counter('cleansight_snapshots', 'Snapshots by outcome: written, rate_limited, dropped (queue full), failed or evicted (disk quota)', labelnames=('outcome',))
+SNAPSHOT_QUEUE = Gauge('cleansight_snapshot_queue', 'Snapshots waiting for the background writer')
+SNAPSHOT_DISK_BYTES = Gauge('cleansight_snapshot_disk_bytes', 'Bytes of snapshots kept under the disk quota')
+SCHEDULER_UTILIZATION = Gauge('cleansight_scheduler_utilization', 'Demanded share of detector capacity; above 1 cameras fall short of their target rates')
+INGESTED = Counter('cleansight_ingested_images', 'Watch-folder images by outcome: clean, garbage or failed (see ingest.py)', labelnames=('outcome',))
+INGEST_PENDING = Gauge('cleansight_ingest_pending', 'Watch-folder images seen but not processed yet (settling or queued)')
+ALERT_BULK_LINES = Counter('cleansight_alert_bulk_lines', 'Lines of bulk alert requests by outcome: applied or rejected (with their batch)', labelnames=('outcome',))
+EDGE_EVENTS = Counter('cleansight_edge_events', 'Edge detection events by kind: made by edge_agent.py, received by app.py', labelnames=('kind',))
+EDGE_BATCHES = Counter('cleansight_edge_batches', 'Edge event batches by outcome: sent, failed (retried), rejected or dropped', labelnames=('outcome',))
+EDGE_SPOOL_BYTES = Gauge('cleansight_edge_spool_bytes', 'Bytes of event batches waiting in the edge agent spool')
+INGEST_LAG = Histogram('cleansight_ingest_lag_seconds', 'Seconds from an image being written to its result being recorded',
+                       buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900))
+
+CAPTURE = STAGE_LATENCY.labels(stage='capture')
+PREPROCESS = STAGE_LATENCY.labels(stage='preprocess')
+INFERENCE = STAGE_LATENCY.labels(stage='inference')
+POSTPROCESS = STAGE_LATENCY.labels(stage='postprocess')
+DRAW = STAGE_LATENCY.labels(stage='draw')
+CLASSIFY = STAGE_LATENCY.labels(stage='classify')
+ENCODE = STAGE_LATENCY.labels(stage='encode')
+
+
+def render():
+    """Render the default registry"""
+    return REGISTRY.render()
@@ -0,0 +1,84 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def configure_async_mode(async_mode=None):
+    """
+    Monkey-patch the standard library for the chosen Socket.IO async mode
+
+    Must run before sockets, Flask or anything that opens connections or
+    binds threading names at import time is loaded, so app.py calls it first
+    thing. Importing the threading and concurrent.futures modules earlier,
+    as this module does, is fine: the patch replaces their attributes in
+    place, and no lock or thread is created here until a BlockingExecutor is
+    built.
+
+    Args:
+        async_mode: 'eventlet', 'gevent', 'threading' or None to read
+            CLEANSIGHT_ASYNC_MODE (None lets Flask-SocketIO pick)
+
+    Returns:
+        str or None: The async mode to pass to SocketIO
+    """
+    if async_mode is None:
+        async_mode = os.environ.get('CLEANSIGHT_ASYNC_MODE') or None
+
+    if async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    return async_mode
+
+
+class BlockingExecutor:
+    """
+    Runs blocking OpenCV/torch work without stalling the Socket.IO event loop
+
+    Under eventlet the work goes to eventlet's native thread pool (tpool) and
+    under gevent to the hub's thread pool, so only the calling green thread
+    waits. Under threading, inference is funnelled through a small dedicated
+    pool so viewers don't run the model concurrently, and other blocking calls
+    run inline on the request thread.
+    """
+
+    def __init__(self, async_mode, inference_workers=1):
+        self.async_mode = async_mode
+        self.inference_workers = inference_workers
+        self._inference_pool = None
+        self._lock = threading.Lock()
+        # Created after monkey-patching, so this is a green semaphore under
+        # eventlet/gevent and bounds how many viewers run the model at once
+        self._inference_slots = threading.BoundedSemaphore(inference_workers)
+
+    def _pool(self):
+        if self._inference_pool is None:
+            with self._lock:
+                if self._inference_pool is None:
+                    self._inference_pool = ThreadPoolExecutor(max_workers=self.inference_workers,
+                                                              thread_name_prefix='inference')
+        return self._inference_pool
+
+    def run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking call (camera read, JPEG encode, disk I/O)"""
+        if self.async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(fn, *args, **kwargs)
+        if self.async_mode in ('gevent', 'gevent_uwsgi'):
+            from gevent import get_hub
+            return get_hub().threadpool.apply(fn, args, kwargs)
+        return fn(*args, **kwargs)
+
+    def run_inference(self, fn, *args, **kwargs):
+        """Run a model call on the dedicated inference executor"""
+        if self.async_mode in ('eventlet', 'gevent', 'gevent_uwsgi'):
+            with self._inference_slots:
+                return self.run_blocking(fn, *args, **kwargs)
+        return self._pool().submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        if self._inference_pool is not None:
+            self._inference_pool.shutdown(wait=False)
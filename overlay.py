@@ -0,0 +1,157 @@
+import time
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class Sprite:
+    """Pre-rasterized overlay: a color patch, its alpha coverage and its offset from the anchor point"""
+
+    __slots__ = ('patch', 'premultiplied', 'inverse_alpha', 'dx', 'dy', 'opaque')
+
+    def __init__(self, patch, alpha, dx, dy):
+        self.patch = patch
+        self.dx = dx
+        self.dy = dy
+        self.opaque = bool((alpha == 255).all())
+
+        # Blending becomes frame * (255 - alpha) / 255 + patch * alpha / 255,
+        # two saturating OpenCV calls with the second term precomputed
+        weight = alpha.astype(np.float32)[..., None] / 255.0
+        self.premultiplied = np.rint(patch * weight).astype(np.uint8)
+        self.inverse_alpha = np.repeat(255 - alpha[..., None], 3, axis=2)
+
+
+class OverlayRenderer:
+    """
+    Draws boxes, labels and status text with cached text sprites
+
+    cv2.putText rasterizes the Hershey glyph strokes on every call. Here each
+    distinct (text, style) is rasterized once into a color patch plus alpha
+    coverage, and later frames only alpha-blit it, which matches putText at
+    the same position to within rounding. The timestamp sprite is only
+    rebuilt when the displayed second changes.
+    """
+
+    def __init__(self, max_sprites=1024):
+        self.max_sprites = max_sprites
+        self._sprites = {}
+        self._timestamp_key = None
+        self._timestamp_sprite = None
+
+    def _cached(self, key, build):
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            if len(self._sprites) >= self.max_sprites:
+                self._sprites.clear()
+            sprite = build()
+            self._sprites[key] = sprite
+        return sprite
+
+    @staticmethod
+    def _build(text, text_color, scale, thickness, text_dy=0, fill_color=None, fill_top=0, fill_width=None):
+        """
+        Rasterize text (and an optional filled box behind it) around an anchor point
+
+        The text baseline starts at (0, text_dy) relative to the anchor. The
+        optional box spans from (0, fill_top) to (fill_width, 0).
+        """
+        (tw, th), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = thickness + 2
+        if fill_width is None:
+            fill_width = tw
+
+        x_min = -pad
+        y_min = min(fill_top, text_dy - th - pad) if fill_color is not None else text_dy - th - pad
+        x_max = max(fill_width, tw) + pad
+        y_max = max(0, text_dy + baseline + pad)
+        width, height = x_max - x_min + 1, y_max - y_min + 1
+
+        origin = (-x_min, text_dy - y_min)
+
+        # Glyph coverage, including anti-aliased edges when putText produces them
+        coverage = np.zeros((height, width), dtype=np.uint8)
+        cv2.putText(coverage, text, origin, FONT, scale, 255, thickness)
+        text_alpha = coverage.astype(np.float32)[..., None] / 255.0
+
+        base = np.zeros((height, width, 3), dtype=np.float32)
+        alpha = coverage.copy()
+        if fill_color is not None:
+            fill = np.zeros((height, width), dtype=np.uint8)
+            cv2.rectangle(fill, (-x_min, fill_top - y_min), (fill_width - x_min, -y_min), 255, -1)
+            base[fill > 0] = fill_color
+            alpha = np.maximum(alpha, fill)
+
+        # Text composited over the fill inside the box, plain text color outside it
+        outside = (alpha == coverage)[..., None]
+        base = np.where(outside, np.float32(text_color), base)
+        patch = base + (np.float32(text_color) - base) * text_alpha
+        patch = np.clip(np.rint(patch), 0, 255).astype(np.uint8)
+
+        return Sprite(patch, alpha, x_min, y_min)
+
+    def blit(self, frame, sprite, x, y):
+        """Alpha-blend a sprite onto the frame with its anchor at (x, y), clipped to the frame"""
+        x0, y0 = x + sprite.dx, y + sprite.dy
+        h, w = sprite.patch.shape[:2]
+        fx0, fy0 = max(x0, 0), max(y0, 0)
+        fx1, fy1 = min(x0 + w, frame.shape[1]), min(y0 + h, frame.shape[0])
+        if fx0 >= fx1 or fy0 >= fy1:
+            return
+
+        sx0, sy0 = fx0 - x0, fy0 - y0
+        sx1, sy1 = sx0 + (fx1 - fx0), sy0 + (fy1 - fy0)
+        roi = frame[fy0:fy1, fx0:fx1]
+        if sprite.opaque:
+            roi[:] = sprite.patch[sy0:sy1, sx0:sx1]
+        else:
+            cv2.multiply(roi, sprite.inverse_alpha[sy0:sy1, sx0:sx1], dst=roi, scale=1 / 255.0)
+            cv2.add(roi, sprite.premultiplied[sy0:sy1, sx0:sx1], dst=roi)
+
+    def text(self, frame, text, org, color, scale=0.7, thickness=2):
+        """Equivalent of cv2.putText(frame, text, org, FONT_HERSHEY_SIMPLEX, scale, color, thickness)"""
+        color = tuple(color)
+        sprite = self._cached(('text', text, color, scale, thickness),
+                              lambda: self._build(text, color, scale, thickness))
+        self.blit(frame, sprite, org[0], org[1])
+
+    def label(self, frame, text, org, color, text_color=(255, 255, 255), scale=0.5, thickness=2,
+              box_height=None, text_offset=5):
+        """
+        Draw a label on a filled background above org (the box's top-left corner)
+
+        Args:
+            box_height: Height of the filled background (default: text height + text_offset)
+            text_offset: Distance of the text baseline above org
+        """
+        color, text_color = tuple(color), tuple(text_color)
+
+        def build():
+            (tw, th), _ = cv2.getTextSize(text, FONT, scale, thickness)
+            height = box_height if box_height is not None else th + text_offset
+            return self._build(text, text_color, scale, thickness, text_dy=-text_offset,
+                               fill_color=color, fill_top=-height, fill_width=tw)
+
+        sprite = self._cached(('label', text, color, text_color, scale, thickness, box_height, text_offset), build)
+        self.blit(frame, sprite, org[0], org[1])
+
+    def timestamp(self, frame, org, color, scale=0.7, thickness=2, fmt="%Y-%m-%d %H:%M:%S"):
+        """Draw the current time, formatting it only when the second changes"""
+        key = (int(time.time()), tuple(color), scale, thickness, fmt)
+        if key != self._timestamp_key:
+            # Kept outside the sprite cache: the previous second is never needed again
+            text = time.strftime(fmt, time.localtime(key[0]))
+            self._timestamp_sprite = self._build(text, key[1], scale, thickness)
+            self._timestamp_key = key
+        self.blit(frame, self._timestamp_sprite, org[0], org[1])
+
+    def box(self, frame, bbox, color, thickness=2):
+        """Draw a bounding box rectangle"""
+        x1, y1, x2, y2 = bbox
+        cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, thickness)
+
+
+# Shared renderer so the sprite cache is reused across frames and callers
+renderer = OverlayRenderer()
@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+import torch
+import torchvision
+
+# Padding value used by YOLOv5's letterbox
+PAD_VALUE = 114
+
+
+def letterbox_shape(height, width, size=640, stride=32):
+    """
+    Compute the letterboxed input shape for an image, matching YOLOv5 AutoShape
+
+    Args:
+        height: Source image height
+        width: Source image width
+        size: Target size of the longest side
+        stride: Model stride the padded shape must be divisible by
+
+    Returns:
+        (gain, (new_h, new_w), (pad_top, pad_left), (input_h, input_w))
+    """
+    gain = size / max(height, width)
+    input_h = int(np.ceil(height * gain / stride) * stride)
+    input_w = int(np.ceil(width * gain / stride) * stride)
+
+    gain = min(input_h / height, input_w / width)
+    new_h, new_w = int(round(height * gain)), int(round(width * gain))
+    pad_top = int(round((input_h - new_h) / 2 - 0.1))
+    pad_left = int(round((input_w - new_w) / 2 - 0.1))
+    return gain, (new_h, new_w), (pad_top, pad_left), (input_h, input_w)
+
+
+class _LetterboxBuffers:
+    """Preallocated buffers for one (source shape, size) combination"""
+
+    def __init__(self, height, width, size, stride):
+        self.gain, (new_h, new_w), (top, left), (input_h, input_w) = letterbox_shape(height, width, size, stride)
+        self.pad = (left, top)
+        self.shape = (height, width)
+
+        # Resize target, skipped when the frame already has the right size
+        self.resized = None
+        if (new_h, new_w) != (height, width):
+            self.resized = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        self.new_size = (new_w, new_h)
+
+        # Model input; the border is filled once and never touched again
+        self.input = np.full((1, 3, input_h, input_w), PAD_VALUE / 255.0, dtype=np.float32)
+        self.region = self.input[0, :, top:top + new_h, left:left + new_w]
+        self.tensor = torch.from_numpy(self.input)
+
+
+class LetterboxPreprocessor:
+    """
+    Letterboxes frames straight into reused model input tensors
+
+    The frame is resized into a preallocated uint8 buffer, then a single numpy
+    pass reverses the channels (BGR to RGB), transposes HWC to CHW, converts
+    to float and normalizes into the interior of a preallocated float buffer
+    shared with the returned tensor. No per-frame arrays are allocated.
+
+    The returned tensor is overwritten by the next call with a frame of the
+    same shape, so it must be consumed (or copied) before then.
+    """
+
+    def __init__(self, stride=32, max_cached=4):
+        self.stride = stride
+        self.max_cached = max_cached
+        self._buffers = {}
+
+    def __call__(self, image, size=640, bgr=True):
+        """
+        Prepare an image for inference
+
+        Args:
+            image: HWC uint8 image
+            size: Target size of the longest side
+            bgr: True if the image is in OpenCV's BGR order
+
+        Returns:
+            tensor: (1, 3, H, W) float32 tensor in [0, 1], RGB
+            meta: Dictionary with 'gain', 'pad' and 'shape' for scale_boxes()
+        """
+        height, width = image.shape[:2]
+        key = (height, width, size)
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            if len(self._buffers) >= self.max_cached:
+                self._buffers.pop(next(iter(self._buffers)))
+            buffers = _LetterboxBuffers(height, width, size, self.stride)
+            self._buffers[key] = buffers
+
+        source = image
+        if buffers.resized is not None:
+            source = cv2.resize(image, buffers.new_size, dst=buffers.resized, interpolation=cv2.INTER_LINEAR)
+
+        channels = source[..., ::-1] if bgr else source
+        np.multiply(channels.transpose(2, 0, 1), np.float32(1 / 255.0), out=buffers.region, casting='unsafe')
+
+        return buffers.tensor, {'gain': buffers.gain, 'pad': buffers.pad, 'shape': buffers.shape}
+
+
+def scale_boxes(detections, meta):
+    """
+    Map xyxy boxes from letterboxed input coordinates back to the source image (in place)
+
+    Args:
+        detections: (N, >=4) tensor with xyxy in the first four columns
+        meta: Metadata returned by LetterboxPreprocessor
+    """
+    left, top = meta['pad']
+    height, width = meta['shape']
+    detections[:, [0, 2]] -= left
+    detections[:, [1, 3]] -= top
+    detections[:, :4] /= meta['gain']
+    detections[:, [0, 2]] = detections[:, [0, 2]].clamp(0, width)
+    detections[:, [1, 3]] = detections[:, [1, 3]].clamp(0, height)
+    return detections
+
+
+def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, classes=None, max_det=1000):
+    """
+    Class-aware NMS on raw YOLOv5 output
+
+    Args:
+        prediction: (batch, boxes, 5 + nc) tensor with xywh, objectness and class scores
+        conf_thres: Minimum objectness * class score
+        iou_thres: IoU threshold for suppression
+        classes: Optional list of class indices to keep
+        max_det: Maximum detections per image
+
+    Returns:
+        list of (N, 6) tensors [x1, y1, x2, y2, confidence, class] per image
+    """
+    output = []
+    for pred in prediction:
+        pred = pred[pred[:, 4] > conf_thres]
+        if not len(pred):
+            output.append(torch.zeros((0, 6), device=prediction.device))
+            continue
+
+        conf, cls = (pred[:, 5:] * pred[:, 4:5]).max(1, keepdim=True)
+        keep = conf.view(-1) > conf_thres
+        if classes is not None:
+            keep &= (cls.view(-1, 1) == torch.tensor(classes, device=cls.device)).any(1)
+        pred, conf, cls = pred[keep], conf[keep], cls[keep]
+
+        boxes = torch.empty_like(pred[:, :4])
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+
+        index = torchvision.ops.batched_nms(boxes, conf.view(-1), cls.view(-1), iou_thres)[:max_det]
+        output.append(torch.cat((boxes[index], conf[index], cls[index].float()), 1))
+    return output
+
+
+def raw_prediction(output):
+    """Extract the prediction tensor from whatever a YOLOv5 model returned"""
+    if isinstance(output, (list, tuple)):
+        return output[0]
+    return output
@@ -0,0 +1,298 @@
+# Deadline-aware fair scheduling of detections across cameras sharing one detector
+
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+import metrics
+
+# Target seconds between detections of a camera at priority 1
+DEFAULT_INTERVAL = 0.2
+
+# Priority multiplier while a camera has had a hit within DETECTION_BOOST_WINDOW seconds
+DETECTION_BOOST = 2.0
+DETECTION_BOOST_WINDOW = 30.0
+
+# Priority multiplier while a camera has shown motion within MOTION_BOOST_WINDOW seconds
+MOTION_BOOST = 1.5
+MOTION_BOOST_WINDOW = 5.0
+
+# Mean absolute difference (0-255) between downscaled grey frames that counts as motion
+MOTION_THRESHOLD = 6.0
+MOTION_SIZE = (64, 36)
+
+# Window over which achieved detection rates are measured
+RATE_WINDOW = 10.0
+
+
+def _motion_thumbnail(frame):
+    """Tiny grey copy of a frame for cheap motion checks"""
+    small = cv2.resize(frame, MOTION_SIZE, interpolation=cv2.INTER_NEAREST)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+class _Request:
+    def __init__(self, camera, deadline, submitted, queue_depth):
+        self.camera = camera
+        self.deadline = deadline
+        self.submitted = submitted
+        self.queue_depth = queue_depth
+        self.replaced = False
+
+
+class ScheduledCamera:
+    """
+    Scheduling state of one camera
+
+    Args:
+        camera_id: Name used in metrics and status
+        interval: Target seconds between detections at priority 1
+        priority: Static weight; a camera at priority 2 is detected twice as often
+        governor: Optional Governor whose interval multiplier stretches the target
+            interval and which is told every detection's latency
+    """
+
+    def __init__(self, camera_id, interval=DEFAULT_INTERVAL, priority=1.0, governor=None, clock=time.perf_counter):
+        self.camera_id = str(camera_id)
+        self.interval = interval
+        self.priority = priority
+        self.governor = governor
+        self.clock = clock
+
+        self.next_deadline = self.registered = clock()
+        self.request = None
+        self.running = False
+        self.last_hit = None
+        self.last_motion = None
+        self.served = 0
+        self.late = 0
+        self.replaced = 0
+        self._thumbnail = None
+        self._served_at = deque()
+
+        labels = {'camera': self.camera_id}
+        self._served_counter = metrics.SCHEDULED.labels(camera=self.camera_id, outcome='served')
+        self._late_counter = metrics.SCHEDULED.labels(camera=self.camera_id, outcome='late')
+        self._replaced_counter = metrics.SCHEDULED.labels(camera=self.camera_id, outcome='replaced')
+        self._target_gauge = metrics.SCHEDULER_TARGET_RATE.labels(**labels)
+        self._rate_gauge = metrics.SCHEDULER_RATE.labels(**labels)
+        self._target_gauge.set(1.0 / self.effective_interval())
+
+    def boost(self, now=None):
+        now = self.clock() if now is None else now
+        boost = 1.0
+        if self.last_hit is not None and now - self.last_hit < DETECTION_BOOST_WINDOW:
+            boost *= DETECTION_BOOST
+        if self.last_motion is not None and now - self.last_motion < MOTION_BOOST_WINDOW:
+            boost *= MOTION_BOOST
+        return boost
+
+    def effective_interval(self, now=None):
+        """Target interval after the governor's stretch and the priority boosts"""
+        scale = self.governor.interval_scale if self.governor is not None else 1.0
+        return self.interval * scale / (self.priority * self.boost(now))
+
+    def check_motion(self, frame, now):
+        thumbnail = _motion_thumbnail(frame)
+        if self._thumbnail is not None and np.abs(thumbnail - self._thumbnail).mean() > MOTION_THRESHOLD:
+            self.last_motion = now
+        self._thumbnail = thumbnail
+
+    def achieved_rate(self, now=None):
+        now = self.clock() if now is None else now
+        while self._served_at and now - self._served_at[0] > RATE_WINDOW:
+            self._served_at.popleft()
+        return len(self._served_at) / max(min(RATE_WINDOW, now - self.registered), 1e-3)
+
+    def _record_served(self, now, deadline, hit):
+        self.served += 1
+        self._served_at.append(now)
+        if hit:
+            self.last_hit = now
+        # The next slot is one interval after the one just served. Under overload
+        # deadlines fall behind real time, but at the same pace relative to each
+        # camera's interval, so detections stay shared in proportion to priority.
+        interval = self.effective_interval(now)
+        if now - deadline > interval:
+            # Served more than a slot late: the detector is short of capacity
+            self.late += 1
+            self._late_counter.inc()
+        self.next_deadline = deadline + interval
+        self._served_counter.inc()
+        self._target_gauge.set(1.0 / interval)
+        self._rate_gauge.set(self.achieved_rate(now))
+
+    def status(self, now=None):
+        now = self.clock() if now is None else now
+        interval = self.effective_interval(now)
+        achieved = self.achieved_rate(now)
+        return {
+            'camera': self.camera_id,
+            'priority': self.priority,
+            'boost': self.boost(now),
+            'target_interval': interval,
+            'target_rate': 1.0 / interval,
+            'achieved_rate': achieved,
+            # Detections per second wanted but not delivered
+            'shed_rate': max(0.0, 1.0 / interval - achieved),
+            'served': self.served,
+            'late': self.late,
+            'replaced': self.replaced,
+            'lag': max(0.0, now - self.next_deadline),
+        }
+
+
+class InferenceScheduler:
+    """
+    Hands the detector to cameras in earliest-deadline-first order
+
+    Each camera's next deadline is one effective interval after its last
+    detection was due. A stream asks due() on every frame and calls
+    detect() when it is; up to `concurrency` requests run at once and the
+    rest wait, ordered by deadline. A camera that fell behind keeps its
+    early deadline and so goes first, which is what keeps busy cameras
+    from starving quiet ones. A camera that was idle starts from the
+    earliest deadline still waiting (or now), so it neither jumps the
+    queue with a stale deadline nor waits for the others to catch up.
+
+    Work is shed rather than queued: a camera has at most one request
+    outstanding, and due() stays False until it is served, so frames
+    arriving meanwhile are simply not detected and the queue never grows
+    beyond the number of cameras. When total demand exceeds capacity,
+    deadlines fall behind real time and every camera's rate drops in
+    proportion to its priority; the shortfall shows up as shed_rate and as
+    'late' detections. A request can still be replaced by a newer frame of
+    the same camera (detect() without due()), in which case the older call
+    returns None and the caller reuses its last result.
+
+    Args:
+        run: Callable(frame, **kwargs) performing one detection
+        concurrency: Detections allowed to run at once
+        hit_fn: Callable(result) telling whether a result should boost its camera
+    """
+
+    def __init__(self, run, concurrency=1, hit_fn=None, clock=time.perf_counter):
+        self.run = run
+        self.concurrency = concurrency
+        self.hit_fn = hit_fn or (lambda result: len(result[0]) > 0)
+        self.clock = clock
+        self.cameras = {}
+        self.waiting = []
+        self.running = 0
+        self._cond = threading.Condition()
+        self._utilization_gauge = metrics.SCHEDULER_UTILIZATION
+        self._latency = {}
+
+    def register(self, camera_id, interval=DEFAULT_INTERVAL, priority=1.0, governor=None):
+        """Add (or reconfigure) a camera"""
+        with self._cond:
+            camera = ScheduledCamera(camera_id, interval, priority, governor, self.clock)
+            self.cameras[camera.camera_id] = camera
+        return camera
+
+    def _camera(self, camera_id):
+        camera = self.cameras.get(str(camera_id))
+        if camera is None:
+            camera = self.register(camera_id)
+        return camera
+
+    def due(self, camera_id, frame=None):
+        """
+        Whether the camera should submit this frame for detection
+
+        Args:
+            camera_id: Registered camera (unknown ones are registered with defaults)
+            frame: The current frame, used to detect motion (optional)
+        """
+        camera = self._camera(camera_id)
+        now = self.clock()
+        if frame is not None:
+            camera.check_motion(frame, now)
+        return camera.request is None and not camera.running and now >= camera.next_deadline
+
+    def _dispatchable(self, request):
+        """Whether request is among the earliest `concurrency - running` deadlines"""
+        free = self.concurrency - self.running
+        if free <= 0:
+            return False
+        earliest = sorted(self.waiting, key=lambda r: (r.deadline, -r.camera.priority))[:free]
+        return request in earliest
+
+    def detect(self, camera_id, frame, **kwargs):
+        """
+        Detect on a frame once the camera's turn comes
+
+        kwargs go to run(); img_size defaults to the camera governor's choice.
+
+        Returns:
+            The detector's result, or None if a newer frame replaced this one
+        """
+        camera = self._camera(camera_id)
+        if camera.governor is not None:
+            kwargs.setdefault('img_size', camera.governor.img_size)
+        with self._cond:
+            now = self.clock()
+            floor = min([now] + [r.deadline for r in self.waiting if r.camera is not camera])
+            request = _Request(camera, max(camera.next_deadline, floor), now, len(self.waiting))
+            if camera.request is not None:
+                # Only the newest frame of a camera is worth detecting
+                stale = camera.request
+                stale.replaced = True
+                self.waiting.remove(stale)
+                camera.replaced += 1
+                camera._replaced_counter.inc()
+            camera.request = request
+            self.waiting.append(request)
+            self._cond.notify_all()
+
+            while True:
+                if request.replaced:
+                    return None
+                if self._dispatchable(request):
+                    break
+                self._cond.wait()
+
+            self.waiting.remove(request)
+            camera.request = None
+            camera.running = True
+            self.running += 1
+
+        start = self.clock()
+        result = None
+        try:
+            result = self.run(frame, **kwargs)
+            return result
+        finally:
+            end = self.clock()
+            with self._cond:
+                self.running -= 1
+                camera.running = False
+                if result is not None:
+                    camera._record_served(end, request.deadline, self.hit_fn(result))
+                    self._latency[camera.camera_id] = end - start
+                for other in self.cameras.values():
+                    other._rate_gauge.set(other.achieved_rate(end))
+                self._utilization_gauge.set(self.utilization(end))
+                self._cond.notify_all()
+            if result is not None and camera.governor is not None:
+                camera.governor.observe(end - request.submitted, request.queue_depth)
+
+    def utilization(self, now=None):
+        """Demanded share of detector capacity; above 1 cameras get less than their target rate"""
+        now = self.clock() if now is None else now
+        demand = sum(self._latency.get(camera_id, 0.0) / camera.effective_interval(now)
+                     for camera_id, camera in self.cameras.items())
+        return demand / max(self.concurrency, 1)
+
+    def status(self):
+        now = self.clock()
+        return {
+            'concurrency': self.concurrency,
+            'utilization': self.utilization(now),
+            'waiting': len(self.waiting),
+            'running': self.running,
+            'cameras': [camera.status(now) for camera in self.cameras.values()],
+        }
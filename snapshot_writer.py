@@ -0,0 +1,301 @@
+# Bounded background writer for detection snapshots with batched fsync and a disk quota
+
+import os
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+import metrics
+
+SNAPSHOT_DIR = 'static/img/detections'
+
+# Snapshots waiting to be written; more are dropped rather than queued
+DEFAULT_MAX_QUEUE = 32
+
+# Minimum seconds between two snapshots of the same camera (force=True bypasses it)
+DEFAULT_MIN_INTERVAL = 2.0
+
+# Written files are fsynced together at most this often, or once this many are pending
+FSYNC_INTERVAL = 1.0
+FSYNC_BATCH = 16
+
+DEFAULT_QUOTA_BYTES = 500 * 1024 * 1024
+WRITER_POLL = 0.1
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DiskQuota:
+    """
+    Keeps a directory's matching files under a byte and/or file budget
+
+    The oldest files (by modification time) are evicted first. Only files
+    whose names start with one of `prefixes` and end with one of `suffixes`
+    are counted or evicted, so other files in the directory are never touched.
+    """
+
+    def __init__(self, directory, max_bytes=None, max_files=None, prefixes=('',), suffixes=('.jpg',)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.prefixes = tuple(prefixes)
+        self.suffixes = tuple(suffixes)
+        self.files = deque()
+        self.bytes = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self.scan()
+
+    def matches(self, name):
+        return name.startswith(self.prefixes) and name.endswith(self.suffixes)
+
+    def scan(self):
+        """Index the files already in the directory, oldest first"""
+        entries = []
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and self.matches(entry.name):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+        with self._lock:
+            self.files = deque((path, size) for _, path, size in entries)
+            self.bytes = sum(size for _, size in self.files)
+
+    def add(self, path, size):
+        with self._lock:
+            self.files.append((path, size))
+            self.bytes += size
+
+    def over(self):
+        return ((self.max_bytes is not None and self.bytes > self.max_bytes)
+                or (self.max_files is not None and len(self.files) > self.max_files))
+
+    def enforce(self):
+        """Delete the oldest files until within budget; returns the paths removed"""
+        removed = []
+        with self._lock:
+            while self.files and self.over():
+                path, size = self.files.popleft()
+                self.bytes -= size
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Could not evict {path}: {e}")
+                    continue
+                removed.append(path)
+        self.evicted += len(removed)
+        return removed
+
+
+class _Snapshot:
+    def __init__(self, camera_id, path, image):
+        self.camera_id = camera_id
+        self.path = path
+        self.image = image
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots off the frame loop
+
+    submit() decides the file name, copies the frame and returns at once;
+    a background task encodes (when given a frame rather than JPEG bytes)
+    and writes it. Writes go to a temporary name and are renamed into
+    place, and the written files are fsynced together once a second rather
+    than one by one. Each camera is limited to one snapshot per
+    min_interval, the queue is bounded (a full queue drops the snapshot),
+    and the directory is kept within its quota by evicting the oldest
+    snapshots.
+
+    Args:
+        directory: Where snapshots are written
+        max_queue: Snapshots allowed to wait for the writer
+        min_interval: Per-camera seconds between snapshots
+        quota_bytes, quota_files: Directory budget (None for no limit)
+        quality: JPEG quality for frames encoded by the writer
+        prefixes: File name prefixes that count towards (and may be evicted by) the quota
+        spawn, sleep, run_blocking: As for ManagedCamera, so the writer runs
+            as a Socket.IO background task with file I/O off the event loop
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, max_queue=DEFAULT_MAX_QUEUE, min_interval=DEFAULT_MIN_INTERVAL,
+                 quota_bytes=DEFAULT_QUOTA_BYTES, quota_files=None, quality=90, prefixes=('detection_',),
+                 spawn=None, sleep=time.sleep, run_blocking=None, clock=time.monotonic):
+        self.directory = directory
+        self.max_queue = max_queue
+        self.min_interval = min_interval
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.spawn = spawn or self._spawn_thread
+        self.sleep = sleep
+        self.run_blocking = run_blocking or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+        self.clock = clock
+
+        os.makedirs(directory, exist_ok=True)
+        self.quota = None
+        if quota_bytes is not None or quota_files is not None:
+            self.quota = DiskQuota(directory, quota_bytes, quota_files, prefixes)
+
+        self.queue = deque()
+        self.counts = {'written': 0, 'dropped': 0, 'rate_limited': 0, 'failed': 0, 'evicted': 0}
+        self.running = False
+        self._last = {}
+        self._unsynced = []
+        self._last_sync = clock()
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    @staticmethod
+    def _spawn_thread(fn):
+        thread = threading.Thread(target=fn, daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.spawn(self._writer_loop)
+        return self
+
+    def _count(self, outcome, amount=1):
+        self.counts[outcome] += amount
+        metrics.SNAPSHOTS.labels(outcome=outcome).inc(amount)
+
+    def submit(self, image, camera_id='0', filename=None, force=False):
+        """
+        Queue a snapshot
+
+        Args:
+            image: BGR frame (copied, so the caller may keep drawing on it) or JPEG bytes
+            camera_id: Camera the snapshot belongs to, for the rate limit and file name
+            filename: File name inside the directory (default: detection_<camera>_<time>.jpg)
+            force: Bypass the per-camera rate limit (e.g. for an alert's own snapshot)
+
+        Returns:
+            str or None: Path the snapshot will be written to, None if it was rate limited or dropped
+        """
+        camera_id = str(camera_id)
+        now = self.clock()
+        with self._lock:
+            last = self._last.get(camera_id)
+            if not force and last is not None and now - last < self.min_interval:
+                self._count('rate_limited')
+                return None
+            if len(self.queue) >= self.max_queue:
+                self._count('dropped')
+                return None
+            self._last[camera_id] = now
+            if filename is None:
+                self._sequence += 1
+                safe_id = ''.join(c if c.isalnum() else '_' for c in camera_id)
+                filename = f"detection_{safe_id}_{time.strftime('%Y%m%d_%H%M%S')}_{self._sequence}.jpg"
+            path = os.path.join(self.directory, filename)
+            if isinstance(image, np.ndarray):
+                image = image.copy()
+            self.queue.append(_Snapshot(camera_id, path, image))
+            metrics.SNAPSHOT_QUEUE.set(len(self.queue))
+        self.start()
+        return path
+
+    def _write(self, snapshot):
+        data = snapshot.image
+        if isinstance(data, np.ndarray):
+            ok, buffer = cv2.imencode('.jpg', data, self.params)
+            if not ok:
+                raise ValueError("could not encode snapshot")
+            data = buffer.tobytes()
+        tmp = snapshot.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, snapshot.path)
+        return len(data)
+
+    def _write_batch(self, batch):
+        """Write, fsync when due and evict; runs off the event loop"""
+        for snapshot in batch:
+            try:
+                size = self._write(snapshot)
+            except Exception as e:
+                self._count('failed')
+                print(f"Could not write snapshot {snapshot.path}: {e}")
+                continue
+            self._unsynced.append(snapshot.path)
+            if self.quota is not None and os.path.dirname(snapshot.path) == self.directory:
+                self.quota.add(snapshot.path, size)
+            self._count('written')
+
+        if self._unsynced and (len(self._unsynced) >= FSYNC_BATCH or self.clock() - self._last_sync >= FSYNC_INTERVAL):
+            self.sync()
+
+        if self.quota is not None:
+            evicted = self.quota.enforce()
+            if evicted:
+                self._count('evicted', len(evicted))
+            metrics.SNAPSHOT_DISK_BYTES.set(self.quota.bytes)
+
+    def sync(self):
+        """fsync every file written since the last sync, then the directory entries once"""
+        paths, self._unsynced = self._unsynced, []
+        directories = set()
+        for path in paths:
+            try:
+                _fsync_path(path)
+                directories.add(os.path.dirname(path) or '.')
+            except OSError:
+                # Evicted or removed in the meantime
+                pass
+        for directory in directories:
+            try:
+                _fsync_path(directory)
+            except OSError:
+                # Not supported on every platform (e.g. Windows)
+                pass
+        self._last_sync = self.clock()
+
+    def _take_batch(self):
+        with self._lock:
+            batch = list(self.queue)
+            self.queue.clear()
+            metrics.SNAPSHOT_QUEUE.set(0)
+        return batch
+
+    def _writer_loop(self):
+        while self.running:
+            batch = self._take_batch()
+            if batch or self._unsynced:
+                self.run_blocking(self._write_batch, batch)
+            if not batch:
+                self.sleep(WRITER_POLL)
+
+    def flush(self):
+        """Write everything queued and fsync it, on the calling thread"""
+        self._write_batch(self._take_batch())
+        if self._unsynced:
+            self.sync()
+
+    def close(self):
+        self.running = False
+        self.flush()
+
+    def status(self):
+        return {
+            'directory': self.directory,
+            'queued': len(self.queue),
+            'min_interval': self.min_interval,
+            'counts': dict(self.counts),
+            'disk_bytes': self.quota.bytes if self.quota is not None else None,
+            'quota_bytes': self.quota.max_bytes if self.quota is not None else None,
+            'files': len(self.quota.files) if self.quota is not None else None,
+        }
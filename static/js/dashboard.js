@@ -70,6 +70,19 @@ document.addEventListener('DOMContentLoaded', function() {
         updateDashboardStats();
     });
     
+    // One event per bulk batch (see /api/alerts/bulk); redraw once for all of it
+    socket.on('alerts_bulk', (batch) => {
+        batch.created.forEach(alert => alerts.unshift(alert));
+        batch.updated.forEach(updatedAlert => {
+            const index = alerts.findIndex(a => a.id === updatedAlert.id);
+            if (index !== -1) alerts[index] = updatedAlert;
+        });
+        if (batch.created.length > 0) playAlertSound();
+        updateAlertCount();
+        updateTasksTable();
+        updateDashboardStats();
+    });
+    
     socket.on('alerts', (serverAlerts) => {
         alerts = serverAlerts;
         updateAlertCount();
@@ -290,6 +303,20 @@ function showAlertModal(alert) {
             img.classList.add('img-fluid', 'rounded', 'mb-3');
             img.alt = 'Request image';
             alertImageContainer.appendChild(img);
+        } else if (alert.image_path) {
+            // Snapshot of a camera alert
+            const img = document.createElement('img');
+            img.src = alert.image_path;
+            img.classList.add('img-fluid', 'rounded', 'mb-3');
+            img.alt = 'Detection snapshot';
+            alertImageContainer.appendChild(img);
+        }
+        if (alert.clip_path && alert.clip_ready) {
+            const link = document.createElement('a');
+            link.href = alert.clip_path;
+            link.textContent = 'Download event clip';
+            link.setAttribute('download', '');
+            alertImageContainer.appendChild(link);
         }
     }
     
@@ -869,6 +896,33 @@ function assignAlert(alertId, assignTo) {
     });
 }
 
+// Send several alert operations in one NDJSON request; resolves to the per-line results
+function sendAlertOps(ops) {
+    return fetch('/api/alerts/bulk', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-ndjson'
+        },
+        body: ops.map(op => JSON.stringify(op)).join('\n') + '\n'
+    })
+    .then(response => response.text())
+    .then(text => text.split('\n').filter(line => line).map(line => JSON.parse(line)));
+}
+
+// Resolve many alerts at once; the table is refreshed by the 'alerts_bulk' event
+function resolveAlerts(alertIds) {
+    return sendAlertOps(alertIds.map(id => ({op: 'update', id: id, status: 'resolved'})))
+        .then(results => {
+            const failed = results.filter(result => result.status >= 400);
+            if (failed.length > 0) {
+                showToast('Error', `Could not resolve ${failed.length} of ${results.length} tasks`, 'error');
+            } else {
+                showToast('Success', `${results.length} tasks resolved`, 'success');
+            }
+            return results;
+        });
+}
+
 // Completely rewrite the resolveAlert function to ensure it works properly
 function resolveAlert(alertId) {
     console.log(`Resolving alert ${alertId}`);
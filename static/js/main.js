@@ -61,6 +61,18 @@ document.addEventListener('DOMContentLoaded', function() {
         updateAlertStatus(updatedAlert);
     });
     
+    // One event per bulk batch (see /api/alerts/bulk); redraw once for all of it
+    socket.on('alerts_bulk', (batch) => {
+        batch.created.forEach(alert => alerts.unshift(alert));
+        batch.updated.forEach(updatedAlert => {
+            const index = alerts.findIndex(a => a.id === updatedAlert.id);
+            if (index !== -1) alerts[index] = updatedAlert;
+        });
+        if (batch.created.length > 0) playAlertSound();
+        updateAlertsList();
+        updateAlertCount();
+    });
+    
     socket.on('alerts', (serverAlerts) => {
         alerts = serverAlerts;
         updateAlertsList(alertModal);
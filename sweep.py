@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# Latency-vs-accuracy sweep over model variant, input size and confidence threshold
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from pathlib import Path
+
+import cv2
+import torch
+
+import eval_metrics
+from dataset_cache import label_path, list_images, read_labels
+from dataset_index import split_files
+from preprocess import LetterboxPreprocessor, non_max_suppression, raw_prediction, scale_boxes
+
+# Predictions are made once at this confidence and filtered per threshold
+MIN_CONF = 0.001
+IOU_THRES = 0.45
+
+
+def load_model(spec):
+    """
+    Load a YOLOv5 model from a weights file or a hub variant name
+
+    Args:
+        spec: Path to .pt weights, or yolov5n/yolov5s/yolov5m/yolov5l/yolov5x
+    """
+    if os.path.exists(spec):
+        model = torch.hub.load('ultralytics/yolov5', 'custom', path=spec)
+    else:
+        model = torch.hub.load('ultralytics/yolov5', Path(spec).stem, pretrained=True)
+    model.eval()
+    return model
+
+
+def model_stride(model):
+    stride = getattr(model, 'stride', 32)
+    if hasattr(stride, '__len__'):
+        stride = max(stride)
+    return int(stride)
+
+
+def load_samples(data_yaml=None, split='val', images=None, limit=None):
+    """
+    Decode the evaluation images once and read their labels
+
+    Returns:
+        list of (path, image, targets) with targets as (N, 5) [x1, y1, x2, y2, class]
+    """
+    if images:
+        files = list_images(images)
+    else:
+        files = split_files(data_yaml, split)
+    if limit:
+        files = files[:limit]
+
+    samples = []
+    for path in files:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Warning: could not read {path}, skipping")
+            continue
+        height, width = image.shape[:2]
+        targets = eval_metrics.yolo_to_xyxy(read_labels(label_path(path)), width, height)
+        samples.append((path, image, targets))
+    return samples
+
+
+def predict(model, samples, img_size, warmup=3):
+    """
+    Run the model over every sample at one input size, timing each image
+
+    The timed path is the detectors' path: letterbox, forward pass, NMS and
+    box scaling, at batch size 1.
+
+    Returns:
+        (predictions, timings): per-image (N, 6) arrays and seconds per image
+    """
+    preprocessor = LetterboxPreprocessor(stride=model_stride(model))
+
+    def run(image):
+        tensor, meta = preprocessor(image, img_size)
+        with torch.no_grad():
+            prediction = raw_prediction(model(tensor))
+        detections = non_max_suppression(prediction, MIN_CONF, IOU_THRES)[0]
+        return scale_boxes(detections, meta).cpu().numpy()
+
+    for _, image, _ in samples[:warmup]:
+        run(image)
+
+    predictions, timings = [], []
+    for _, image, _ in samples:
+        start = time.perf_counter()
+        predictions.append(run(image))
+        timings.append(time.perf_counter() - start)
+    return predictions, timings
+
+
+def evaluate(predictions, samples, conf_threshold):
+    """Accuracy of a set of predictions at one confidence threshold"""
+    return eval_metrics.score(predictions, [targets for _, _, targets in samples], conf_threshold)
+
+
+def train_variant(spec, img_size, args):
+    """Fine-tune one variant at one input size and return its best weights"""
+    from train_model import train_yolo_model
+
+    weights = spec if spec.endswith('.pt') else f"{spec}.pt"
+    return train_yolo_model(
+        dataset_path=args.dataset_path,
+        epochs=args.train_epochs,
+        batch_size=args.batch_size,
+        img_size=img_size,
+        output_dir=os.path.join(args.output_dir, f"{Path(spec).stem}-{img_size}"),
+        data_yaml=args.data,
+        weights=weights,
+        install=False,
+    )
+
+
+def sweep(args):
+    """Evaluate every model x image size x confidence combination"""
+    # Hub variants carry COCO heads, whose class ids mean nothing against the garbage labels
+    untrained = [spec for spec in args.models if not os.path.exists(spec)]
+    if untrained and not args.train_epochs:
+        raise ValueError(f"{', '.join(untrained)} are not weights files; pretrained COCO variants can only be "
+                         f"swept with --train-epochs to fine-tune them on the dataset first")
+
+    samples = load_samples(args.data, args.split, args.images, args.limit)
+    if not samples:
+        raise ValueError("No evaluation images found")
+    print(f"Evaluating on {len(samples)} images with {torch.get_num_threads()} CPU thread(s)")
+
+    rows = []
+    for spec in args.models:
+        for img_size in args.img_sizes:
+            weights = spec
+            if args.train_epochs:
+                weights = train_variant(spec, img_size, args)
+                if weights is None:
+                    print(f"Skipping {spec} at {img_size}px: training produced no weights")
+                    continue
+                weights = str(weights)
+
+            print(f"\n{spec} at {img_size}px")
+            model = load_model(weights)
+            predictions, timings = predict(model, samples, img_size)
+            latency = eval_metrics.latency_summary(timings)
+            print(f"  p50 {latency['p50_ms']:.1f} ms, {latency['fps']:.1f} images/s")
+
+            for conf in args.confs:
+                accuracy = evaluate(predictions, samples, conf)
+                row = {'model': spec, 'weights': weights, 'img_size': img_size, 'conf': conf}
+                row.update({k: v for k, v in accuracy.items() if k != 'per_class'})
+                row.update(latency)
+                rows.append(row)
+                print(f"  conf {conf:.2f}: P {accuracy['precision']:.3f}  R {accuracy['recall']:.3f}  "
+                      f"mAP50 {accuracy['map50']:.3f}  mAP {accuracy['map']:.3f}")
+            del model
+    return rows
+
+
+def print_report(rows, objective='recall', min_objective=None):
+    """Print every configuration, the Pareto frontier and the cheapest one meeting the target"""
+    frontier = eval_metrics.pareto_frontier(rows, 'p50_ms', objective)
+    on_frontier = {id(row) for row in frontier}
+
+    print(f"\n{'':1} {'model':<14} {'size':>5} {'conf':>5} {'P':>6} {'R':>6} {'mAP50':>6} {'mAP':>6} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'img/s':>7}")
+    for row in sorted(rows, key=lambda r: (r['p50_ms'], -r[objective])):
+        mark = '*' if id(row) in on_frontier else ' '
+        print(f"{mark} {row['model']:<14} {row['img_size']:>5} {row['conf']:>5.2f} {row['precision']:>6.3f} "
+              f"{row['recall']:>6.3f} {row['map50']:>6.3f} {row['map']:>6.3f} "
+              f"{row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} {row['fps']:>7.1f}")
+    print(f"\n* Pareto frontier (p50 latency vs {objective})")
+
+    if min_objective is not None:
+        meeting = [row for row in frontier if row[objective] >= min_objective]
+        if meeting:
+            best = meeting[0]
+            print(f"Cheapest configuration with {objective} >= {min_objective}: {best['model']} at "
+                  f"{best['img_size']}px, conf {best['conf']:.2f} ({best['p50_ms']:.1f} ms, "
+                  f"{objective} {best[objective]:.3f})")
+        else:
+            print(f"No configuration reaches {objective} >= {min_objective}")
+    return frontier
+
+
+def save_rows(rows, frontier, path):
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) + ['pareto'])
+            writer.writeheader()
+            frontier_ids = {id(row) for row in frontier}
+            for row in rows:
+                writer.writerow(dict(row, pareto=id(row) in frontier_ids))
+    else:
+        with open(path, 'w') as f:
+            json.dump({'rows': rows, 'frontier': frontier}, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Sweep model variant x image size x confidence threshold')
+    parser.add_argument('--models', type=str, nargs='+', default=['yolov5n', 'yolov5s', 'yolov5m'],
+                        help='Weights files, or YOLOv5 variant names (these need --train-epochs)')
+    parser.add_argument('--img-sizes', type=int, nargs='+', default=[320, 416, 512, 640],
+                        help='Inference (and training) image sizes')
+    parser.add_argument('--confs', type=float, nargs='+', default=[0.15, 0.25, 0.35, 0.5],
+                        help='Confidence thresholds')
+    parser.add_argument('--data', type=str, default='data/garbage_data.yaml',
+                        help='Data YAML whose split is evaluated (see dataset_index.py)')
+    parser.add_argument('--split', type=str, default='val', help='Split to evaluate')
+    parser.add_argument('--images', type=str, default=None,
+                        help='Evaluate an image directory instead of a YAML split')
+    parser.add_argument('--limit', type=int, default=None, help='Evaluate at most this many images')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='CPU threads for inference (match the deployment machine)')
+    parser.add_argument('--objective', type=str, default='recall', choices=['recall', 'precision', 'f1', 'map50', 'map'],
+                        help='Accuracy measure for the Pareto frontier')
+    parser.add_argument('--min', type=float, default=None, dest='min_objective',
+                        help='Report the cheapest configuration reaching this objective value')
+    parser.add_argument('--train-epochs', type=int, default=0,
+                        help='Fine-tune every variant at every size for this many epochs before evaluating')
+    parser.add_argument('--dataset_path', type=str, default='GarbageDataSet', help='Dataset for training')
+    parser.add_argument('--batch_size', type=int, default=16, help='Training batch size')
+    parser.add_argument('--output-dir', type=str, default='sweeps', help='Where trained variants are saved')
+    parser.add_argument('--output', type=str, default=None, help='Write results as .json or .csv')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    try:
+        rows = sweep(args)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not rows:
+        print("No configurations were evaluated")
+        sys.exit(1)
+
+    frontier = print_report(rows, args.objective, args.min_objective)
+    if args.output:
+        save_rows(rows, frontier, args.output)
@@ -15,14 +15,17 @@ YOLOV5_DIR = SCRIPT_DIR / 'yolov5'
 sys.path.append(str(YOLOV5_DIR))
 
 def train_yolo_model(
-    dataset_path="data/GarbageDataSet",
+    dataset_path="GarbageDataSet",
     epochs=100,
     batch_size=16,
     img_size=640,
     fast_train=False,
     output_dir="model",
     pretrained=True,
-    data_yaml=None
+    data_yaml=None,
+    image_cache=False,
+    weights=None,
+    install=True
 ):
     """
     Train a YOLOv5 model on a garbage detection dataset
@@ -36,6 +39,12 @@ def train_yolo_model(
         output_dir (str): Directory to save the trained model
         pretrained (bool): Use pretrained weights
         data_yaml (str): Path to data yaml file
+        image_cache (bool): Read images from memory-mapped dataset caches (built on first use)
+        weights (str): Initial weights (e.g. yolov5n.pt), overriding the fast_train/pretrained choice
+        install (bool): Copy the best weights to model/best.pt for the detectors
+    
+    Returns:
+        Path of the best weights, or None if training produced none
     """
     print(f"Starting YOLOv5 training with the following settings:")
     print(f"Dataset path: {dataset_path}")
@@ -55,15 +64,21 @@ def train_yolo_model(
         model_size = "yolov5m.pt"  # Medium model for better accuracy
 
     # Determine weights path
-    if pretrained:
+    if weights is not None:
+        pass  # Chosen by the caller (e.g. sweep.py)
+    elif pretrained:
         weights = model_size  # Use pretrained weights
     else:
         weights = ""  # Train from scratch
 
     # Determine data YAML file
     if data_yaml is None:
-        # Check if we have a garbage.yaml or garbage_dataset.yaml
-        if os.path.exists(os.path.join(SCRIPT_DIR, "data", "garbage.yaml")):
+        if os.path.isdir(dataset_path):
+            # Index the dataset and write a split matching its actual contents
+            data_yaml = os.path.join(SCRIPT_DIR, "data", "garbage_data.yaml")
+            create_data_yaml(dataset_path, data_yaml)
+        # Otherwise check if we have a garbage.yaml or garbage_dataset.yaml
+        elif os.path.exists(os.path.join(SCRIPT_DIR, "data", "garbage.yaml")):
             data_yaml = os.path.join(SCRIPT_DIR, "data", "garbage.yaml")
         elif os.path.exists(os.path.join(SCRIPT_DIR, "data", "garbage_dataset.yaml")):
             data_yaml = os.path.join(SCRIPT_DIR, "data", "garbage_dataset.yaml")
@@ -92,6 +107,12 @@ def train_yolo_model(
         from train import train as yolo_train
         from train import parse_opt
         
+        # Decode and resize every image once instead of every epoch
+        if image_cache:
+            import dataset_cache
+            caches = [dataset_cache.open_cache(d, img_size) for d in dataset_image_dirs(data_yaml)]
+            dataset_cache.install_yolov5_hook(caches)
+        
         # Parse arguments
         opt = parse_opt(known=True)
         for i in range(0, len(train_args), 2):
@@ -109,45 +130,75 @@ def train_yolo_model(
         
         # Copy the best model to the output directory
         best_model = Path(SCRIPT_DIR) / output_dir / 'weights' / 'best.pt'
-        if best_model.exists():
+        if best_model.exists() and install:
             os.makedirs(os.path.join(SCRIPT_DIR, "model"), exist_ok=True)
             shutil.copy(best_model, os.path.join(SCRIPT_DIR, "model", "best.pt"))
             print(f"Best model saved to {os.path.join(SCRIPT_DIR, 'model', 'best.pt')}")
-        else:
+        elif not best_model.exists():
             print("Warning: Best model not found. Check training output for errors.")
+            best_model = None
         
         print("Training completed successfully!")
+        return best_model
         
     except Exception as e:
         print(f"Error during training: {e}")
         raise
 
-def create_data_yaml(dataset_path, yaml_path):
+def dataset_image_dirs(data_yaml):
+    """Resolve the existing train/val image directories listed in a data YAML file"""
+    with open(data_yaml) as file:
+        data = yaml.safe_load(file)
+    
+    # Relative paths are taken relative to the YAML file
+    root = Path(data.get('path') or '.')
+    if not root.is_absolute():
+        root = (Path(data_yaml).parent / root).resolve()
+    
+    dirs = []
+    for split in ('train', 'val'):
+        entries = data.get(split) or []
+        for entry in ([entries] if isinstance(entries, str) else entries):
+            target = Path(entry) if Path(entry).is_absolute() else (root / entry).resolve()
+            if target.is_dir():
+                candidates = [target]
+            elif target.suffix == '.txt' and target.is_file():
+                # Image list (e.g. from dataset_index.py): cache the folders it draws from
+                with open(target) as file:
+                    candidates = [(target.parent / line.strip()).resolve().parent for line in file if line.strip()]
+            else:
+                candidates = []
+            for image_dir in candidates:
+                if image_dir not in dirs:
+                    dirs.append(image_dir)
+    return dirs
+
+def create_data_yaml(dataset_path, yaml_path, val=0.1, test=0.1, seed=0):
     """Create a YAML file for the dataset configuration"""
+    import dataset_index
     
     # Check if dataset exists
     if not os.path.exists(dataset_path):
         print(f"Warning: Dataset path {dataset_path} does not exist")
-        
-    # Define the basic structure
-    data = {
-        'path': dataset_path,
-        'train': 'images/train',
-        'val': 'images/val',
-        'test': 'images/test',
-        'nc': 2,  # Default to 2 classes: bin and trash
-        'names': ['bin', 'trash']  # Default class names
-    }
+        return
+    
+    # The index and split lists go next to the YAML (data/garbage_data/ for
+    # data/garbage_data.yaml), leaving the tracked dataset folder untouched
+    output_dir = Path(yaml_path).parent / Path(yaml_path).stem
+    output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Write to YAML file
-    with open(yaml_path, 'w') as file:
-        yaml.dump(data, file, default_flow_style=False)
+    # Classes come from the dataset itself, and the split is stratified by class
+    entries = dataset_index.index_dataset(dataset_path, index_path=output_dir / dataset_index.INDEX_FILE)
+    names = dataset_index.class_names(dataset_path, entries)
+    splits = dataset_index.stratified_split(entries, val, test, seed)
+    dataset_index.write_splits(dataset_path, splits, names, yaml_path, list_dir=output_dir)
     
-    print(f"Created data configuration file at {yaml_path}")
+    print(f"Created data configuration file at {yaml_path} "
+          f"({len(splits['train'])}/{len(splits['val'])}/{len(splits['test'])} train/val/test, {len(names)} classes)")
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Train YOLOv5 model for garbage detection')
-    parser.add_argument('--dataset_path', type=str, default='data/GarbageDataSet',
+    parser.add_argument('--dataset_path', type=str, default='GarbageDataSet',
                         help='Path to the dataset')
     parser.add_argument('--epochs', type=int, default=100,
                         help='Number of training epochs')
@@ -163,6 +214,8 @@ def parse_arguments():
                         help='Path to data YAML file')
     parser.add_argument('--no_pretrained', action='store_true',
                         help='Train from scratch without pretrained weights')
+    parser.add_argument('--image_cache', action='store_true',
+                        help='Decode images once into memory-mapped caches (see dataset_cache.py)')
     
     return parser.parse_args()
 
@@ -177,5 +230,6 @@ if __name__ == '__main__':
         fast_train=args.fast_train,
         output_dir=args.output_dir,
         pretrained=not args.no_pretrained,
-        data_yaml=args.data_yaml
+        data_yaml=args.data_yaml,
+        image_cache=args.image_cache
     ) 
\ No newline at end of file